@@ -21,7 +21,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from database import Base
-from models.stock import StockInfo, StockPrice
+from models.stock import StockInfo, StockPrice, PriceBackfillCheckpoint, PriceHistoryStart
 
 target_metadata = Base.metadata
 
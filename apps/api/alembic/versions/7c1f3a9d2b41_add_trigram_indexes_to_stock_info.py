@@ -0,0 +1,36 @@
+"""Add trigram indexes to stock_info company names
+
+Revision ID: 7c1f3a9d2b41
+Revises: 64951d865498
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1f3a9d2b41'
+down_revision: Union[str, None] = '64951d865498'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 企業名の部分一致検索（ILIKE '%...%'）と類似度順の並び替えにpg_trgmを使用
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_stock_info_company_name_trgm', 'stock_info', ['company_name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'company_name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_stock_info_company_name_en_trgm', 'stock_info', ['company_name_en'], unique=False,
+        postgresql_using='gin', postgresql_ops={'company_name_en': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_info_company_name_en_trgm', table_name='stock_info')
+    op.drop_index('ix_stock_info_company_name_trgm', table_name='stock_info')
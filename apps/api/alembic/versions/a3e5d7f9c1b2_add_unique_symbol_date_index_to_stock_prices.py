@@ -0,0 +1,42 @@
+"""Add unique (symbol, date) index to stock_prices
+
+Revision ID: a3e5d7f9c1b2
+Revises: 7c1f3a9d2b41
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e5d7f9c1b2'
+down_revision: Union[str, None] = '7c1f3a9d2b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 一意制約を作る前に重複レコードを削除（同じ銘柄・日付では最後に保存したものを残す）
+    op.execute(
+        """
+        DELETE FROM stock_prices
+        WHERE id NOT IN (
+            SELECT max_id FROM (
+                SELECT MAX(id) AS max_id FROM stock_prices GROUP BY symbol, date
+            ) AS latest
+        )
+        """
+    )
+    op.create_index(
+        'ix_stock_prices_symbol_date', 'stock_prices', ['symbol', 'date'], unique=True
+    )
+    # 複合インデックスの先頭列で検索できるため、symbol単独のインデックスは不要
+    op.drop_index('ix_stock_prices_symbol', table_name='stock_prices')
+
+
+def downgrade() -> None:
+    op.create_index('ix_stock_prices_symbol', 'stock_prices', ['symbol'], unique=False)
+    op.drop_index('ix_stock_prices_symbol_date', table_name='stock_prices')
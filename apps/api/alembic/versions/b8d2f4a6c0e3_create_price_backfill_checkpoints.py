@@ -0,0 +1,40 @@
+"""Create price_backfill_checkpoints table
+
+Revision ID: b8d2f4a6c0e3
+Revises: a3e5d7f9c1b2
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f4a6c0e3'
+down_revision: Union[str, None] = 'a3e5d7f9c1b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_backfill_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job', sa.String(length=50), nullable=False, comment='ジョブ名'),
+    sa.Column('symbol', sa.String(length=20), nullable=False, comment='証券コード'),
+    sa.Column('status', sa.String(length=20), nullable=False, comment='状態（done: 完了、failed: 失敗）'),
+    sa.Column('rows', sa.Integer(), nullable=False, comment='保存した行数'),
+    sa.Column('last_date', sa.DateTime(), nullable=True, comment='保存した最新の日付'),
+    sa.Column('error', sa.Text(), nullable=True, comment='失敗時のエラー'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新日時'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_price_backfill_checkpoints_id'), 'price_backfill_checkpoints', ['id'], unique=False)
+    op.create_index('ix_price_backfill_checkpoints_job_symbol', 'price_backfill_checkpoints', ['job', 'symbol'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_price_backfill_checkpoints_job_symbol', table_name='price_backfill_checkpoints')
+    op.drop_index(op.f('ix_price_backfill_checkpoints_id'), table_name='price_backfill_checkpoints')
+    op.drop_table('price_backfill_checkpoints')
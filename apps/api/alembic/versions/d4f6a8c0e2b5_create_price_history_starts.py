@@ -0,0 +1,36 @@
+"""Create price_history_starts table
+
+Revision ID: d4f6a8c0e2b5
+Revises: b8d2f4a6c0e3
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6a8c0e2b5'
+down_revision: Union[str, None] = 'b8d2f4a6c0e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_history_starts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('symbol', sa.String(length=20), nullable=False, comment='証券コード'),
+    sa.Column('first_date', sa.DateTime(), nullable=False, comment='取得できる最初の日付'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新日時'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_price_history_starts_id'), 'price_history_starts', ['id'], unique=False)
+    op.create_index(op.f('ix_price_history_starts_symbol'), 'price_history_starts', ['symbol'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_price_history_starts_symbol'), table_name='price_history_starts')
+    op.drop_index(op.f('ix_price_history_starts_id'), table_name='price_history_starts')
+    op.drop_table('price_history_starts')
@@ -0,0 +1,72 @@
+"""
+株価一括取り込みコマンド
+stock_infoの銘柄（または銘柄リストのファイル）の日足をまとめてstock_pricesへ取り込む
+
+実行例:
+    python -m backfill
+    python -m backfill --symbols-file symbols.txt --start 2015-01-01
+    python -m backfill --fixture-dir ./fixtures/prices   # ローカルのCSVから取り込む（オフライン）
+    PROVIDER_NAME=synthetic python -m backfill           # 合成データで取り込む（オフライン）
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import date
+
+from config import settings
+from database import SessionLocal
+from services.backfill import PriceBackfill, load_symbols_from_database, load_symbols_from_file
+from services.executor import shutdown_executors
+from services.market_data import CsvFixtureProvider, get_provider
+
+logger = logging.getLogger("backfill")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="株価の一括取り込み")
+    parser.add_argument("--symbols-file", help="銘柄リストのファイル（1行1銘柄）。省略時はstock_infoの銘柄")
+    parser.add_argument("--start", type=date.fromisoformat, help="取得開始日（YYYY-MM-DD）。省略時は全期間")
+    parser.add_argument("--job", default="default", help="ジョブ名（チェックポイントの単位）")
+    parser.add_argument("--chunk-size", type=int, default=settings.backfill.chunk_size, help="1回の一括ダウンロードで取得する銘柄数")
+    parser.add_argument("--concurrency", type=int, default=settings.backfill.concurrency, help="同時に実行する一括ダウンロード数（yfinanceは常に1）")
+    parser.add_argument("--timeout", type=float, default=settings.backfill.timeout, help="一括ダウンロード1回のタイムアウト（秒）")
+    parser.add_argument("--fixture-dir", help="Yahoo Financeの代わりに<証券コード>.csvを読み込むディレクトリ")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを削除して最初から取り込む")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> int:
+    # 省略時はPROVIDER_NAMEに応じた提供元（yfinance, synthetic, fixture）
+    provider = CsvFixtureProvider(args.fixture_dir) if args.fixture_dir else get_provider()
+    db = SessionLocal()
+    try:
+        symbols = load_symbols_from_file(args.symbols_file) if args.symbols_file else load_symbols_from_database(db)
+        backfill = PriceBackfill(
+            db,
+            provider,
+            job=args.job,
+            start=args.start,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+        )
+        if args.restart:
+            backfill.reset()
+
+        logger.info(f"株価の一括取り込みを開始します: {len(symbols)}銘柄（ジョブ: {args.job}）")
+        report = await backfill.run(symbols)
+        logger.info(f"株価の一括取り込みが完了しました: {report.summary()}")
+        return 1 if report.failed else 0
+    finally:
+        db.close()
+        shutdown_executors()
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=settings.logging.level, format=settings.logging.format)
+    return asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
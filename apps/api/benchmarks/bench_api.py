@@ -0,0 +1,363 @@
+"""
+株価APIの負荷試験・レイテンシベンチマーク
+合成データ提供元とシード済みのデータベースを使い、アプリをプロセス内で呼び出して
+/stocks/search, /stocks/{symbol}/price, /stocks/{symbol}/info, /stocks/popular, /stocks/{symbol}/save の
+スループット、p50/p95/p99レイテンシ、メモリ割り当てを計測する。
+結果はJSONで保存でき、保存済みのベースラインと比較して劣化を検出できる
+
+実行例:
+    python -m benchmarks.bench_api --concurrency 16 --requests 500 --output results.json
+    python -m benchmarks.bench_api --scenarios price info --latency 0.05 --baseline baseline.json
+    python -m benchmarks.bench_api --compare baseline.json results.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.stats import summarize
+from database import Base, get_async_db, get_db, to_async_url
+from main import app
+from models.stock import StockInfo
+from services import market_data
+from services.compression import compressed_cache
+from services.info_cache import info_cache
+from services.market_data import SYNTHETIC_EN_PARTS, SYNTHETIC_NAME_PARTS, SyntheticProvider, set_provider
+from services.price_coalescer import price_coalescer
+from services.search_index import search_index
+from services.session_bars import session_bars
+
+# シナリオごとのリクエスト（メソッド, パス）を作成する関数
+Request = Tuple[str, str]
+SCENARIOS: Dict[str, Callable[["Workload", int], Request]] = {
+    "search": lambda workload, i: ("GET", f"/api/v1/stocks/search?query={workload.query(i)}&limit=10"),
+    "price": lambda workload, i: ("GET", f"/api/v1/stocks/{workload.symbol(i)}/price?period=1mo&interval=1d"),
+    "info": lambda workload, i: ("GET", f"/api/v1/stocks/{workload.symbol(i)}/info"),
+    "popular": lambda workload, i: ("GET", "/api/v1/stocks/popular?limit=10"),
+    "save": lambda workload, i: ("POST", f"/api/v1/stocks/{workload.symbol(i)}/save"),
+}
+
+# 劣化とみなす指標と向き（1: 大きいほど悪い、-1: 小さいほど悪い）
+REGRESSION_METRICS = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "throughput_rps": -1}
+
+
+class Workload:
+    """再現可能なリクエストの対象（銘柄・検索語）"""
+
+    def __init__(self, symbols: List[str], hot_symbols: int, seed: int):
+        rng = random.Random(seed)
+        self.symbols = rng.sample(symbols, min(hot_symbols, len(symbols)))
+        self.queries = [*SYNTHETIC_NAME_PARTS, *SYNTHETIC_EN_PARTS, *(symbol[:2] for symbol in self.symbols[:10])]
+        rng.shuffle(self.queries)
+
+    def symbol(self, i: int) -> str:
+        return self.symbols[i % len(self.symbols)]
+
+    def query(self, i: int) -> str:
+        return self.queries[i % len(self.queries)]
+
+
+class DatabaseNotEmptyError(Exception):
+    """指定されたデータベースにテーブルがあり、--resetが指定されていない"""
+
+
+def prepare_schema(engine: Engine, reset: bool) -> None:
+    """
+    ベンチマーク用のテーブルを作成
+
+    resetが偽の場合は空のデータベースのみ使い、既存のテーブルは削除しない
+
+    Raises:
+        DatabaseNotEmptyError: resetが偽で、データベースにテーブルがある場合
+    """
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    else:
+        tables = inspect(engine).get_table_names()
+        if tables:
+            raise DatabaseNotEmptyError(
+                f"データベースにテーブルがあります（{', '.join(sorted(tables))}）。"
+                "空のデータベースを指定するか、--resetで既存のテーブルを削除してください"
+            )
+    Base.metadata.create_all(bind=engine)
+
+
+def setup_database(database_url: str, provider: SyntheticProvider, stocks: int, reset: bool = False) -> str:
+    """
+    ベンチマーク用のデータベースを作成し、合成データの銘柄を登録する
+
+    Args:
+        reset: 既存のテーブルを削除して作り直すか（偽の場合は空のデータベースのみ使う）
+    """
+    connect_args = {"check_same_thread": False, "timeout": 30} if database_url.startswith("sqlite") else {}
+    engine = create_engine(database_url, connect_args=connect_args)
+    prepare_schema(engine, reset)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    with SessionLocal() as db:
+        db.bulk_insert_mappings(StockInfo, [
+            {
+                "symbol": symbol,
+                "company_name": stock.company_name,
+                "company_name_en": stock.company_name_en,
+                "market": stock.market,
+                "sector": stock.sector,
+                "industry": stock.industry,
+                "is_active": True,
+            }
+            for symbol in provider.symbols[:stocks]
+            for stock in [market_data.info_to_stock(symbol, provider.profile(symbol))]
+        ])
+        db.commit()
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async_engine = create_async_engine(to_async_url(database_url), connect_args=connect_args)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return database_url
+
+
+def reset_caches() -> None:
+    """シナリオ間でプロセス内キャッシュを持ち越さない"""
+    info_cache.clear()
+    price_coalescer.clear()
+    compressed_cache.clear()
+    search_index.clear()
+    session_bars.clear()
+
+
+async def send(client: httpx.AsyncClient, request: Request) -> Tuple[float, bool]:
+    """1リクエストを送信し、所要時間と成功したかどうかを返す"""
+    method, path = request
+    started = time.perf_counter()
+    response = await client.request(method, path)
+    return time.perf_counter() - started, response.status_code < 400
+
+
+async def run_load(client: httpx.AsyncClient, make_request: Callable[[int], Request], requests: int, concurrency: int) -> Dict[str, Any]:
+    """同時実行数を保ちながらリクエストを送信し、レイテンシとスループットを集計"""
+    durations: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            duration, ok = await send(client, make_request(i))
+            durations.append(duration)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(durations)
+    stats.update({"errors": errors, "elapsed_s": elapsed, "throughput_rps": requests / elapsed if elapsed > 0 else 0.0})
+    return stats
+
+
+async def measure_allocations(client: httpx.AsyncClient, make_request: Callable[[int], Request], requests: int) -> Dict[str, float]:
+    """
+    1リクエストあたりのメモリ割り当てを計測（レイテンシに影響しないよう負荷試験とは別に逐次実行）
+
+    Returns:
+        alloc_peak_kib: リクエスト中に増えたメモリのピーク（KiB、平均）
+        alloc_net_blocks: リクエスト後に残ったメモリブロック数（平均）
+        gc_collections: 世代0のGC回数（平均、コンテナオブジェクトの割り当て約700回ごとに1回）
+    """
+    peaks, blocks, collections = [], [], []
+    tracemalloc.start()
+    try:
+        for i in range(requests):
+            gc.collect()
+            before_blocks = sys.getallocatedblocks()
+            before_gc = gc.get_stats()[0]["collections"]
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            await send(client, make_request(i))
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append((peak - current) / 1024)
+            collections.append(gc.get_stats()[0]["collections"] - before_gc)
+            gc.collect()
+            blocks.append(sys.getallocatedblocks() - before_blocks)
+    finally:
+        tracemalloc.stop()
+
+    count = max(len(peaks), 1)
+    return {
+        "alloc_peak_kib": sum(peaks) / count,
+        "alloc_net_blocks": sum(blocks) / count,
+        "gc_collections": sum(collections) / count,
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """すべてのシナリオを実行して結果を返す"""
+    provider = SyntheticProvider(seed=args.seed, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    set_provider(provider)
+    workload = Workload(provider.symbols[:args.stocks], args.hot_symbols, args.seed)
+
+    results: Dict[str, Any] = {}
+    # 一時ファイルのSQLiteは終了時にディレクトリごと削除する
+    with tempfile.TemporaryDirectory(prefix="bench_api_", ignore_cleanup_errors=True) as directory:
+        # メモリ内SQLiteは接続を共有してしまうため、一時ファイルを使う
+        if args.database_url:
+            database_url = setup_database(args.database_url, provider, args.stocks, reset=args.reset)
+        else:
+            database_url = setup_database(f"sqlite:///{directory}/bench_api.db", provider, args.stocks, reset=True)
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+            for name in args.scenarios:
+                reset_caches()
+                make_request = lambda i, scenario=SCENARIOS[name]: scenario(workload, i)
+
+                # ウォームアップ（結果には含めない）
+                await run_load(client, make_request, args.warmup, min(args.concurrency, max(args.warmup, 1)))
+                stats = await run_load(client, make_request, args.requests, args.concurrency)
+                if args.alloc_requests:
+                    stats.update(await measure_allocations(client, make_request, args.alloc_requests))
+
+                results[name] = stats
+                print(format_stats(name, stats))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database_url.split(":", 1)[0],
+            "config": {
+                key: getattr(args, key)
+                for key in ["concurrency", "requests", "warmup", "stocks", "hot_symbols", "latency", "jitter", "error_rate", "seed"]
+            },
+        },
+        "scenarios": results,
+    }
+
+
+def format_stats(name: str, stats: Dict[str, Any]) -> str:
+    """1シナリオの結果を1行で表示"""
+    line = (
+        f"{name:<8} {stats['throughput_rps']:8.1f} req/s  "
+        f"p50 {stats['p50_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms  p99 {stats['p99_ms']:8.2f}ms  "
+        f"errors {stats['errors']}"
+    )
+    if "alloc_peak_kib" in stats:
+        line += f"  alloc {stats['alloc_peak_kib']:.0f}KiB/req  gc {stats['gc_collections']:.1f}/req"
+    return line
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    ベースラインと比較して劣化した指標を列挙
+
+    Args:
+        threshold: 劣化とみなす変化率（0.2なら20%）
+
+    Returns:
+        劣化の説明のリスト（劣化がなければ空）
+    """
+    regressions = []
+    for name, stats in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for metric, direction in REGRESSION_METRICS.items():
+            before, after = base.get(metric), stats.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change * direction > threshold:
+                regressions.append(f"{name}.{metric}: {before:.2f} -> {after:.2f} ({change:+.1%})")
+        if stats.get("errors", 0) > base.get("errors", 0):
+            regressions.append(f"{name}.errors: {base.get('errors', 0)} -> {stats['errors']}")
+    return regressions
+
+
+def report_comparison(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """比較結果を表示し、劣化があれば1を返す"""
+    regressions = compare_results(baseline, current, threshold)
+    if regressions:
+        print(f"ベースラインから{threshold:.0%}以上劣化した指標:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"ベースラインからの劣化はありません（しきい値 {threshold:.0%}）")
+    return 0
+
+
+def load_json(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="株価APIの負荷試験・レイテンシベンチマーク")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="実行するシナリオ")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時リクエスト数")
+    parser.add_argument("--requests", type=int, default=200, help="シナリオごとのリクエスト数")
+    parser.add_argument("--warmup", type=int, default=20, help="シナリオごとのウォームアップのリクエスト数")
+    parser.add_argument("--alloc-requests", type=int, default=20, help="メモリ割り当てを計測するリクエスト数（0で計測しない）")
+    parser.add_argument("--stocks", type=int, default=len(market_data.SYNTHETIC_SYMBOLS), help="データベースに登録する銘柄数")
+    parser.add_argument("--hot-symbols", type=int, default=100, help="リクエスト対象の銘柄数")
+    parser.add_argument("--latency", type=float, default=0.0, help="合成データ提供元の遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="合成データ提供元の遅延のばらつき（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="合成データ提供元のエラー率")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument(
+        "--database-url",
+        help="計測するデータベースのURL（省略時は一時ファイルのSQLite）。空のデータベースのみ使い、テーブルがある場合は--resetが必要"
+    )
+    parser.add_argument("--reset", action="store_true", help="--database-urlのデータベースの既存のテーブルを削除して作り直す（データはすべて失われる）")
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    parser.add_argument("--baseline", help="比較するベースラインのJSONファイル")
+    parser.add_argument("--threshold", type=float, default=0.2, help="劣化とみなす変化率")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="保存済みの2つの結果を比較して終了")
+    args = parser.parse_args()
+
+    if args.compare:
+        return report_comparison(load_json(args.compare[0]), load_json(args.compare[1]), args.threshold)
+
+    try:
+        results = asyncio.run(run_benchmark(args))
+    except DatabaseNotEmptyError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+    if args.baseline:
+        return report_comparison(load_json(args.baseline), results, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+同時リクエストのベンチマーク
+遅延を注入した合成データ提供元で /stocks/{symbol}/price を同時に呼び出し、
+全体の所要時間が「最も遅い1件」程度に収まるか（直列の合計にならないか）を確認する
+
+実行例:
+    python -m benchmarks.bench_concurrency --requests 8 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, get_db
+from main import app
+from services.market_data import SyntheticProvider, set_provider
+
+
+def setup_database() -> None:
+    """メモリ内SQLiteを使うように依存関係を差し替える"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+
+
+async def run(requests: int, latency: float) -> None:
+    set_provider(SyntheticProvider(latency=latency))
+    setup_database()
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def fetch(i: int) -> float:
+            started = time.perf_counter()
+            response = await client.get(f"/api/v1/stocks/{1300 + i}/price?period=1d&interval=5m")
+            response.raise_for_status()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        durations = await asyncio.gather(*(fetch(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    # 1リクエストあたり history と info の2回呼び出し
+    serial = requests * latency * 2
+    print(f"requests:          {requests}")
+    print(f"provider latency:  {latency:.3f}s x 2 calls/request")
+    print(f"wall time:         {elapsed:.3f}s")
+    print(f"slowest request:   {max(durations):.3f}s")
+    print(f"serial estimate:   {serial:.3f}s")
+    print(f"speedup vs serial: {serial / elapsed:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="同時リクエストのベンチマーク")
+    parser.add_argument("--requests", type=int, default=8, help="同時リクエスト数")
+    parser.add_argument("--latency", type=float, default=0.5, help="外部API呼び出し1回あたりの遅延（秒）")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+株価データ変換のベンチマーク
+DataFrameからレスポンスへの変換を、従来の iterrows() による行単位の変換と
+列単位（NumPy）の変換で比較する
+
+実行例:
+    python -m benchmarks.bench_price_conversion --rows 1000 10000 100000
+"""
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from models.stock import StockPriceResponse
+from services import price_format
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """欠損値を含む株価DataFrameを作成"""
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2000-01-01", periods=rows, freq="min", tz="Asia/Tokyo")
+    frame = pd.DataFrame(
+        {
+            "Open": rng.uniform(90, 110, rows),
+            "High": rng.uniform(100, 120, rows),
+            "Low": rng.uniform(80, 100, rows),
+            "Close": rng.uniform(90, 110, rows),
+            "Volume": rng.integers(0, 1_000_000, rows).astype("float64"),
+        },
+        index=index,
+    )
+    frame.iloc[::97] = np.nan
+    return frame
+
+
+def iterrows_records(symbol: str, hist: pd.DataFrame) -> List[StockPriceResponse]:
+    """従来の変換（1行ごとに pd.isna で判定してモデルを作成）"""
+    price_data = []
+    for date, row in hist.iterrows():
+        price_data.append(StockPriceResponse(
+            symbol=symbol,
+            date=date,
+            open_price=float(row['Open']) if not pd.isna(row['Open']) else None,
+            high_price=float(row['High']) if not pd.isna(row['High']) else None,
+            low_price=float(row['Low']) if not pd.isna(row['Low']) else None,
+            close_price=float(row['Close']) if not pd.isna(row['Close']) else None,
+            volume=int(row['Volume']) if not pd.isna(row['Volume']) else None,
+            adjusted_close=float(row['Close']) if not pd.isna(row['Close']) else None
+        ))
+    return price_data
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """最速の実行時間（秒）を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="株価データ変換のベンチマーク")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="行数")
+    parser.add_argument("--repeat", type=int, default=3, help="繰り返し回数")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'iterrows':>10} {'records':>10} {'columns':>10} {'speedup':>8}")
+    for rows in args.rows:
+        hist = make_frame(rows)
+        legacy = measure(lambda: iterrows_records("6758", hist), args.repeat)
+        records = measure(lambda: price_format.frame_to_records("6758", hist), args.repeat)
+        columns = measure(lambda: price_format.frame_to_columns(hist), args.repeat)
+        print(f"{rows:>8} {legacy:>9.3f}s {records:>9.3f}s {columns:>9.4f}s {legacy / columns:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
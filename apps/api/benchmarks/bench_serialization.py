@@ -0,0 +1,109 @@
+"""
+株価レスポンスのシリアライズのベンチマーク
+株価取得結果からJSONのバイト列を作るまでを、従来の経路（モデルの検証 → response_modelでの再検証・
+JSON互換の値への変換 → json.dumps）と、orjsonの経路（model_construct → FastJSONResponse）で比較する
+
+実行例:
+    python -m benchmarks.bench_serialization --rows 1000 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Union
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from benchmarks.bench_price_conversion import make_frame
+from models.stock import StockPriceColumnarDataResponse, StockPriceDataResponse, StockPriceResponse
+from routers.stock import _price_model
+from services import price_format
+from services.json_response import FastJSONResponse
+
+# 株価取得APIのresponse_model
+RESPONSE_FIELD = create_response_field(
+    name="price_response", type_=Union[StockPriceDataResponse, StockPriceColumnarDataResponse]
+)
+
+
+def legacy_records(symbol: str, hist) -> List[StockPriceResponse]:
+    """従来の変換（1行ずつStockPriceResponseを検証して作成）"""
+    columns = price_format.frame_to_columns(hist)
+    return [
+        StockPriceResponse(
+            symbol=symbol, date=date, open_price=open_price, high_price=high_price, low_price=low_price,
+            close_price=close_price, volume=volume, adjusted_close=close_price
+        )
+        for date, open_price, high_price, low_price, close_price, volume in zip(
+            columns["dates"], columns["open"], columns["high"], columns["low"], columns["close"], columns["volume"]
+        )
+    ]
+
+
+def price_data(data: Any) -> Dict[str, Any]:
+    return {
+        "symbol": "6758", "company_name": "ソニーグループ株式会社", "current_price": 100.0, "change": 1.0,
+        "change_percent": 1.0, "volume": 1000, "market_cap": None, "data": data,
+    }
+
+
+def legacy_response(result: Dict[str, Any], columnar: bool) -> bytes:
+    """従来の経路（モデルを検証して作成し、response_modelで再検証・JSON互換の値に変換してjson.dumps）"""
+    model = StockPriceColumnarDataResponse(**result) if columnar else StockPriceDataResponse(**result)
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=model))
+    return JSONResponse(content).body
+
+
+def fast_response(result: Dict[str, Any], columnar: bool) -> bytes:
+    """orjsonの経路（model_constructで作成してorjsonで変換）"""
+    return FastJSONResponse(_price_model(result, columnar)).body
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """最速の実行時間（秒）を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="株価レスポンスのシリアライズのベンチマーク")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="足の数")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'layout':>8} {'stage':>10} {'legacy':>10} {'orjson':>10} {'speedup':>8} {'bars/s (orjson)':>16}")
+    for rows in args.rows:
+        hist = make_frame(rows)
+        legacy_data = price_data(legacy_records("6758", hist))
+        fast_data = price_data(price_format.frame_to_records("6758", hist))
+        columns_data = price_data(price_format.frame_to_columns(hist))
+        cases = {
+            # 作成済みの結果の変換のみ
+            ("rows", "serialize"): (lambda: legacy_response(legacy_data, False), lambda: fast_response(fast_data, False)),
+            ("columns", "serialize"): (lambda: legacy_response(columns_data, True), lambda: fast_response(columns_data, True)),
+            # DataFrameからの変換を含む
+            ("rows", "build+ser"): (
+                lambda: legacy_response(price_data(legacy_records("6758", hist)), False),
+                lambda: fast_response(price_data(price_format.frame_to_records("6758", hist)), False),
+            ),
+        }
+        # 同じJSONになることを確認
+        assert json.loads(legacy_response(legacy_data, False)) == json.loads(fast_response(fast_data, False))
+        assert json.loads(legacy_response(columns_data, True)) == json.loads(fast_response(columns_data, True))
+        for (layout, stage), (legacy, fast) in cases.items():
+            legacy_seconds = measure(legacy, args.repeat)
+            fast_seconds = measure(fast, args.repeat)
+            print(
+                f"{rows:>8} {layout:>8} {stage:>10} {legacy_seconds * 1000:>8.1f}ms {fast_seconds * 1000:>8.1f}ms "
+                f"{legacy_seconds / fast_seconds:>7.1f}x {rows / fast_seconds:>16,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
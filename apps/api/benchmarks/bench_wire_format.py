@@ -0,0 +1,81 @@
+"""
+株価レスポンスの形式ごとのベンチマーク
+JSON（rows・columns）、MessagePack、Arrow IPCストリーム（圧縮なし・zstd・lz4）について、
+サーバーでの変換時間、ペイロードのサイズ、クライアントでの読み込み時間を比較する
+
+実行例:
+    python -m benchmarks.bench_wire_format --rows 1000 10000 100000
+"""
+import argparse
+import json
+from typing import Any, Callable, Dict
+
+import msgpack
+import numpy as np
+import pyarrow as pa
+
+from benchmarks.bench_price_conversion import make_frame
+from benchmarks.bench_serialization import measure, price_data
+from routers.stock import _price_model
+from services import price_format, price_wire
+from services.json_response import FastJSONResponse
+from services.price_wire import WireFormat
+
+
+def json_case(hist, columnar: bool) -> Callable[[], bytes]:
+    def encode() -> bytes:
+        data = price_format.frame_to_columns(hist) if columnar else price_format.frame_to_records("6758", hist)
+        return FastJSONResponse(_price_model(price_data(data), columnar)).body
+    return encode
+
+
+def wire_case(hist, wire_format: WireFormat) -> Callable[[], bytes]:
+    return lambda: price_wire.encode_price(price_data(hist), wire_format)
+
+
+def read_arrow(payload: bytes) -> pa.Table:
+    return pa.ipc.open_stream(payload).read_all()
+
+
+def read_msgpack(payload: bytes) -> Dict[str, Any]:
+    """日時の列（int64のbin）はNumPyの配列として読む"""
+    result = msgpack.unpackb(payload)
+    result["data"]["dates"] = np.frombuffer(result["data"]["dates"], dtype=price_wire.MSGPACK_DATE_DTYPE)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="株価レスポンスの形式ごとのベンチマーク")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="足の数")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'format':>14} {'encode':>10} {'bytes':>12} {'size':>7} {'decode':>10} {'speedup':>8}")
+    for rows in args.rows:
+        hist = make_frame(rows)
+        # 形式ごとの(サーバーでの変換, クライアントでの読み込み)
+        cases: Dict[str, tuple] = {
+            "json rows": (json_case(hist, False), json.loads),
+            "json columns": (json_case(hist, True), json.loads),
+            "msgpack": (wire_case(hist, WireFormat(price_wire.MSGPACK)), read_msgpack),
+            "arrow": (wire_case(hist, WireFormat(price_wire.ARROW_STREAM)), read_arrow),
+            "arrow+zstd": (wire_case(hist, WireFormat(price_wire.ARROW_STREAM, "zstd")), read_arrow),
+            "arrow+lz4": (wire_case(hist, WireFormat(price_wire.ARROW_STREAM, "lz4")), read_arrow),
+        }
+        baseline: Dict[str, Any] = {}
+        for name, (encode, decode) in cases.items():
+            payload = encode()
+            encode_seconds = measure(encode, args.repeat)
+            decode_seconds = measure(lambda: decode(payload), args.repeat)
+            # 比較の基準は従来のJSON（rows）
+            baseline.setdefault("bytes", len(payload))
+            baseline.setdefault("decode", decode_seconds)
+            print(
+                f"{rows:>8} {name:>14} {encode_seconds * 1000:>8.1f}ms {len(payload):>12,} "
+                f"{baseline['bytes'] / len(payload):>6.1f}x {decode_seconds * 1000:>8.2f}ms "
+                f"{baseline['decode'] / decode_seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+ベンチマーク用の集計関数
+"""
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """パーセンタイル値を計算（線形補間）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """所要時間（秒）のリストからミリ秒単位の統計値を計算"""
+    return {
+        "count": len(durations),
+        "mean_ms": sum(durations) / len(durations) * 1000 if durations else 0.0,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "max_ms": max(durations) * 1000 if durations else 0.0,
+    }
@@ -14,6 +14,13 @@ class DatabaseConfig(BaseSettings):
     name: str = Field(default="mokabu_lens", description="データベース名")
     user: str = Field(default="postgres", description="データベースユーザー")
     password: str = Field(default="postgres", description="データベースパスワード")
+    executor_workers: int = Field(default=10, description="同期セッション実行用スレッド数", ge=1)
+    pool_size: int = Field(default=10, description="コネクションプールの常時保持数（同期セッション実行用スレッド数以上を推奨）", ge=1)
+    max_overflow: int = Field(default=10, description="常時保持数を超えて作成できる接続数", ge=0)
+    pool_timeout: float = Field(default=10.0, description="接続の取得待ちのタイムアウト（秒）", gt=0)
+    pool_recycle: int = Field(default=1800, description="接続を作り直すまでの秒数（-1で無効）", ge=-1)
+    pool_pre_ping: bool = Field(default=True, description="取得時に接続の生存確認を行うか")
+    statement_timeout: float = Field(default=0, description="ステートメントのタイムアウト（秒、0で無効、PostgreSQLのみ）", ge=0)
     
     @property
     def url(self) -> str:
@@ -48,6 +55,155 @@ class APIConfig(BaseSettings):
     model_config = ConfigDict(env_prefix="API_", case_sensitive=False)
 
 
+class ProviderConfig(BaseSettings):
+    """外部データ提供元設定"""
+    name: str = Field(default="yfinance", description="株価データ提供元（yfinance, synthetic, fixture）")
+    max_workers: int = Field(default=8, description="外部API呼び出しの同時実行数", ge=1)
+    timeout: float = Field(default=10.0, description="外部API呼び出しのタイムアウト（秒）", gt=0)
+    synthetic_seed: int = Field(default=0, description="合成データの乱数シード")
+    synthetic_latency: float = Field(default=0.0, description="合成データの呼び出し1回あたりの遅延（秒）", ge=0)
+    synthetic_jitter: float = Field(default=0.0, description="合成データの遅延のばらつき（秒）", ge=0)
+    synthetic_error_rate: float = Field(default=0.0, description="合成データの呼び出しが失敗する確率", ge=0, le=1)
+    fixture_dir: str = Field(default="fixtures/prices", description="fixture提供元が読み込むCSVのディレクトリ")
+    
+    @field_validator('name')
+    @classmethod
+    def validate_name(cls, v):
+        """提供元の検証"""
+        valid_names = ["yfinance", "synthetic", "fixture"]
+        if v.lower() not in valid_names:
+            raise ValueError(f"Invalid provider: {v}. Must be one of {valid_names}")
+        return v.lower()
+    
+    model_config = ConfigDict(env_prefix="PROVIDER_", case_sensitive=False)
+
+
+class CacheConfig(BaseSettings):
+    """プロセス内キャッシュ設定"""
+    info_max_entries: int = Field(default=5000, description="企業メタデータキャッシュの最大件数", ge=1)
+    info_max_bytes: int = Field(default=32 * 1024 * 1024, description="企業メタデータキャッシュの最大メモリ使用量（バイト）", ge=1)
+    info_ttl: float = Field(default=24 * 60 * 60, description="企業名・業種などの有効期間（秒）", gt=0)
+    info_market_ttl: float = Field(default=15 * 60, description="時価総額などの有効期間（秒）", gt=0)
+    price_ttl: float = Field(default=1.0, description="株価取得結果の再利用期間（秒、0で無効）", ge=0)
+    price_max_entries: int = Field(default=1000, description="株価取得結果キャッシュの最大件数", ge=1)
+    price_max_bytes: int = Field(default=64 * 1024 * 1024, description="株価取得結果キャッシュの最大メモリ使用量（バイト）", ge=1)
+    session_ttl: float = Field(default=300, description="取引時間中に外部APIから取得した直近の足の再利用期間（秒、0で無効）", ge=0)
+    session_max_entries: int = Field(default=1000, description="取引時間中の直近の足キャッシュの最大件数", ge=1)
+    session_max_bytes: int = Field(default=32 * 1024 * 1024, description="取引時間中の直近の足キャッシュの最大メモリ使用量（バイト）", ge=1)
+    
+    model_config = ConfigDict(env_prefix="CACHE_", case_sensitive=False)
+
+
+class PriceStoreConfig(BaseSettings):
+    """保存済み株価のストア設定"""
+    backend: str = Field(default="sql", description="株価の保存先（sql: stock_pricesテーブル、parquet・arrow: 銘柄・年ごとのファイル）")
+    directory: str = Field(default="data/prices", description="parquet・arrowの保存先ディレクトリ")
+    compression: str = Field(default="zstd", description="Parquetの圧縮方式（zstd, snappy, gzip, none）")
+    
+    @field_validator('backend')
+    @classmethod
+    def validate_backend(cls, v):
+        """保存先の検証"""
+        valid_backends = ["sql", "parquet", "arrow"]
+        if v.lower() not in valid_backends:
+            raise ValueError(f"Invalid price store backend: {v}. Must be one of {valid_backends}")
+        return v.lower()
+    
+    model_config = ConfigDict(env_prefix="PRICE_STORE_", case_sensitive=False)
+
+
+class SearchConfig(BaseSettings):
+    """銘柄検索設定"""
+    index_enabled: bool = Field(default=True, description="メモリ内検索インデックスを使用するか")
+    index_max_age: float = Field(default=300, description="検索インデックスを再構築するまでの秒数", gt=0)
+    
+    model_config = ConfigDict(env_prefix="SEARCH_", case_sensitive=False)
+
+
+class BackfillConfig(BaseSettings):
+    """株価一括取り込み設定"""
+    chunk_size: int = Field(default=50, description="1回の一括ダウンロードで取得する銘柄数", ge=1)
+    concurrency: int = Field(default=4, description="同時に実行する一括ダウンロード数（yfinanceは同時に実行できないため常に1）", ge=1)
+    timeout: float = Field(default=120.0, description="一括ダウンロード1回のタイムアウト（秒）", gt=0)
+    
+    model_config = ConfigDict(env_prefix="BACKFILL_", case_sensitive=False)
+
+
+class SyncConfig(BaseSettings):
+    """株価の差分同期設定"""
+    overlap_sessions: int = Field(default=3, description="事後修正を反映するため再取得する保存済みの直近営業日数", ge=0)
+    initial_period: str = Field(default="1mo", description="株価が未保存の銘柄を取得する期間")
+    
+    @field_validator('initial_period')
+    @classmethod
+    def validate_initial_period(cls, v):
+        """取得期間の検証"""
+        valid_periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd"]
+        if v not in valid_periods:
+            raise ValueError(f"Invalid initial period: {v}. Must be one of {valid_periods}")
+        return v
+    
+    model_config = ConfigDict(env_prefix="SYNC_", case_sensitive=False)
+
+
+class PrewarmConfig(BaseSettings):
+    """人気・最近リクエストされた銘柄の事前取得設定"""
+    enabled: bool = Field(default=True, description="起動時に事前取得のスケジューラーを開始するか")
+    open_interval: float = Field(default=300, description="取引時間中の実行間隔（秒）", gt=0)
+    closed_interval: float = Field(default=3600, description="取引時間外・休業日の実行間隔（秒）", gt=0)
+    concurrency: int = Field(default=4, description="企業メタデータの同時取得数", ge=1)
+    jitter: float = Field(default=0.1, description="実行間隔のばらつき（実行間隔に対する割合）", ge=0, le=1)
+    recent_max_symbols: int = Field(default=200, description="事前取得の対象にする最近リクエストされた銘柄の最大数", ge=0)
+    recent_ttl: float = Field(default=24 * 60 * 60, description="リクエストされた銘柄を事前取得の対象にする期間（秒）", gt=0)
+    
+    model_config = ConfigDict(env_prefix="PREWARM_", case_sensitive=False)
+
+
+class PopularConfig(BaseSettings):
+    """人気株式一覧の設定"""
+    concurrency: int = Field(default=8, description="データベースにない銘柄を外部APIから同時に取得する数", ge=1)
+    timeout: float = Field(default=3.0, description="1銘柄の取得のタイムアウト（秒、超えた銘柄は結果に含めない）", gt=0)
+    
+    model_config = ConfigDict(env_prefix="POPULAR_", case_sensitive=False)
+
+
+class HttpCacheConfig(BaseSettings):
+    """HTTPキャッシュ（ETag・Last-Modified・Cache-Control）の設定"""
+    enabled: bool = Field(default=True, description="株価・株式情報の応答にキャッシュ用のヘッダーを付け、条件付きリクエストに304を返すか")
+    open_max_age: int = Field(default=15, description="取引時間中のmax-age（秒）", ge=0)
+    closed_max_age: int = Field(default=3600, description="取引時間外のmax-age（秒、次の寄り付きまでの秒数を上限とする）", ge=0)
+    
+    model_config = ConfigDict(env_prefix="HTTP_CACHE_", case_sensitive=False)
+
+
+class StreamConfig(BaseSettings):
+    """株価データのストリーミング応答（NDJSON）の設定"""
+    batch_size: int = Field(default=1000, description="データベース・取得結果から1回に読み込んで送る足の数", ge=1)
+    
+    model_config = ConfigDict(env_prefix="STREAM_", case_sensitive=False)
+
+
+class CompressionConfig(BaseSettings):
+    """レスポンスの圧縮（gzip・brotli・zstd）の設定"""
+    enabled: bool = Field(default=True, description="Accept-Encodingに応じてレスポンスを圧縮するか")
+    minimum_size: int = Field(default=1024, description="圧縮する本文の最小サイズ（バイト、逐次送信の応答は常に圧縮）", ge=0)
+    gzip_level: int = Field(default=6, description="gzipの圧縮レベル", ge=1, le=9)
+    brotli_quality: int = Field(default=4, description="brotliの圧縮品質（brotliがインストールされている場合）", ge=0, le=11)
+    zstd_level: int = Field(default=3, description="zstdの圧縮レベル（zstandardがインストールされている場合）", ge=1, le=22)
+    cache_max_entries: int = Field(default=1000, description="圧縮済みの株価本文キャッシュの最大件数", ge=1)
+    cache_max_bytes: int = Field(default=16 * 1024 * 1024, description="圧縮済みの株価本文キャッシュの最大メモリ使用量（バイト）", ge=1)
+    
+    model_config = ConfigDict(env_prefix="COMPRESSION_", case_sensitive=False)
+
+
+class MetricsConfig(BaseSettings):
+    """処理時間の計測設定"""
+    enabled: bool = Field(default=True, description="リクエスト・処理段階ごとの処理時間を計測するか")
+    server_timing: bool = Field(default=True, description="Server-Timingヘッダーを返すか")
+    
+    model_config = ConfigDict(env_prefix="METRICS_", case_sensitive=False)
+
+
 class SecurityConfig(BaseSettings):
     """セキュリティ設定"""
     jwt_secret: str = Field(default="dev_jwt_secret", description="JWT署名キー")
@@ -86,6 +242,18 @@ class AppConfig(BaseSettings):
     # サブ設定
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
     api: APIConfig = Field(default_factory=APIConfig)
+    provider: ProviderConfig = Field(default_factory=ProviderConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    price_store: PriceStoreConfig = Field(default_factory=PriceStoreConfig)
+    search: SearchConfig = Field(default_factory=SearchConfig)
+    backfill: BackfillConfig = Field(default_factory=BackfillConfig)
+    sync: SyncConfig = Field(default_factory=SyncConfig)
+    prewarm: PrewarmConfig = Field(default_factory=PrewarmConfig)
+    popular: PopularConfig = Field(default_factory=PopularConfig)
+    http_cache: HttpCacheConfig = Field(default_factory=HttpCacheConfig)
+    stream: StreamConfig = Field(default_factory=StreamConfig)
+    compression: CompressionConfig = Field(default_factory=CompressionConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
     security: SecurityConfig = Field(default_factory=SecurityConfig)
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
     
@@ -2,19 +2,213 @@
 データベース接続設定
 モダンな設定管理パターンを使用
 """
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import settings
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from config import DatabaseConfig, settings
+from services.timing import Histogram
+
+
+class PoolMetrics:
+    """コネクションプールの取得待ち時間・タイムアウトの集計（スレッドセーフ）"""
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.wait = Histogram(
+            "mokabulens_db_pool_wait_seconds",
+            "コネクションプールからの接続取得の待ち時間",
+            ("engine",),
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+        )
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_checked_out = 0
+        self.max_overflow = 0
+
+    def record_checkout(self, pool: QueuePool, seconds: float) -> None:
+        """接続の取得を記録"""
+        with self._lock:
+            self.wait.observe((self.engine,), seconds)
+            self.checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, pool.checkedout())
+            self.max_overflow = max(self.max_overflow, pool.overflow())
+
+    def record_timeout(self, seconds: float) -> None:
+        """接続の取得待ちのタイムアウトを記録"""
+        with self._lock:
+            self.wait.observe((self.engine,), seconds)
+            self.timeouts += 1
+
+    def reset(self) -> None:
+        """すべての記録を削除"""
+        with self._lock:
+            self.wait.clear()
+            self.checkouts = 0
+            self.timeouts = 0
+            self.max_checked_out = 0
+            self.max_overflow = 0
+
+    def stats(self, pool: Any) -> Dict[str, Any]:
+        """統計情報を取得（QueuePool以外では現在の使用状況は含まない）"""
+        with self._lock:
+            result = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds": self.wait.sum((self.engine,)),
+                "max_checked_out": self.max_checked_out,
+                "max_overflow": self.max_overflow,
+            }
+        if isinstance(pool, QueuePool):
+            result.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        return result
+
+
+# Prometheus形式で出力する項目（名前, 種類, 説明）
+POOL_SERIES = [
+    ("size", "gauge", "コネクションプールの常時保持数"),
+    ("checked_out", "gauge", "使用中の接続数"),
+    ("checked_in", "gauge", "待機中の接続数"),
+    ("overflow", "gauge", "常時保持数を超えて作成された接続数"),
+    ("timeouts", "counter", "接続の取得待ちがタイムアウトした回数"),
+]
+
+
+def render_pool_metrics(pools: List[Tuple[PoolMetrics, Any]]) -> List[str]:
+    """複数のエンジンのプール統計をPrometheusのテキスト形式で出力"""
+    stats = [(metrics.engine, metrics.stats(pool)) for metrics, pool in pools]
+    lines = []
+    for key, kind, help_text in POOL_SERIES:
+        name = f"mokabulens_db_pool_{key}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{engine="{engine}"}} {values[key]}' for engine, values in stats if key in values]
+    for index, (metrics, _) in enumerate(pools):
+        with metrics._lock:
+            rendered = metrics.wait.render()
+        # HELP・TYPEは最初のエンジンのみ出力
+        lines += rendered[2:] if index else rendered
+    return lines
+
+
+# アプリケーション全体で共有する集計（同期エンジン・非同期エンジン）
+pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+
+
+# 同期ドライバーのURLと対応する非同期ドライバー
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+class MonitoredQueuePool(QueuePool):
+    """接続の取得待ち時間を計測するQueuePool"""
+
+    metrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        self.metrics.record_checkout(self, time.perf_counter() - started)
+        return connection
+
+
+class MonitoredAsyncQueuePool(MonitoredQueuePool, AsyncAdaptedQueuePool):
+    """接続の取得待ち時間を計測する非同期エンジン用のQueuePool"""
+
+    metrics = async_pool_metrics
+
+
+def create_database_engine(url: str, config: DatabaseConfig) -> Engine:
+    """
+    コネクションプールの設定を反映したエンジンを作成
+
+    pool_pre_pingで切断済みの接続（PgBouncerやデータベースの再起動後など）を取得時に検出して作り直し、
+    pool_recycleで長時間使った接続を定期的に作り直す
+    """
+    engine = create_engine(
+        url,
+        poolclass=MonitoredQueuePool,
+        pool_size=config.pool_size,
+        max_overflow=config.max_overflow,
+        pool_timeout=config.pool_timeout,
+        pool_recycle=config.pool_recycle,
+        pool_pre_ping=config.pool_pre_ping,
+    )
+
+    if config.statement_timeout and engine.dialect.name == "postgresql":
+        timeout_ms = int(config.statement_timeout * 1000)
+
+        @event.listens_for(engine, "connect")
+        def set_statement_timeout(dbapi_connection, connection_record):
+            """接続ごとにステートメントのタイムアウトを設定"""
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET statement_timeout = {timeout_ms}")
+            cursor.close()
+            dbapi_connection.commit()
+
+    return engine
+
+
+def to_async_url(url: str) -> str:
+    """同期ドライバーのURLを非同期ドライバー（asyncpg・aiosqlite）のURLに変換"""
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+def create_async_database_engine(url: str, config: DatabaseConfig) -> AsyncEngine:
+    """
+    コネクションプールの設定を反映した非同期エンジンを作成（PostgreSQLはasyncpg、SQLiteはaiosqlite）
+
+    クエリの待ち時間にスレッドを占有しないため、1つのワーカーで多数のリクエストを同時に処理できる
+    """
+    connect_args = {}
+    if config.statement_timeout and url.startswith("postgresql"):
+        connect_args["server_settings"] = {"statement_timeout": str(int(config.statement_timeout * 1000))}
+    return create_async_engine(
+        url,
+        poolclass=MonitoredAsyncQueuePool,
+        pool_size=config.pool_size,
+        max_overflow=config.max_overflow,
+        pool_timeout=config.pool_timeout,
+        pool_recycle=config.pool_recycle,
+        pool_pre_ping=config.pool_pre_ping,
+        connect_args=connect_args,
+    )
+
 
 # 設定からデータベースURLを取得
 DATABASE_URL = settings.database.url
 
 # SQLAlchemyエンジンを作成
-engine = create_engine(DATABASE_URL)
+engine = create_database_engine(DATABASE_URL, settings.database)
+async_engine = create_async_database_engine(to_async_url(DATABASE_URL), settings.database)
 
 # セッションファクトリーを作成
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# コミット後も読み込み済みの属性を使えるよう、期限切れにしない
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # ベースクラスを作成
 Base = declarative_base()
@@ -26,3 +220,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# 非同期データベースセッションを取得する関数
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
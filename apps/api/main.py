@@ -2,21 +2,65 @@
 MokabuLens API
 モダンな設定管理とセキュリティを実装
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+import logging
+
 from config import settings
-from routers import stock
+from database import async_engine, get_db
+from routers import metrics, stock
+from services.compression import CompressionMiddleware
+from services.executor import shutdown_executors
+from services.prewarm import prewarm_scheduler
+from services.stock_service import StockService
+from services.timing import TimingMiddleware
 
 # 環境変数を読み込み
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+async def build_search_index(app: FastAPI) -> None:
+    """起動時に銘柄検索インデックスを構築"""
+    if not settings.search.index_enabled:
+        return
+    # テストなどで差し替えられたセッションも使えるよう、依存関係を解決して取得
+    sessions = app.dependency_overrides.get(get_db, get_db)()
+    try:
+        count = await StockService(next(sessions)).rebuild_search_index()
+        logger.info(f"検索インデックスを構築しました: {count}件")
+    except Exception as e:
+        # 失敗した場合は最初の検索時に再度構築する
+        logger.warning(f"検索インデックスの構築に失敗しました: {e}")
+    finally:
+        sessions.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """アプリケーションの起動・終了処理"""
+    await build_search_index(app)
+    # 人気・最近リクエストされた銘柄の事前取得を開始
+    if settings.prewarm.enabled:
+        prewarm_scheduler.start()
+    yield
+    await prewarm_scheduler.stop()
+    # ブロッキング処理用のスレッドプールを停止
+    shutdown_executors()
+    await async_engine.dispose()
+
+
 # FastAPIアプリケーションを作成
 app = FastAPI(
     title="MokabuLens API",
     description="MokabuLens Backend API",
     version=settings.version,
     debug=settings.api.debug,
+    lifespan=lifespan,
 )
 
 # CORS設定
@@ -28,8 +72,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Accept-Encodingに応じたレスポンスの圧縮（処理時間の計測に圧縮を含めるため、計測より内側に登録）
+if settings.compression.enabled:
+    app.add_middleware(CompressionMiddleware)
+
+# 処理時間の計測（無効な場合はミドルウェアを登録しない）
+if settings.metrics.enabled:
+    app.add_middleware(TimingMiddleware, server_timing=settings.metrics.server_timing)
+
 # ルーターを追加
 app.include_router(stock.router, prefix=f"/api/{settings.api.version}")
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,67 @@
+"""
+株価データの移行コマンド
+stock_pricesテーブルの日足を列指向の株価データストア（銘柄・年ごとのParquet・Arrowファイル）へ移行する
+
+実行例:
+    python -m migrate_prices
+    python -m migrate_prices --format arrow --directory ./data/prices-arrow
+    python -m migrate_prices --symbols-file symbols.txt --batch-size 200
+
+移行後に PRICE_STORE_BACKEND と PRICE_STORE_DIRECTORY を同じ設定にすると、保存済み株価をファイルから読み込む
+"""
+import argparse
+import logging
+import sys
+
+from sqlalchemy import func
+
+from config import settings
+from database import SessionLocal
+from models.stock import StockPrice
+from services.backfill import load_symbols_from_file
+from services.columnar_store import ColumnarPriceStore, migrate_from_sql
+
+logger = logging.getLogger("migrate_prices")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="stock_pricesから列指向の株価データストアへの移行")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet", help="ファイル形式")
+    parser.add_argument("--directory", default=settings.price_store.directory, help="保存先ディレクトリ")
+    parser.add_argument("--compression", default=settings.price_store.compression, help="Parquetの圧縮方式")
+    parser.add_argument("--symbols-file", help="銘柄リストのファイル（1行1銘柄）。省略時はstock_pricesのすべての銘柄")
+    parser.add_argument("--batch-size", type=int, default=100, help="1回のクエリで読み込む銘柄数")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace) -> int:
+    store = ColumnarPriceStore(args.directory, format=args.format, compression=args.compression)
+    symbols = load_symbols_from_file(args.symbols_file) if args.symbols_file else None
+    db = SessionLocal()
+    try:
+        logger.info(f"株価データの移行を開始します: {args.directory}（{args.format}）")
+        migrated = migrate_from_sql(db, store, symbols, batch_size=args.batch_size)
+
+        # 銘柄を指定しない場合は、stock_pricesの全行を移行できたか確認
+        if symbols is None:
+            expected = db.query(func.count(StockPrice.id)).scalar()
+            if migrated["rows"] != expected:
+                logger.error(f"移行した行数が一致しません: {migrated['rows']}行（stock_prices: {expected}行）")
+                return 1
+
+        logger.info(
+            f"株価データの移行が完了しました: {migrated['symbols']}銘柄 {migrated['rows']}行 "
+            f"({store.disk_usage() / 1024 / 1024:.1f}MB)"
+        )
+        return 0
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=settings.logging.level, format=settings.logging.format)
+    return run(parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
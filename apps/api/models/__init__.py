@@ -4,6 +4,6 @@ Models package for MokabuLens API
 """
 
 from .user import User
-from .stock import StockInfo, StockPrice
+from .stock import StockInfo, StockPrice, PriceBackfillCheckpoint, PriceHistoryStart
 
-__all__ = ["User", "StockInfo", "StockPrice"]
+__all__ = ["User", "StockInfo", "StockPrice", "PriceBackfillCheckpoint", "PriceHistoryStart"]
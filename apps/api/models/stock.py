@@ -5,7 +5,7 @@
 from datetime import datetime, timezone
 from typing import Optional, List
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from database import Base
 
@@ -24,6 +24,18 @@ class StockInfo(Base):
     is_active = Column(Boolean, default=True, comment="アクティブフラグ")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), comment="作成日時")
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), comment="更新日時")
+    
+    __table_args__ = (
+        # 企業名の部分一致検索用（PostgreSQLのpg_trgm GINインデックス）
+        Index(
+            "ix_stock_info_company_name_trgm", "company_name",
+            postgresql_using="gin", postgresql_ops={"company_name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_stock_info_company_name_en_trgm", "company_name_en",
+            postgresql_using="gin", postgresql_ops={"company_name_en": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
 
 
 class StockPrice(Base):
@@ -31,7 +43,7 @@ class StockPrice(Base):
     __tablename__ = "stock_prices"
     
     id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String(20), nullable=False, index=True, comment="証券コード")
+    symbol = Column(String(20), nullable=False, comment="証券コード")
     date = Column(DateTime, nullable=False, index=True, comment="日付")
     open_price = Column(Float, nullable=True, comment="始値")
     high_price = Column(Float, nullable=True, comment="高値")
@@ -40,6 +52,47 @@ class StockPrice(Base):
     volume = Column(Integer, nullable=True, comment="出来高")
     adjusted_close = Column(Float, nullable=True, comment="調整後終値")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), comment="作成日時")
+    
+    __table_args__ = (
+        # 1銘柄1日1レコード（ON CONFLICTによる一括upsertの競合対象、銘柄単位の検索にも使用）
+        Index("ix_stock_prices_symbol_date", "symbol", "date", unique=True),
+    )
+
+
+class PriceBackfillCheckpoint(Base):
+    """株価一括取り込みの進捗テーブル（中断後の再開用）"""
+    __tablename__ = "price_backfill_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job = Column(String(50), nullable=False, comment="ジョブ名")
+    symbol = Column(String(20), nullable=False, comment="証券コード")
+    status = Column(String(20), nullable=False, comment="状態（done: 完了、failed: 失敗）")
+    rows = Column(Integer, nullable=False, default=0, comment="保存した行数")
+    last_date = Column(DateTime, nullable=True, comment="保存した最新の日付")
+    error = Column(Text, nullable=True, comment="失敗時のエラー")
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), comment="更新日時")
+    
+    __table_args__ = (
+        Index("ix_price_backfill_checkpoints_job_symbol", "job", "symbol", unique=True),
+    )
+
+
+class PriceHistoryStart(Base):
+    """外部APIで取得できる株価の最初の日付のテーブル（上場から期間に満たない銘柄の先頭を再取得しないため）"""
+    __tablename__ = "price_history_starts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String(20), unique=True, index=True, nullable=False, comment="証券コード")
+    first_date = Column(DateTime, nullable=False, comment="取得できる最初の日付")
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), comment="更新日時")
+
+
+# 株価取得で指定できる期間とデータ間隔
+VALID_PERIODS = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
+VALID_INTERVALS = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
+
+# 一括取得で指定できる最大銘柄数
+MAX_BATCH_SYMBOLS = 50
 
 
 # Pydanticモデル（APIレスポンス用）
@@ -90,20 +143,44 @@ class StockPriceRequest(BaseModel):
     @field_validator('period')
     @classmethod
     def validate_period(cls, v):
-        valid_periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
-        if v not in valid_periods:
-            raise ValueError(f"Invalid period: {v}. Must be one of {valid_periods}")
+        if v not in VALID_PERIODS:
+            raise ValueError(f"Invalid period: {v}. Must be one of {VALID_PERIODS}")
         return v
     
     @field_validator('interval')
     @classmethod
     def validate_interval(cls, v):
-        valid_intervals = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
-        if v not in valid_intervals:
-            raise ValueError(f"Invalid interval: {v}. Must be one of {valid_intervals}")
+        if v not in VALID_INTERVALS:
+            raise ValueError(f"Invalid interval: {v}. Must be one of {VALID_INTERVALS}")
         return v
 
 
+class StockPriceBatchRequest(BaseModel):
+    """複数銘柄の株価一括取得リクエスト"""
+    symbols: List[str] = Field(..., description="証券コードのリスト", min_length=1, max_length=MAX_BATCH_SYMBOLS)
+    period: str = Field(default="1d", description="取得期間")
+    interval: str = Field(default="1d", description="データ間隔")
+    
+    @field_validator('symbols')
+    @classmethod
+    def validate_symbols(cls, v):
+        symbols = [symbol.strip() for symbol in v]
+        if any(not symbol for symbol in symbols):
+            raise ValueError("Symbols must not be empty")
+        # 重複を除去（順序は維持）
+        return list(dict.fromkeys(symbols))
+    
+    @field_validator('period')
+    @classmethod
+    def validate_period(cls, v):
+        return StockPriceRequest.validate_period(v)
+    
+    @field_validator('interval')
+    @classmethod
+    def validate_interval(cls, v):
+        return StockPriceRequest.validate_interval(v)
+
+
 class StockPriceDataResponse(BaseModel):
     """株価データ取得レスポンス"""
     symbol: str = Field(..., description="証券コード")
@@ -116,6 +193,29 @@ class StockPriceDataResponse(BaseModel):
     data: List[StockPriceResponse] = Field(..., description="価格データ")
 
 
+class StockPriceColumns(BaseModel):
+    """株価データ（列指向）"""
+    dates: List[datetime] = Field(..., description="日付")
+    open: List[Optional[float]] = Field(..., description="始値")
+    high: List[Optional[float]] = Field(..., description="高値")
+    low: List[Optional[float]] = Field(..., description="安値")
+    close: List[Optional[float]] = Field(..., description="終値")
+    volume: List[Optional[int]] = Field(..., description="出来高")
+    adjusted_close: List[Optional[float]] = Field(..., description="調整後終値")
+
+
+class StockPriceColumnarDataResponse(StockPriceDataResponse):
+    """株価データ取得レスポンス（価格データは列指向）"""
+    data: StockPriceColumns = Field(..., description="価格データ（列指向）")
+
+
+class StockPriceBatchResponse(BaseModel):
+    """複数銘柄の株価一括取得レスポンス"""
+    results: List[StockPriceDataResponse] = Field(..., description="銘柄ごとの株価データ")
+    missing: List[str] = Field(default_factory=list, description="株価データが見つからなかった証券コード")
+    total: int = Field(..., description="取得できた銘柄数")
+
+
 class ErrorResponse(BaseModel):
     """エラーレスポンス"""
     error: str = Field(..., description="エラーメッセージ")
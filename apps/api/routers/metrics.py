@@ -0,0 +1,71 @@
+"""
+メトリクスAPIルーター
+処理時間やキャッシュなどの内部状態を確認するためのエンドポイント
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from database import async_engine, async_pool_metrics, engine, pool_metrics, render_pool_metrics
+from services.compression import compressed_cache
+from services.info_cache import info_cache
+from services.prewarm import prewarm_scheduler
+from services.price_coalescer import price_coalescer
+from services.session_bars import session_bars
+from services.timing import timing_metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+# Prometheusのテキスト形式
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    処理時間・コネクションプールのメトリクスをPrometheus形式で取得する
+    
+    ルートごとのリクエスト処理時間と、処理段階（外部API・データベース・シリアライズなど）ごとの
+    所要時間のヒストグラム、コネクションプールの使用状況を返します。
+    """
+    pools = [(pool_metrics, engine.pool), (async_pool_metrics, async_engine.pool)]
+    body = timing_metrics.render() + "\n".join(render_pool_metrics(pools)) + "\n"
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/pool")
+async def get_pool_metrics():
+    """
+    コネクションプールの統計情報を取得する
+    
+    同期エンジン（sync）・非同期エンジン（async）ごとに、使用中・待機中・超過作成された接続数、
+    接続の取得回数・待ち時間の合計・タイムアウト回数を返します。
+    """
+    return {
+        "sync": pool_metrics.stats(engine.pool),
+        "async": async_pool_metrics.stats(async_engine.pool),
+    }
+
+
+@router.get("/cache")
+async def get_cache_metrics():
+    """
+    キャッシュの統計情報を取得する
+    
+    ヒット数・ミス数・削除数などを返します。
+    """
+    return {
+        "info": info_cache.stats(),
+        "price": price_coalescer.stats(),
+        "compressed": compressed_cache.stats(),
+        "session": session_bars.stats(),
+    }
+
+
+@router.get("/prewarm")
+async def get_prewarm_metrics():
+    """
+    事前取得スケジューラーの状態を取得する
+    
+    実行回数・失敗回数、対象の銘柄数、直近の実行結果と次回の実行予定時刻を返します。
+    """
+    return prewarm_scheduler.stats()
@@ -2,28 +2,105 @@
 株価情報APIルーター
 株式検索と価格データ取得のエンドポイント
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
 import logging
 
-from database import get_db
+from config import settings
+from database import get_async_db, get_db
+from services import compression, http_cache, json_response, market_calendar, price_format, price_wire
+from services.http_cache import ResourceVersion
+from services.price_wire import WireFormat
+from services.json_response import FastJSONResponse
+from services.prewarm import POPULAR_SYMBOLS, recent_symbols
 from services.stock_service import StockService
+from services.timing import TimedRoute
 from models.stock import (
-    StockInfo, StockSearchRequest, StockSearchResponse, StockPriceRequest, 
-    StockPriceDataResponse, StockInfoResponse, ErrorResponse
+    StockSearchRequest, StockSearchResponse, StockPriceRequest, 
+    StockPriceDataResponse, StockInfoResponse, ErrorResponse,
+    StockPriceBatchRequest, StockPriceBatchResponse, StockPriceColumnarDataResponse, StockPriceColumns
 )
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/stocks", tags=["stocks"])
+router = APIRouter(prefix="/stocks", tags=["stocks"], route_class=TimedRoute, default_response_class=FastJSONResponse)
+
+
+# 株価取得の応答はAccept（形式）とAccept-Encoding（圧縮方式）で表現が変わる（304にも同じ値を付ける）
+PRICE_VARY = "Accept, Accept-Encoding"
+
+
+def _not_modified(request: Request, version: Optional[ResourceVersion]) -> Optional[Response]:
+    """条件付きリクエストの版が一致する場合は本文なしの304レスポンスを返す"""
+    if not settings.http_cache.enabled or version is None:
+        return None
+    if not http_cache.is_not_modified(request.headers, version):
+        return None
+    return Response(status_code=304, headers=http_cache.cache_headers(version, market_calendar.market_now()))
+
+
+def _set_cache_headers(response: Response, version: Optional[ResourceVersion]) -> None:
+    """ETag・Last-Modified・Cache-Controlを付ける"""
+    if settings.http_cache.enabled and version is not None:
+        response.headers.update(http_cache.cache_headers(version, market_calendar.market_now()))
+
+
+def _wire_format(request: Request) -> Optional[WireFormat]:
+    """Acceptヘッダーからバイナリ形式を選ぶ（JSONの場合はNone、対応していない圧縮方式は406）"""
+    try:
+        return price_wire.negotiate(request.headers.get("accept"))
+    except price_wire.WireFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+def _wire_version(version: Optional[ResourceVersion], wire_format: Optional[WireFormat]) -> Optional[ResourceVersion]:
+    """形式ごとに別のETagにする（同じ足でもJSONとArrowなどは別の表現）"""
+    if version is None or wire_format is None:
+        return version
+    return version._replace(etag=http_cache.make_etag(version.etag, wire_format.content_type))
+
+
+def _encoded_response(
+    request: Request, version: Optional[ResourceVersion], media_type: str, render: Callable[[], bytes]
+) -> Response:
+    """
+    株価取得結果の本文をAccept-Encodingに応じて圧縮したレスポンスを作成
+
+    圧縮済みの本文は形式ごとのETagをキーにcompressed_cacheに保持し、同じ表現は1回だけ圧縮する
+    """
+    encoding = None
+    if settings.compression.enabled and "compression=" not in media_type:
+        encoding = compression.negotiate(request.headers.get("accept-encoding"))
+    key = version.etag if version is not None else None
+    body, content_encoding = compression.compress_cached(key, render, encoding)
+    response = Response(body, media_type=media_type, headers={"Vary": PRICE_VARY})
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    return response
+
+
+def _price_model(price_data: Dict[str, Any], columnar: bool = False) -> StockPriceDataResponse:
+    """
+    株価取得結果からレスポンスモデルを作成
+
+    価格データはサービス層で作成済みのため、model_constructで検証を省く
+    """
+    fields = {name: price_data.get(name) for name in StockPriceDataResponse.model_fields}
+    if columnar:
+        fields["data"] = StockPriceColumns.model_construct(**price_data["data"])
+        return StockPriceColumnarDataResponse.model_construct(**fields)
+    return StockPriceDataResponse.model_construct(**fields)
 
 
 @router.get("/search", response_model=StockSearchResponse)
 async def search_stocks(
     query: str = Query(..., description="検索クエリ（企業名または証券コード）", min_length=1),
     limit: int = Query(default=10, description="検索結果の最大件数", ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
 ):
     """
     株式を検索する
@@ -32,7 +109,7 @@ async def search_stocks(
     検索結果は最大50件まで返されます。
     """
     try:
-        stock_service = StockService(db)
+        stock_service = StockService(db, async_session=async_db)
         results = await stock_service.search_stocks(query, limit)
         
         return StockSearchResponse(
@@ -45,11 +122,17 @@ async def search_stocks(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{symbol}/price", response_model=StockPriceDataResponse)
+@router.get("/{symbol}/price", response_model=Union[StockPriceDataResponse, StockPriceColumnarDataResponse])
 async def get_stock_price(
     symbol: str,
+    request: Request,
     period: str = Query(default="1d", description="取得期間"),
     interval: str = Query(default="1d", description="データ間隔"),
+    layout: str = Query(default="rows", description="価格データの形式（rows: 1行ずつ、columns: 列指向）", pattern="^(rows|columns)$"),
+    resample: Optional[str] = Query(default=None, description="集約後の足種（1wk, 1mo, 3mo）", pattern="^(1wk|1mo|3mo)$"),
+    max_points: Optional[int] = Query(default=None, description="最大の足数（超える場合は間引く）", ge=2),
+    downsample: str = Query(default="ohlc", description="間引き方（ohlc: 足を集約、lttb: 折れ線向けに足を選ぶ）", pattern="^(ohlc|lttb)$"),
+    stream: bool = Query(default=False, description="価格データを1行1件のJSON（NDJSON）で逐次返すか"),
     db: Session = Depends(get_db)
 ):
     """
@@ -57,36 +140,170 @@ async def get_stock_price(
     
     指定された証券コードの株価データを取得します。
     期間とデータ間隔を指定できます。
+    layout=columnsを指定すると、価格データを列ごとの配列（dates, open, ...）で返します。
+    resample=1wkなどを指定すると、取得した足を週足・月足・四半期足に集約して返します。
+    max_points を指定すると、足数がそれを超える場合にサーバー側で間引いて返します
+    （downsample=ohlcは連続する足のOHLCVを集約、downsample=lttbは終値の形を保つ足を選びます）。
+    ETagとLast-Modifiedを返し、If-None-Match・If-Modified-Sinceが一致する場合は304を返します
+    （保存済みの日足だけで応答できる場合は、外部APIを呼ばずに判定します）。
+    stream=trueを指定すると、価格データの足を日付順に1行1件のJSON（application/x-ndjson）で逐次返します。
+    Acceptにapplication/vnd.apache.arrow.streamを指定するとApache Arrow IPCストリームで、
+    application/x-msgpackを指定するとMessagePack（layout=columnsと同じ構造）で返します。
+    Arrowは compression=zstd または lz4 のパラメーターでバッファを圧縮します。
     """
+    if stream and (resample or max_points):
+        raise HTTPException(status_code=400, detail="stream=trueはresample・max_pointsと同時に指定できません")
+    wire_format = None if stream else _wire_format(request)
+    
     try:
         stock_service = StockService(db)
-        price_data = await stock_service.get_stock_price(symbol, period, interval)
+        if stream:
+            return await _stream_price(stock_service, symbol, period, interval)
+        
+        # バイナリ形式はDataFrameから直接変換する
+        data_layout = "frame" if wire_format else layout
+        options = {"resample": resample, "max_points": max_points, "downsample": downsample}
+        
+        if settings.http_cache.enabled and http_cache.has_conditions(request.headers):
+            # 本文を作る前に、保存済みの足のみから版を確認
+            version = await stock_service.get_price_version(symbol, period, interval, data_layout, **options)
+            not_modified = _not_modified(request, _wire_version(version, wire_format))
+            if not_modified is not None:
+                recent_symbols.record(symbol)
+                not_modified.headers["Vary"] = PRICE_VARY
+                return not_modified
+        
+        price_data = await stock_service.get_stock_price(symbol, period, interval, data_layout, **options)
+        # 事前取得の対象に追加
+        recent_symbols.record(symbol)
+        
+        version = _wire_version(price_data["version"], wire_format)
+        not_modified = _not_modified(request, version)
+        if not_modified is not None:
+            not_modified.headers["Vary"] = PRICE_VARY
+            return not_modified
         
-        return StockPriceDataResponse(**price_data)
+        if wire_format:
+            price_response = _encoded_response(
+                request, version, wire_format.content_type, lambda: price_wire.encode_price(price_data, wire_format)
+            )
+        else:
+            # response_modelによる再検証・jsonable_encoderを通さずにorjsonで変換する
+            price_response = _encoded_response(
+                request, version, "application/json",
+                lambda: json_response.dumps(_price_model(price_data, layout == "columns"))
+            )
+        _set_cache_headers(price_response, version)
+        return price_response
         
     except Exception as e:
         logger.error(f"株価取得エラー ({symbol}): {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _stream_price(stock_service: StockService, symbol: str, period: str, interval: str) -> StreamingResponse:
+    """株価データをNDJSONで逐次返すレスポンスを作成（最初の足の取得までは通常のエラー応答にする）"""
+    batches = stock_service.stream_stock_price(symbol, period, interval, settings.stream.batch_size)
+    first = await anext(batches, None)
+    if first is None or first.empty:
+        await batches.aclose()
+        raise Exception(f"株価データが見つかりません: {symbol}")
+    recent_symbols.record(symbol)
+    
+    async def body() -> AsyncIterator[bytes]:
+        batch = first
+        try:
+            while batch is not None:
+                if not batch.empty:
+                    yield price_format.frame_to_ndjson(symbol, batch)
+                batch = await anext(batches, None)
+        except Exception as e:
+            # 送信を始めた後はステータスを変えられないため、ログに残して打ち切る
+            logger.error(f"株価ストリーミングエラー ({symbol}): {e}")
+        finally:
+            await batches.aclose()
+    
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.post("/prices/batch", response_model=StockPriceBatchResponse)
+async def get_stock_prices_batch(
+    request: StockPriceBatchRequest,
+    http_request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    複数銘柄の株価データを一括取得する
+    
+    ウォッチリストなど複数の証券コードの株価データをまとめて取得します。
+    外部APIへの問い合わせは1回の一括ダウンロードにまとめられます。
+    Acceptで株価取得APIと同じバイナリ形式（Arrow IPCストリーム、MessagePack）を指定できます。
+    Arrowでは全銘柄を1つのストリームにまとめ、symbol列で銘柄を区別します。
+    """
+    wire_format = _wire_format(http_request)
+    try:
+        stock_service = StockService(db)
+        results = await stock_service.get_stock_prices(
+            request.symbols, request.period, request.interval, "frame" if wire_format else "rows"
+        )
+        
+        found_symbols = {result["symbol"] for result in results}
+        for symbol in found_symbols:
+            recent_symbols.record(symbol)
+        missing = [symbol for symbol in request.symbols if symbol not in found_symbols]
+        if wire_format:
+            return Response(
+                price_wire.encode_prices(results, missing, wire_format),
+                media_type=wire_format.content_type,
+                headers={"Vary": "Accept"}
+            )
+        return FastJSONResponse(StockPriceBatchResponse.model_construct(
+            results=[_price_model(result) for result in results],
+            missing=missing,
+            total=len(results)
+        ), headers={"Vary": "Accept"})
+        
+    except Exception as e:
+        logger.error(f"株価一括取得エラー: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{symbol}/info")
 async def get_stock_info(
     symbol: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
 ):
     """
     株式基本情報を取得する
     
     指定された証券コードの基本情報を取得します。
+    ETagとLast-Modified（stock_infoの更新日時）を返し、条件付きリクエストが一致する場合は304を返します。
     """
     try:
-        stock_service = StockService(db)
-        results = await stock_service.search_stocks(symbol, 1)
+        stock_service = StockService(db, async_session=async_db)
+        version = await stock_service.get_info_version(symbol) if settings.http_cache.enabled else None
+        not_modified = _not_modified(request, version)
+        if not_modified is not None:
+            recent_symbols.record(symbol)
+            return not_modified
         
-        if not results:
+        stock_info = await stock_service.get_stock_info(symbol)
+        
+        if not stock_info:
             raise HTTPException(status_code=404, detail=f"株式情報が見つかりません: {symbol}")
         
-        return results[0]
+        recent_symbols.record(symbol)
+        if version is None and settings.http_cache.enabled:
+            # データベースにない銘柄は、外部APIから取得した内容から版を計算
+            version = ResourceVersion(http_cache.make_etag("info", *stock_info.model_dump().values()))
+            not_modified = _not_modified(request, version)
+            if not_modified is not None:
+                return not_modified
+        _set_cache_headers(response, version)
+        return stock_info
         
     except HTTPException:
         raise
@@ -98,27 +315,37 @@ async def get_stock_info(
 @router.post("/{symbol}/save")
 async def save_stock_data(
     symbol: str,
-    db: Session = Depends(get_db)
+    mode: str = Query(default="incremental", description="株価データの保存方法（incremental: 差分同期、full: 1か月分を再保存）", pattern="^(incremental|full)$"),
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
 ):
     """
     株式データをデータベースに保存する
     
     指定された証券コードの情報と価格データをデータベースに保存します。
+    価格データは保存済みの最終日以降（直近数営業日の修正を含む）のみを取得して保存します。
+    mode=fullを指定すると、1か月分を取得し直してすべて保存します。
     """
     try:
-        stock_service = StockService(db)
+        stock_service = StockService(db, async_session=async_db)
         
         # 基本情報を取得して保存
-        search_results = await stock_service.search_stocks(symbol, 1)
-        if search_results:
-            await stock_service.save_stock_info(search_results[0])
+        stock_info = await stock_service.get_stock_info(symbol)
+        if stock_info:
+            await stock_service.save_stock_info(stock_info)
         
-        # 価格データを取得して保存
-        price_data = await stock_service.get_stock_price(symbol, "1mo", "1d")
-        if price_data.get("data"):
-            await stock_service.save_stock_price(symbol, price_data["data"])
+        if mode == "incremental":
+            # 不足分のみ取得して保存
+            synced = await stock_service.sync_prices([symbol])
+            rows = synced[symbol]
+        else:
+            # 価格データを取得して保存
+            price_data = await stock_service.get_stock_price(symbol, "1mo", "1d")
+            rows = len(price_data.get("data") or [])
+            if rows:
+                await stock_service.save_stock_price(symbol, price_data["data"])
         
-        return {"message": f"株式データを保存しました: {symbol}"}
+        return {"message": f"株式データを保存しました: {symbol}", "rows": rows}
         
     except Exception as e:
         logger.error(f"株式データ保存エラー ({symbol}): {e}")
@@ -128,56 +355,40 @@ async def save_stock_data(
 @router.get("/popular")
 async def get_popular_stocks(
     limit: int = Query(default=20, description="取得件数", ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
 ):
     """
     人気株式一覧を取得する
     
     主要な日本株の一覧を返します。
+    データベースにない銘柄は外部APIから並行して取得し、タイムアウトした銘柄はmissingに含めます。
     """
     try:
-        # 主要な日本株の証券コード
-        popular_symbols = [
-            "6758",  # ソニーグループ
-            "9984",  # ソフトバンクグループ
-            "7203",  # トヨタ自動車
-            "8306",  # 三菱UFJフィナンシャル・グループ
-            "6861",  # キーエンス
-            "9433",  # KDDI
-            "4063",  # 信越化学工業
-            "8035",  # 東京エレクトロン
-            "4519",  # 中外製薬
-            "6501",  # 日立製作所
-            "1605",  # INPEX
-        ]
+        popular_symbols = POPULAR_SYMBOLS[:limit]
         
-        stock_service = StockService(db)
+        stock_service = StockService(db, async_session=async_db)
         
         # 証券コードをOR条件で一括検索
-        db_results = db.query(StockInfo).filter(
-            StockInfo.symbol.in_(popular_symbols[:limit]),
-            StockInfo.is_active == True
-        ).all()
-        
-        results = []
-        for stock in db_results:
-            results.append(StockInfoResponse.model_validate(stock))
-        
-        # データベースにない銘柄は外部APIから取得
-        found_symbols = {stock.symbol for stock in db_results}
-        missing_symbols = [symbol for symbol in popular_symbols[:limit] if symbol not in found_symbols]
-        
-        for symbol in missing_symbols:
-            try:
-                search_results = await stock_service.search_stocks(symbol, 1)
-                if search_results:
-                    results.append(search_results[0])
-            except Exception as e:
-                logger.warning(f"人気株式取得エラー ({symbol}): {e}")
-                continue
+        results = await stock_service.get_stocks_by_symbols(popular_symbols)
+        
+        # データベースにない銘柄は外部APIから並行取得（通常は事前取得で保存済み）
+        found_symbols = {stock.symbol for stock in results}
+        missing_symbols = [symbol for symbol in popular_symbols if symbol not in found_symbols]
+        missing = []
+        if missing_symbols:
+            fetched, missing = await stock_service.fetch_stock_infos(
+                missing_symbols, settings.popular.concurrency, settings.popular.timeout
+            )
+            results.extend(fetched)
+        
+        # 人気銘柄の順に並べる
+        order = {symbol: index for index, symbol in enumerate(popular_symbols)}
+        results.sort(key=lambda stock: order[stock.symbol])
         
         return {
             "results": results,
+            "missing": missing,
             "total": len(results)
         }
         
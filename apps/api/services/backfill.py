@@ -0,0 +1,245 @@
+"""
+株価の一括取り込み（バックフィル）
+銘柄リストを一括ダウンロード単位に分割し、同時実行数を制限しながら全期間の日足を取得してstock_pricesへ保存する。
+銘柄ごとの進捗はprice_backfill_checkpointsに記録し、中断後は未完了の銘柄から再開する
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.stock import PriceBackfillCheckpoint, StockInfo
+from services import market_calendar, price_store
+from services.executor import db_executor, provider_executor
+from services.market_data import MarketDataProvider
+from services.price_store import SqlPriceStore
+
+logger = logging.getLogger(__name__)
+
+# チェックポイントの状態（完了以外は次回の実行で再取得する）
+DONE = "done"
+EMPTY = "empty"
+FAILED = "failed"
+
+
+def load_symbols_from_file(path: str) -> List[str]:
+    """銘柄リストのファイルを読み込む（1行1銘柄、空行と#以降は無視、重複は除外）"""
+    symbols = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        symbol = line.split("#", 1)[0].strip()
+        if symbol:
+            symbols.append(symbol)
+    return list(dict.fromkeys(symbols))
+
+
+def load_symbols_from_database(db: Session) -> List[str]:
+    """stock_infoに登録されているアクティブな銘柄を取得"""
+    rows = db.query(StockInfo.symbol).filter(StockInfo.is_active.is_(True)).order_by(StockInfo.symbol).all()
+    return [row.symbol for row in rows]
+
+
+@dataclass
+class BackfillReport:
+    """取り込み結果"""
+    total: int = 0
+    skipped: int = 0
+    completed: int = 0
+    empty: int = 0
+    failed: int = 0
+    rows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"銘柄 {self.total}件（完了 {self.completed}、データなし {self.empty}、失敗 {self.failed}、"
+            f"完了済みのため省略 {self.skipped}） / {self.rows}行 / {self.elapsed:.1f}秒 / {self.rows_per_second:,.0f}行/秒"
+        )
+
+
+class PriceBackfill:
+    """株価の一括取り込みジョブ"""
+
+    def __init__(
+        self,
+        db: Session,
+        provider: MarketDataProvider,
+        job: str = "default",
+        start: Optional[date] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            db: データベースセッション
+            provider: 株価データ提供元
+            job: ジョブ名（チェックポイントの単位）
+            start: 取得開始日（Noneの場合は全期間）
+            chunk_size: 1回の一括ダウンロードで取得する銘柄数
+            concurrency: 同時に実行する一括ダウンロード数（parallel_bulk_historyが真の提供元のみ）
+            timeout: 一括ダウンロード1回のタイムアウト（秒）
+        """
+        self.db = db
+        self.provider = provider
+        self.job = job
+        self.start = start
+        self.chunk_size = chunk_size or settings.backfill.chunk_size
+        # 同時に呼べない提供元（yfinance）は1回ずつ実行する。同時に投入すると、ロック待ちの時間も
+        # 一括ダウンロードのタイムアウトに数えられ、問題のない分割単位まで失敗として記録されるため
+        self.concurrency = (concurrency or settings.backfill.concurrency) if provider.parallel_bulk_history else 1
+        self.timeout = timeout or settings.backfill.timeout
+        self.store = SqlPriceStore(db)
+
+    def reset(self) -> int:
+        """このジョブのチェックポイントを削除（最初から取り込み直す）"""
+        deleted = self.db.query(PriceBackfillCheckpoint).filter(PriceBackfillCheckpoint.job == self.job).delete()
+        self.db.commit()
+        return deleted
+
+    def pending_symbols(self, symbols: List[str]) -> List[str]:
+        """完了済みの銘柄を除外"""
+        done = {
+            row.symbol
+            for row in self.db.query(PriceBackfillCheckpoint.symbol).filter(
+                PriceBackfillCheckpoint.job == self.job,
+                PriceBackfillCheckpoint.status == DONE
+            )
+        }
+        return [symbol for symbol in symbols if symbol not in done]
+
+    async def run(self, symbols: List[str]) -> BackfillReport:
+        """銘柄リストを取り込む"""
+        symbols = list(dict.fromkeys(symbols))
+        # 東証以外の銘柄は足の確定を判定できないため保存しない
+        excluded = [symbol for symbol in symbols if not market_calendar.is_market_symbol(symbol)]
+        if excluded:
+            logger.warning(f"東証以外の銘柄は取り込みません: {', '.join(excluded)}")
+            symbols = [symbol for symbol in symbols if market_calendar.is_market_symbol(symbol)]
+        report = BackfillReport(total=len(symbols))
+        pending = await db_executor.run(self.pending_symbols, symbols)
+        report.skipped = len(symbols) - len(pending)
+
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # 同期セッションを共有するため、書き込みは1つずつ行う
+        write_lock = asyncio.Lock()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self._run_chunk(chunk, semaphore, write_lock, report, started) for chunk in chunks
+        ))
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    async def _run_chunk(
+        self,
+        chunk: List[str],
+        semaphore: asyncio.Semaphore,
+        write_lock: asyncio.Lock,
+        report: BackfillReport,
+        started: float
+    ) -> None:
+        """1回の一括ダウンロード分を取得して保存"""
+        async with semaphore:
+            try:
+                frames = await provider_executor.run(self.provider.bulk_history, chunk, start=self.start, timeout=self.timeout)
+            except Exception as e:
+                logger.warning(f"株価の一括取得に失敗しました ({chunk[0]}〜{chunk[-1]}): {e}")
+                frames, error = {}, str(e)
+            else:
+                error = None
+
+        async with write_lock:
+            try:
+                if error is None:
+                    rows = await db_executor.run(self._save, chunk, frames)
+                    report.rows += rows
+                    report.completed += sum(1 for symbol in chunk if symbol in frames)
+                    report.empty += sum(1 for symbol in chunk if symbol not in frames)
+                else:
+                    await db_executor.run(self._record_failure, chunk, error)
+                    report.failed += len(chunk)
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"株価の保存に失敗しました ({chunk[0]}〜{chunk[-1]}): {e}")
+                report.failed += len(chunk)
+
+        processed = report.completed + report.empty + report.failed
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"{processed}/{report.total - report.skipped}銘柄 {report.rows}行 "
+            f"({report.rows / elapsed if elapsed > 0 else 0:,.0f}行/秒)"
+        )
+
+    def _save(self, chunk: List[str], frames: Dict[str, pd.DataFrame]) -> int:
+        """確定済みの足を保存し、チェックポイントを同じトランザクションで記録"""
+        now = market_calendar.market_now()
+        closed = {}
+        for symbol, frame in frames.items():
+            frame = price_store.closed_bars(price_store.normalize_frame(frame), now)
+            if not frame.empty:
+                closed[symbol] = frame
+
+        checkpoints = self._checkpoints(chunk)
+        for symbol in chunk:
+            if symbol not in frames:
+                # 取得結果に含まれない銘柄は、データがないのか取得に失敗したのか区別できないため完了にしない
+                self._update_checkpoint(checkpoints, symbol, EMPTY)
+                continue
+            frame = closed.get(symbol)
+            self._update_checkpoint(
+                checkpoints,
+                symbol,
+                DONE,
+                rows=0 if frame is None else len(frame),
+                last_date=None if frame is None else frame.index[-1].to_pydatetime(),
+            )
+
+        saved = self.store.save_many(closed)
+        self.db.commit()
+        return saved
+
+    def _record_failure(self, chunk: List[str], error: str) -> None:
+        """取得に失敗した銘柄を記録（次回の実行で再取得する）"""
+        checkpoints = self._checkpoints(chunk)
+        for symbol in chunk:
+            self._update_checkpoint(checkpoints, symbol, FAILED, error=error)
+        self.db.commit()
+
+    def _checkpoints(self, symbols: List[str]) -> Dict[str, PriceBackfillCheckpoint]:
+        """銘柄の既存チェックポイントを1回のクエリで取得"""
+        records = self.db.query(PriceBackfillCheckpoint).filter(
+            PriceBackfillCheckpoint.job == self.job,
+            PriceBackfillCheckpoint.symbol.in_(symbols)
+        ).all()
+        return {record.symbol: record for record in records}
+
+    def _update_checkpoint(
+        self,
+        checkpoints: Dict[str, PriceBackfillCheckpoint],
+        symbol: str,
+        status: str,
+        rows: int = 0,
+        last_date: Optional[datetime] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """チェックポイントを追加または更新（コミットはしない）"""
+        checkpoint = checkpoints.get(symbol)
+        if checkpoint is None:
+            checkpoint = PriceBackfillCheckpoint(job=self.job, symbol=symbol)
+            self.db.add(checkpoint)
+        checkpoint.status = status
+        checkpoint.rows = rows
+        checkpoint.last_date = last_date
+        checkpoint.error = error
@@ -0,0 +1,129 @@
+"""
+キャッシュ基盤
+CacheBackendを実装すれば、プロセス内メモリ以外の共有ストアにも差し替えられる
+"""
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class CacheBackend(ABC):
+    """キャッシュの保存先インターフェース"""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        """値を取得（存在しない・期限切れの場合はNone）"""
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        """値を保存（ttlは有効期間の秒数）"""
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        """値を削除"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """すべての値を削除"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+
+
+def estimate_size(value: Any) -> int:
+    """値のおおよそのメモリ使用量（バイト）を見積もる"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class MemoryCache(CacheBackend):
+    """件数とメモリ使用量の上限付きLRUキャッシュ（有効期限付き）"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.monotonic,
+        sizer: Callable[[Any], int] = estimate_size
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.sizer = sizer
+        # key -> (値, 有効期限, サイズ)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        size = self.sizer(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, self.clock() + ttl, size)
+            self._bytes += size
+            # 上限を超えた分を最も使われていないものから削除
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
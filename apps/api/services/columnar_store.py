@@ -0,0 +1,230 @@
+"""
+列指向の株価データストア
+銘柄・年ごとのParquetまたはArrow IPCファイルに日足を保存する。
+読み込みはメモリマップで行い、開始日より前の年のファイルは開かず、要求された列だけを変換する
+"""
+import logging
+import os
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+
+from config import PriceStoreConfig, settings
+from models.stock import StockPrice
+from services.price_store import PRICE_COLUMNS, PriceStore, SqlPriceStore, normalize_frame
+
+logger = logging.getLogger(__name__)
+
+# 日付の列（タイムゾーンなしの取引所の現地時刻）
+DATE_COLUMN = "date"
+
+SCHEMA = pa.schema([(DATE_COLUMN, pa.timestamp("ns")), *((column, pa.float64()) for column in PRICE_COLUMNS)])
+
+# 形式ごとのファイルの拡張子
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+class ColumnarPriceStore(PriceStore):
+    """
+    <directory>/<証券コード>/<年>.parquet（または .arrow）に日足を保存する株価データストア
+
+    Parquetは圧縮されるためディスク使用量が小さく、Arrow IPCは圧縮しない代わりに
+    メモリマップしたファイルを変換せずにそのまま読める
+    """
+
+    def __init__(self, directory: str, format: str = "parquet", compression: str = "zstd"):
+        """
+        Args:
+            directory: 保存先ディレクトリ
+            format: ファイル形式（parquet, arrow）
+            compression: Parquetの圧縮方式（zstd, snappy, gzip, none）
+        """
+        if format not in EXTENSIONS:
+            raise ValueError(f"Invalid format: {format}. Must be one of {list(EXTENSIONS)}")
+        self.directory = Path(directory)
+        self.format = format
+        self.compression = compression
+        self.extension = EXTENSIONS[format]
+        # ファイルの読み込み・結合・書き込みが重ならないよう、保存は1つずつ行う
+        self._write_lock = threading.Lock()
+
+    def _path(self, symbol: str, year: int) -> Path:
+        return self.directory / symbol / f"{year}{self.extension}"
+
+    def _partitions(self, symbol: str) -> List[Tuple[int, Path]]:
+        """銘柄のファイルを年の順に取得"""
+        directory = self.directory / symbol
+        if not directory.is_dir():
+            return []
+        return sorted(
+            (int(path.stem), path)
+            for path in directory.iterdir()
+            if path.suffix == self.extension and path.stem.isdigit()
+        )
+
+    @staticmethod
+    def _empty(columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame(columns=columns, dtype="float64", index=pd.DatetimeIndex([], name="Date"))
+
+    @staticmethod
+    def _to_frame(table: pa.Table, columns: List[str]) -> pd.DataFrame:
+        """ArrowのテーブルをDataFrameに変換（要求された列のみ）"""
+        return pd.DataFrame(
+            {column: table.column(column).to_numpy() for column in columns},
+            index=pd.DatetimeIndex(table.column(DATE_COLUMN).to_numpy(), name="Date"),
+        )
+
+    def _read(self, path: Path, columns: List[str], start: Optional[pd.Timestamp]) -> pd.DataFrame:
+        """1つのファイルから開始日以降の指定した列を読み込む"""
+        return self._to_frame(self._read_table(path, columns, start), columns)
+
+    def _read_table(self, path: Path, columns: List[str], start: Optional[pd.Timestamp]) -> pa.Table:
+        """1つのファイルから開始日以降の指定した列をArrowのテーブルとして読み込む"""
+        if self.format == "parquet":
+            # 要求された列のみを展開する
+            table = pq.ParquetFile(path, memory_map=True).read(columns=[DATE_COLUMN, *columns])
+            return self._slice(table, start)
+
+        # メモリマップしたファイルをコピーせずに参照する（要求された列のみを変換する）
+        with pa.memory_map(str(path)) as source:
+            return self._slice(pa.ipc.open_file(source).read_all(), start)
+
+    @staticmethod
+    def _slice(table: pa.Table, start: Optional[pd.Timestamp]) -> pa.Table:
+        """日付順に保存しているため、開始位置を二分探索して切り出す（コピーしない）"""
+        if start is None:
+            return table
+        dates = table.column(DATE_COLUMN).to_numpy()
+        return table.slice(int(np.searchsorted(dates, start.to_datetime64())))
+
+    def _write(self, path: Path, frame: pd.DataFrame) -> None:
+        """DataFrameを一時ファイルに書き込んでから置き換える（読み込み中のファイルは壊さない）"""
+        table = pa.Table.from_arrays(
+            [
+                pa.array(frame.index.values, type=pa.timestamp("ns")),
+                *(pa.array(frame[column].to_numpy(dtype="float64"), type=pa.float64()) for column in PRICE_COLUMNS),
+            ],
+            schema=SCHEMA,
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        if self.format == "parquet":
+            pq.write_table(table, temporary, compression=self.compression)
+        else:
+            with pa.OSFile(str(temporary), "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(temporary, path)
+
+    def load_many(self, symbols: List[str], start: date, columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の保存済み株価を取得（開始日より前の年のファイルは読まない）"""
+        columns = columns or PRICE_COLUMNS
+        start_at = pd.Timestamp(start)
+        result = {}
+        for symbol in symbols:
+            frames = [
+                self._read(path, columns, start_at if year == start.year else None)
+                for year, path in self._partitions(symbol)
+                if year >= start.year
+            ]
+            result[symbol] = pd.concat(frames) if frames else self._empty(columns)
+        return result
+
+    def iter_batches(self, symbol: str, start: date, batch_size: int) -> Iterator[pd.DataFrame]:
+        """年ごとのファイルを順に読み、batch_size 行ずつ変換する（全期間をまとめて変換しない）"""
+        start_at = pd.Timestamp(start)
+        for year, path in self._partitions(symbol):
+            if year < start.year:
+                continue
+            table = self._read_table(path, PRICE_COLUMNS, start_at if year == start.year else None)
+            for batch in table.to_batches(max_chunksize=batch_size):
+                yield self._to_frame(pa.Table.from_batches([batch]), PRICE_COLUMNS)
+
+    def save_many(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """複数銘柄の株価データを保存（同じ日付の足は更新し、変更のある年のファイルだけを書き直す）"""
+        saved = 0
+        with self._write_lock:
+            for symbol, frame in frames.items():
+                if frame.empty:
+                    continue
+                frame = normalize_frame(frame).astype("float64")
+                frame = frame[~frame.index.duplicated(keep="last")]
+                for year, part in frame.groupby(frame.index.year):
+                    path = self._path(symbol, year)
+                    if path.exists():
+                        existing = self._read(path, PRICE_COLUMNS, None)
+                        part = pd.concat([existing[~existing.index.isin(part.index)], part])
+                    self._write(path, part.sort_index())
+                saved += len(frame)
+        return saved
+
+    def last_dates(self, symbols: List[str]) -> Dict[str, date]:
+        """銘柄ごとの保存済みの最終日を取得（最新の年のファイルの日付の列のみ読む）"""
+        result = {}
+        for symbol in symbols:
+            partitions = self._partitions(symbol)
+            if not partitions:
+                continue
+            dates = self._read(partitions[-1][1], [], None).index
+            if len(dates):
+                result[symbol] = dates[-1].date()
+        return result
+
+    def disk_usage(self) -> int:
+        """保存しているファイルの合計バイト数"""
+        return sum(path.stat().st_size for path in self.directory.rglob(f"*{self.extension}"))
+
+
+def create_columnar_store(config: PriceStoreConfig) -> ColumnarPriceStore:
+    """設定から列指向の株価データストアを作成"""
+    return ColumnarPriceStore(config.directory, format=config.backend, compression=config.compression)
+
+
+_store: Optional[ColumnarPriceStore] = None
+
+
+def get_columnar_store() -> ColumnarPriceStore:
+    """既定の列指向の株価データストアを取得（保存のロックを共有するため、初回に設定から作成して使い回す）"""
+    global _store
+    if _store is None:
+        _store = create_columnar_store(settings.price_store)
+    return _store
+
+
+def set_columnar_store(store: Optional[ColumnarPriceStore]) -> None:
+    """既定の列指向の株価データストアを差し替える（Noneの場合は次回に設定から作り直す）"""
+    global _store
+    _store = store
+
+
+def migrate_from_sql(db: Session, store: PriceStore, symbols: Optional[List[str]] = None, batch_size: int = 100) -> Dict[str, int]:
+    """
+    stock_pricesの全期間を別の株価データストアへ移行
+
+    Args:
+        db: 移行元のデータベースセッション
+        store: 移行先の株価データストア
+        symbols: 移行する証券コード（省略時はstock_pricesのすべての銘柄）
+        batch_size: 1回のクエリで読み込む銘柄数
+
+    Returns:
+        移行した銘柄数と行数
+    """
+    if symbols is None:
+        symbols = [row.symbol for row in db.query(StockPrice.symbol).distinct().order_by(StockPrice.symbol)]
+
+    source = SqlPriceStore(db)
+    migrated = {"symbols": 0, "rows": 0}
+    for i in range(0, len(symbols), batch_size):
+        frames = source.load_many(symbols[i:i + batch_size], date.min)
+        frames = {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+        migrated["rows"] += store.save_many(frames)
+        migrated["symbols"] += len(frames)
+        logger.info(f"{min(i + batch_size, len(symbols))}/{len(symbols)}銘柄 {migrated['rows']}行を移行しました")
+    return migrated
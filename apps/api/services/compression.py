@@ -0,0 +1,228 @@
+"""
+レスポンスの圧縮
+Accept-Encodingからgzip・brotli・zstdを選んで本文を圧縮する。
+brotli・zstdは対応するパッケージ（brotli, zstandard）がインストールされている場合のみ使う
+"""
+import zlib
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import CompressionConfig, settings
+from services.cache import MemoryCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 同じq値の場合に優先する順（圧縮率と速度の釣り合いがよい順）
+PREFERENCE = ("zstd", "br", "gzip")
+
+# 圧縮済みの本文のキャッシュ（株価取得結果のキャッシュとは別に、本文のバイト数で上限を管理する）
+compressed_cache = MemoryCache(
+    max_entries=settings.compression.cache_max_entries,
+    max_bytes=settings.compression.cache_max_bytes,
+    sizer=len,
+)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """この環境で使える圧縮方式（優先順）"""
+    installed = {"zstd": zstandard is not None, "br": brotli is not None, "gzip": True}
+    return tuple(encoding for encoding in PREFERENCE if installed[encoding])
+
+
+def negotiate(accept_encoding: Optional[str], encodings: Optional[Tuple[str, ...]] = None) -> Optional[str]:
+    """
+    Accept-Encodingから圧縮方式を選ぶ
+
+    q値が最も大きい方式を選び、同じ場合はencodingsの順で優先する。
+    *は明示されていない方式すべてに当てはまる。使える方式がなければNone（圧縮しない）
+    """
+    if not accept_encoding:
+        return None
+    encodings = available_encodings() if encodings is None else encodings
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *parameters = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), -rank, encoding)
+        for rank, encoding in enumerate(encodings)
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class StreamCompressor:
+    """
+    逐次送信する本文の圧縮
+
+    compressは渡された分を圧縮してフラッシュし、受け取った分だけでクライアントが展開できるようにする
+    """
+
+    def __init__(self, encoding: str, config: CompressionConfig):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(config.gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=config.brotli_quality)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=config.zstd_level).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress(body: bytes, encoding: str, config: Optional[CompressionConfig] = None) -> bytes:
+    """本文全体を圧縮"""
+    config = config or settings.compression
+    if encoding == "gzip":
+        compressor = zlib.compressobj(config.gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        return compressor.compress(body) + compressor.flush()
+    if encoding == "br":
+        return brotli.compress(body, quality=config.brotli_quality)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=config.zstd_level).compress(body)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_cached(
+    key: Optional[Hashable],
+    render: Callable[[], bytes],
+    encoding: Optional[str],
+    config: Optional[CompressionConfig] = None
+) -> Tuple[bytes, Optional[str]]:
+    """
+    本文を作成して圧縮し、圧縮済みの本文をcompressed_cacheに保持する
+
+    有効期間は株価取得結果のキャッシュ（CACHE_PRICE_TTL）と同じで、
+    その間に同じ表現・圧縮方式を要求された場合は本文の作成と圧縮を省く
+
+    Args:
+        key: 表現のキー（形式ごとのETagなど）。Noneの場合はキャッシュしない
+        render: 圧縮前の本文を作成する関数
+        encoding: 圧縮方式（Noneの場合は圧縮しない）
+
+    Returns:
+        (本文, Content-Encoding)。最小サイズ未満の本文は圧縮せずにNoneを返す
+    """
+    config = config or settings.compression
+    if encoding is None:
+        return render(), None
+    ttl = settings.cache.price_ttl
+    cacheable = key is not None and ttl > 0
+    if cacheable:
+        body = compressed_cache.get((key, encoding))
+        if body is not None:
+            return body, encoding
+    body = render()
+    if len(body) < config.minimum_size:
+        return body, None
+    body = compress(body, encoding, config)
+    if cacheable:
+        compressed_cache.set((key, encoding), body, ttl)
+    return body, encoding
+
+
+def _compressible(headers: Headers) -> bool:
+    """圧縮済みの本文（Content-Encodingあり、Arrowのバッファ圧縮など）は圧縮しない"""
+    return "content-encoding" not in headers and "compression=" not in headers.get("content-type", "")
+
+
+class CompressionMiddleware:
+    """
+    Accept-Encodingに応じてレスポンスを圧縮するASGIミドルウェア
+
+    一度に送る本文は最小サイズ以上の場合に圧縮し、逐次送信（StreamingResponse）の本文は
+    チャンクごとに圧縮してフラッシュする。Content-Encodingが付いた応答はそのまま送る
+    """
+
+    def __init__(self, app: Any, config: Optional[CompressionConfig] = None):
+        self.app = app
+        self.config = config or settings.compression
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        start: Optional[Dict[str, Any]] = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message.get("headers", [])))
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                start = {**message, "headers": headers.raw}
+                if not _compressible(headers):
+                    passthrough = True
+                    await send(start)
+                    return
+                if encoding is None:
+                    passthrough = True
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body:
+                    # 一度に送る本文
+                    if len(body) >= self.config.minimum_size:
+                        body = compress(body, encoding, self.config)
+                        headers["Content-Encoding"] = encoding
+                        headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({**message, "body": body})
+                    return
+                # 逐次送信の本文（全体のサイズが分からないため常に圧縮する）
+                compressor = StreamCompressor(encoding, self.config)
+                headers["Content-Encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                await send(start)
+
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
@@ -0,0 +1,86 @@
+"""
+ブロッキング処理の実行基盤
+yfinanceや同期SQLAlchemyセッションの呼び出しをスレッドプールで実行し、
+イベントループを止めないようにする
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExecutorTimeoutError(Exception):
+    """ブロッキング処理がタイムアウトした"""
+
+
+class BlockingExecutor:
+    """上限付きスレッドプールでブロッキング処理を実行する"""
+
+    def __init__(self, name: str, max_workers: int, timeout: Optional[float] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """スレッドプールを取得（停止後は再作成）"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._pool
+
+    async def run(self, func: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        """
+        関数をスレッドプールで実行して結果を待つ
+
+        タイムアウトまたは呼び出し元のキャンセル時は、実行待ちの処理を取り消す
+        （実行中のスレッドは中断できないため、結果を破棄する）
+
+        Args:
+            func: 実行する関数
+            timeout: タイムアウト秒数（省略時は既定値、Noneで無制限）
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        future = loop.run_in_executor(self.pool, call)
+        limit = self.timeout if timeout is None else timeout
+
+        try:
+            return await asyncio.wait_for(future, limit)
+        except asyncio.TimeoutError:
+            name = getattr(func, "__qualname__", repr(func))
+            logger.warning(f"{self.name}: {name} が{limit}秒以内に完了しませんでした")
+            raise ExecutorTimeoutError(f"処理がタイムアウトしました: {name}")
+
+    def shutdown(self) -> None:
+        """スレッドプールを停止（実行待ちの処理は取り消す）"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 外部API（Yahoo Finance）呼び出し用
+provider_executor = BlockingExecutor(
+    "provider",
+    max_workers=settings.provider.max_workers,
+    timeout=settings.provider.timeout,
+)
+
+# 同期データベースセッション用
+db_executor = BlockingExecutor(
+    "database",
+    max_workers=settings.database.executor_workers,
+)
+
+
+def shutdown_executors() -> None:
+    """すべての実行基盤を停止"""
+    provider_executor.shutdown()
+    db_executor.shutdown()
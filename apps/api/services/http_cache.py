@@ -0,0 +1,117 @@
+"""
+HTTPキャッシュ
+応答の版（ETag・Last-Modified）を安価な値から計算し、条件付きリクエストに304で応答できるようにする。
+Cache-Controlのmax-ageは取引時間中は短く、取引時間外は次の寄り付きまでを上限に長くする
+"""
+import hashlib
+from datetime import datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+import pandas as pd
+
+from config import HttpCacheConfig, settings
+from services import market_calendar
+
+
+class ResourceVersion(NamedTuple):
+    """応答の版"""
+    etag: str
+    last_modified: Optional[datetime] = None
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    版を表す値から弱いETagを作成
+
+    圧縮の有無などで本文のバイト列が変わっても同じ内容であれば一致させるため、弱いETagとする
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def price_version(key: tuple, hist: pd.DataFrame, now: datetime) -> ResourceVersion:
+    """
+    株価データの版を計算
+
+    本文を作らずに、リクエストの条件と最後の足（日時・OHLCV）と足数から計算する。
+    取引時間中の未確定の足は値が変わるたびに版も変わる
+
+    Args:
+        key: リクエストの条件（証券コード・期間・データ間隔など）
+        hist: 集約・間引き前の価格データ
+        now: 現在時刻（Last-Modifiedの上限）
+    """
+    if hist.empty:
+        return ResourceVersion(make_etag(*key, 0))
+
+    last = pd.Timestamp(hist.index[-1])
+    etag = make_etag(*key, len(hist), last.isoformat(), *hist.iloc[-1].tolist())
+
+    if last.tzinfo is None:
+        last = last.tz_localize(market_calendar.MARKET_TZ)
+    if last.time() == time(0):
+        # 日足以上の足は、その日の大引けに確定したものとする
+        last = pd.Timestamp(datetime.combine(last.date(), market_calendar.SESSION_CLOSE, tzinfo=market_calendar.MARKET_TZ))
+    return ResourceVersion(etag, min(last.to_pydatetime(), now))
+
+
+def info_version(symbol: str, updated_at: datetime) -> ResourceVersion:
+    """stock_infoの更新日時から株式情報の版を計算"""
+    if updated_at.tzinfo is None:
+        # SQLiteはタイムゾーンを保存しないため、保存時と同じUTCとみなす
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return ResourceVersion(make_etag("info", symbol, updated_at.isoformat()), updated_at)
+
+
+def max_age(now: datetime, config: Optional[HttpCacheConfig] = None) -> int:
+    """取引時間に応じたmax-age（取引時間外は次の寄り付き・大引けまでを上限とする）"""
+    config = config or settings.http_cache
+    if market_calendar.is_session_open(now):
+        return config.open_max_age
+    until_change = (market_calendar.next_session_change(now) - now).total_seconds()
+    return max(0, min(config.closed_max_age, int(until_change)))
+
+
+def cache_headers(version: ResourceVersion, now: datetime) -> Dict[str, str]:
+    """ETag・Last-Modified・Cache-Controlのヘッダー"""
+    headers = {"ETag": version.etag, "Cache-Control": f"public, max-age={max_age(now)}"}
+    if version.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(version.last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Matchのいずれかが一致するか（弱い比較）"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def is_not_modified(request_headers: Mapping[str, str], version: ResourceVersion) -> bool:
+    """
+    条件付きリクエストに304で応答できるか
+
+    If-None-Matchがあればそれのみで判定し、なければIf-Modified-Sinceと比較する
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, version.etag)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is None or version.last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP日付は秒単位のため、秒未満を切り捨てて比較する
+    return version.last_modified.replace(microsecond=0) <= since
+
+
+def has_conditions(request_headers: Mapping[str, str]) -> bool:
+    """条件付きリクエストかどうか"""
+    return "if-none-match" in request_headers or "if-modified-since" in request_headers
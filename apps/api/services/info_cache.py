@@ -0,0 +1,102 @@
+"""
+企業メタデータ（ticker.info）のキャッシュ
+企業名・業種などは日次、時価総額は短い間隔で更新されるため、項目ごとに有効期間を設定する
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from config import settings
+from services.cache import CacheBackend, MemoryCache
+from services.singleflight import SingleFlight
+
+# 企業プロフィール（日次で十分な項目）
+PROFILE_FIELDS = ["symbol", "longName", "shortName", "exchange", "sector", "industry"]
+
+# 相場に連動して変わる項目
+MARKET_FIELDS = ["marketCap"]
+
+
+class InfoCache:
+    """証券コードをキーとした企業メタデータのキャッシュ"""
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        field_ttls: Dict[str, float],
+        clock: Callable[[], float] = time.time
+    ):
+        self.backend = backend
+        self.field_ttls = field_ttls
+        self.clock = clock
+        self.singleflight = SingleFlight()
+        self.stale = 0
+
+    def peek(self, symbol: str, fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """指定した項目がすべて有効期間内であればキャッシュを返す（外部APIは呼ばない）"""
+        entry = self.backend.get(symbol)
+        if entry is None:
+            return None
+        age = self.clock() - entry["fetched_at"]
+        if any(age >= self.field_ttls[field] for field in fields):
+            self.stale += 1
+            return None
+        return entry["info"]
+
+    def put(self, symbol: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        """キャッシュ対象の項目だけを保存"""
+        cached = {field: info.get(field) for field in self.field_ttls}
+        # 銘柄が見つからなかった結果はキャッシュしない
+        if cached.get("symbol"):
+            entry = {"fetched_at": self.clock(), "info": cached}
+            self.backend.set(symbol, entry, max(self.field_ttls.values()))
+        return cached
+
+    async def get_or_fetch(
+        self,
+        symbol: str,
+        fields: Iterable[str],
+        fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        キャッシュから取得し、なければ外部APIから取得して保存
+
+        同じシンボルの同時のキャッシュミスは1回の取得にまとめる
+        """
+        fields = list(fields)
+        cached = self.peek(symbol, fields)
+        if cached is not None:
+            return cached
+
+        async def load() -> Dict[str, Any]:
+            return self.put(symbol, await fetch())
+
+        return await self.singleflight.do(symbol, load)
+
+    def clear(self) -> None:
+        """すべてのキャッシュを削除"""
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+        return {
+            **self.backend.stats(),
+            "stale": self.stale,
+            "fetches": self.singleflight.executions,
+            "coalesced": self.singleflight.coalesced,
+        }
+
+
+def _field_ttls() -> Dict[str, float]:
+    ttls = {field: settings.cache.info_ttl for field in PROFILE_FIELDS}
+    ttls.update({field: settings.cache.info_market_ttl for field in MARKET_FIELDS})
+    return ttls
+
+
+# アプリケーション全体で共有するキャッシュ
+info_cache = InfoCache(
+    MemoryCache(
+        max_entries=settings.cache.info_max_entries,
+        max_bytes=settings.cache.info_max_bytes,
+    ),
+    _field_ttls(),
+)
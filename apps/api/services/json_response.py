@@ -0,0 +1,34 @@
+"""
+JSONレスポンス
+orjsonでdatetime・float・NumPyの値をそのまま変換し、jsonable_encoderによるPythonでの変換を通さない
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """orjsonが直接変換できない値の変換（Pydanticのモデルは辞書にしてからorjsonで変換する）"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """orjsonでJSONのバイト列に変換"""
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjsonで変換するJSONレスポンス
+
+    model_constructで作ったモデルをそのまま渡せば、検証とjsonable_encoderを省いて変換できる
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
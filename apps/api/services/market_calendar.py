@@ -0,0 +1,129 @@
+"""
+市場カレンダー
+東証の立会時間・休業日をもとに、確定済みの最新営業日や取引時間中かどうかを判定する
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import FrozenSet, List
+from zoneinfo import ZoneInfo
+
+try:
+    import jpholiday
+except ImportError:
+    jpholiday = None
+
+logger = logging.getLogger(__name__)
+
+# 東京証券取引所のタイムゾーンと立会時間
+MARKET_TZ = ZoneInfo("Asia/Tokyo")
+SESSION_OPEN = time(9, 0)
+SESSION_CLOSE = time(15, 30)
+
+# 祝日以外の東証の休業日（年末年始: 12月31日〜1月3日）
+YEAR_END_CLOSURES = ((12, 31), (1, 1), (1, 2), (1, 3))
+
+# jpholidayがインストールされていない場合に使う、土日以外の東証の休業日の表（祝日・振替休日・年末年始）
+HOLIDAY_TABLE = frozenset([
+    # 2025年
+    date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 13), date(2025, 2, 11),
+    date(2025, 2, 24), date(2025, 3, 20), date(2025, 4, 29), date(2025, 5, 5), date(2025, 5, 6),
+    date(2025, 7, 21), date(2025, 8, 11), date(2025, 9, 15), date(2025, 9, 23), date(2025, 10, 13),
+    date(2025, 11, 3), date(2025, 11, 24), date(2025, 12, 31),
+    # 2026年
+    date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 12), date(2026, 2, 11), date(2026, 2, 23),
+    date(2026, 3, 20), date(2026, 4, 29), date(2026, 5, 4), date(2026, 5, 5), date(2026, 5, 6),
+    date(2026, 7, 20), date(2026, 8, 11), date(2026, 9, 21), date(2026, 9, 22), date(2026, 9, 23),
+    date(2026, 10, 12), date(2026, 11, 3), date(2026, 11, 23), date(2026, 12, 31),
+])
+HOLIDAY_TABLE_LAST_YEAR = 2026
+
+
+@lru_cache(maxsize=None)
+def year_holidays(year: int) -> FrozenSet[date]:
+    """
+    指定した年の土日以外の東証の休業日
+
+    jpholidayがあれば祝日法の規則から求めた祝日・振替休日・国民の休日に年末年始を加える。
+    なければHOLIDAY_TABLEを使い、表にない年は警告を出して土日のみを休業日とする
+    """
+    if jpholiday is not None:
+        holidays = {day for day, _ in jpholiday.year_holidays(year)}
+        holidays.update(date(year, month, day) for month, day in YEAR_END_CLOSURES)
+        return frozenset(day for day in holidays if day.weekday() < 5)
+    if year > HOLIDAY_TABLE_LAST_YEAR:
+        logger.warning(
+            f"{year}年の東証の休業日が分からないため土日のみを休業日とします"
+            f"（休業日の表は{HOLIDAY_TABLE_LAST_YEAR}年まで。jpholidayをインストールしてください）"
+        )
+    return frozenset(day for day in HOLIDAY_TABLE if day.year == year)
+
+
+def holidays_between(start: date, end: date) -> List[date]:
+    """start〜end（両端を含む）の土日以外の休業日を日付順に取得（numpy.is_busdayなどのholidaysに渡す）"""
+    return sorted(
+        day for year in range(start.year, end.year + 1) for day in year_holidays(year) if start <= day <= end
+    )
+
+
+def is_market_symbol(symbol: str) -> bool:
+    """東証の銘柄（証券コードが数字のみ）かどうか。それ以外の銘柄には東証の立会時間・休業日を当てはめない"""
+    return symbol.isdigit()
+
+
+def market_now() -> datetime:
+    """市場タイムゾーンでの現在時刻を取得"""
+    return datetime.now(MARKET_TZ)
+
+
+def is_trading_day(day: date) -> bool:
+    """営業日かどうか（土日・休業日を除く）"""
+    return day.weekday() < 5 and day not in year_holidays(day.year)
+
+
+def previous_trading_day(day: date) -> date:
+    """指定日より前の直近営業日を取得"""
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_trading_day(day: date) -> date:
+    """指定日より後の直近営業日を取得"""
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def next_session_change(now: datetime) -> datetime:
+    """次に寄り付きまたは大引けを迎える時刻を取得"""
+    today = now.date()
+    if is_trading_day(today):
+        if now.time() < SESSION_OPEN:
+            return datetime.combine(today, SESSION_OPEN, tzinfo=MARKET_TZ)
+        if now.time() < SESSION_CLOSE:
+            return datetime.combine(today, SESSION_CLOSE, tzinfo=MARKET_TZ)
+    return datetime.combine(next_trading_day(today), SESSION_OPEN, tzinfo=MARKET_TZ)
+
+
+def is_session_open(now: datetime) -> bool:
+    """取引時間中かどうか"""
+    return is_trading_day(now.date()) and SESSION_OPEN <= now.time() < SESSION_CLOSE
+
+
+def latest_closed_session(now: datetime) -> date:
+    """大引けを迎えた直近の営業日を取得"""
+    today = now.date()
+    if is_trading_day(today) and now.time() >= SESSION_CLOSE:
+        return today
+    return previous_trading_day(today)
+
+
+def sessions_back(end: date, count: int) -> date:
+    """endを1営業日目として、count営業日前の日付を取得"""
+    day = end
+    for _ in range(count - 1):
+        day = previous_trading_day(day)
+    return day
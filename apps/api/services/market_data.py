@@ -0,0 +1,485 @@
+"""
+株価データ提供元
+MarketDataProviderを実装すれば、Yahoo Finance以外（ローカルのファイル、合成データなど）からも株価を取得できる
+"""
+import random
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from config import ProviderConfig, settings
+from models.stock import StockInfoResponse
+from services import market_calendar, price_store
+from services.search_index import normalize
+
+
+class ProviderError(Exception):
+    """株価データ提供元の呼び出しに失敗した"""
+
+
+def to_yahoo_symbol(symbol: str) -> str:
+    """Yahoo Financeのシンボルに変換（日本株の場合は.Tを追加）"""
+    return f"{symbol}.T" if market_calendar.is_market_symbol(symbol) else symbol
+
+
+class MarketDataProvider(ABC):
+    """
+    株価データ提供元のインターフェース（呼び出しはブロッキング）
+
+    銘柄は証券コードで指定する。価格データはyfinanceのhistory()と同じ列構成
+    （Open, High, Low, Close, Volume）で、取引所の現地時刻のDatetimeIndexを持つ
+    """
+
+    # bulk_historyを同時に呼べるか（Falseの場合、一括取り込みは1回ずつ実行する）
+    parallel_bulk_history = True
+
+    @abstractmethod
+    def info(self, symbol: str) -> Dict[str, Any]:
+        """
+        企業メタデータを取得
+
+        Returns:
+            yfinanceのticker.infoと同じキー（symbol, longName, marketCapなど）の辞書。見つからない場合は空の辞書
+        """
+
+    @abstractmethod
+    def history(
+        self,
+        symbol: str,
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> pd.DataFrame:
+        """
+        価格データを取得
+
+        Args:
+            symbol: 証券コード
+            period: 取得期間（startを指定した場合は無視）
+            start: 取得開始日（period・startとも省略時は全期間）
+            interval: データ間隔
+            end: 取得終了日（この日を含む、startを指定した場合のみ有効。省略時は最新まで）
+        """
+
+    @abstractmethod
+    def bulk_history(
+        self,
+        symbols: List[str],
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        複数銘柄の価格データを一括取得
+
+        Returns:
+            証券コードごとの価格データ（データがない銘柄は含まない）
+        """
+
+    @abstractmethod
+    def search(self, query: str, limit: int) -> List[StockInfoResponse]:
+        """企業名または証券コードで銘柄を検索"""
+
+
+def _range_kwargs(period: Optional[str], start: Optional[date], end: Optional[date] = None) -> Dict[str, str]:
+    """yfinanceの期間指定の引数を作成（yfinanceのendは終了日を含まない）"""
+    if start is not None:
+        kwargs = {"start": start.isoformat()}
+        if end is not None:
+            kwargs["end"] = (end + timedelta(days=1)).isoformat()
+        return kwargs
+    return {"period": period or "max"}
+
+
+def _filter_range(frame: pd.DataFrame, start: Optional[date], end: Optional[date]) -> pd.DataFrame:
+    """取引所の現地時刻のDatetimeIndexを開始日・終了日（含む）で絞り込む"""
+    if start is not None:
+        frame = frame[frame.index >= pd.Timestamp(start, tz=market_calendar.MARKET_TZ)]
+        if end is not None:
+            frame = frame[frame.index < pd.Timestamp(end + timedelta(days=1), tz=market_calendar.MARKET_TZ)]
+    return frame
+
+
+# yf.downloadは取得結果をモジュール全体で共有する変数（shared._DFS・shared._ERRORS）に集め、
+# 呼び出しのたびに初期化するため、同時に呼ぶと互いの結果を上書き・消去する
+_download_lock = threading.Lock()
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Yahoo Finance（yfinance）から取得する"""
+
+    # yf.downloadは_download_lockで1回ずつ実行されるため、同時に呼んでもロック待ちになるだけ
+    parallel_bulk_history = False
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        return yf.Ticker(to_yahoo_symbol(symbol)).info
+
+    def history(
+        self,
+        symbol: str,
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> pd.DataFrame:
+        return yf.Ticker(to_yahoo_symbol(symbol)).history(interval=interval, **_range_kwargs(period, start, end))
+
+    def bulk_history(
+        self,
+        symbols: List[str],
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> Dict[str, pd.DataFrame]:
+        symbol_map = {to_yahoo_symbol(symbol): symbol for symbol in symbols}
+        # 一括ダウンロードは1つずつ実行する（1回のダウンロード内では銘柄ごとに並列に取得される）
+        with _download_lock:
+            frame = yf.download(
+                list(symbol_map),
+                interval=interval,
+                group_by="ticker",
+                auto_adjust=True,
+                progress=False,
+                **_range_kwargs(period, start, end)
+            )
+        return price_store.split_bulk_frame(frame, symbol_map)
+
+    def search(self, query: str, limit: int) -> List[StockInfoResponse]:
+        # yfinanceには企業名の検索がないため、証券コードの完全一致のみ
+        if not query.isdigit():
+            return []
+        info = self.info(query)
+        if not info or not info.get("symbol"):
+            return []
+        return [info_to_stock(query, info)]
+
+
+def info_to_stock(symbol: str, info: Dict[str, Any]) -> StockInfoResponse:
+    """ticker.info形式の辞書をStockInfoResponseに変換"""
+    return StockInfoResponse(
+        symbol=symbol,
+        company_name=info.get("longName") or "",
+        company_name_en=info.get("shortName") or "",
+        market=info.get("exchange") or "",
+        sector=info.get("sector") or "",
+        industry=info.get("industry") or ""
+    )
+
+
+class CsvFixtureProvider(MarketDataProvider):
+    """
+    ディレクトリ内のCSVファイルから日足を取得する（オフライン実行・テスト用）
+
+    ファイル名は「<証券コード>.csv」、列はDate, Open, High, Low, Close, Volume
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        if not (self.directory / f"{symbol}.csv").exists():
+            return {}
+        return {"symbol": to_yahoo_symbol(symbol), "longName": symbol, "shortName": symbol}
+
+    def history(
+        self,
+        symbol: str,
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> pd.DataFrame:
+        path = self.directory / f"{symbol}.csv"
+        if not path.exists():
+            return pd.DataFrame(columns=price_store.PRICE_COLUMNS, dtype="float64")
+        frame = pd.read_csv(path, index_col="Date", parse_dates=True)[price_store.PRICE_COLUMNS]
+        frame = frame.tz_localize(market_calendar.MARKET_TZ).sort_index()
+        if start is None and period is not None and period != "max":
+            start = price_store.requested_start(period, market_calendar.market_now())
+        return _filter_range(frame, start, end)
+
+    def bulk_history(
+        self,
+        symbols: List[str],
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> Dict[str, pd.DataFrame]:
+        frames = {symbol: self.history(symbol, period, start, interval, end) for symbol in symbols}
+        return {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+
+    def search(self, query: str, limit: int) -> List[StockInfoResponse]:
+        symbols = sorted(path.stem for path in self.directory.glob(f"{query}*.csv"))
+        return [info_to_stock(symbol, self.info(symbol)) for symbol in symbols[:limit]]
+
+
+# 合成データの企業名
+SYNTHETIC_NAME_PARTS = ["東京", "大阪", "日本", "三和", "中央", "富士", "東洋", "北海", "九州", "太平"]
+SYNTHETIC_NAME_SUFFIXES = ["電機", "化学", "製薬", "商事", "建設", "食品", "精工", "物産", "通信", "自動車"]
+SYNTHETIC_EN_PARTS = ["Tokyo", "Osaka", "Nippon", "Sanwa", "Chuo", "Fuji", "Toyo", "Hokkai", "Kyushu", "Taihei"]
+SYNTHETIC_EN_SUFFIXES = ["Electric", "Chemical", "Pharma", "Trading", "Construction", "Foods", "Seiko", "Bussan", "Telecom", "Motor"]
+SYNTHETIC_SECTORS = ["Technology", "Healthcare", "Industrials", "Consumer Cyclical", "Financial Services"]
+
+# 合成データの日足の起点
+SYNTHETIC_ORIGIN = date(2000, 1, 4)
+
+# 合成データの銘柄（東証の4桁の証券コード）
+SYNTHETIC_SYMBOLS = [str(code) for code in range(1300, 10000)]
+
+# 分足の足の長さ（分）
+INTRADAY_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60}
+
+# 日足より長い足のリサンプリング規則
+RESAMPLE_RULES = {"5d": "5B", "1wk": "W-FRI", "1mo": "M", "3mo": "Q"}
+
+
+@lru_cache(maxsize=8)
+def _session_index(end: date) -> pd.DatetimeIndex:
+    """起点から終了日までの営業日（タイムゾーン付きの日付の生成は遅いため終了日ごとに再利用）"""
+    days = np.arange(SYNTHETIC_ORIGIN, end + timedelta(days=1), dtype="datetime64[D]")
+    holidays = np.array(market_calendar.holidays_between(SYNTHETIC_ORIGIN, end), dtype="datetime64[D]")
+    return pd.DatetimeIndex(days[np.is_busday(days, holidays=holidays)]).tz_localize(market_calendar.MARKET_TZ)
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    再現可能な合成データを返す（ネットワークを使わない負荷試験・ベンチマーク用）
+
+    銘柄ごとの価格系列は証券コードとシードだけで決まり、取得期間や呼び出し順によらず同じ値になる。
+    遅延とエラー率を指定すると、外部APIの遅さや失敗を模擬できる
+    """
+
+    def __init__(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        seed: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        sleep=time.sleep
+    ):
+        """
+        Args:
+            symbols: 銘柄の証券コード（省略時は1300〜9999のすべての4桁のコード）
+            seed: 乱数シード
+            latency: 1回の呼び出しに加える遅延（秒）
+            jitter: 遅延に加えるばらつきの最大値（秒）
+            error_rate: 呼び出しが失敗する確率（0〜1）
+        """
+        self.symbols = list(symbols) if symbols is not None else SYNTHETIC_SYMBOLS
+        self._universe = set(self.symbols)
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._profiles: Optional[Dict[str, tuple]] = None
+        self.calls = 0
+        # 同時に呼び出されたときに営業日の生成が重複しないよう、先に作成しておく
+        _session_index(self._last_session(market_calendar.market_now()))
+
+    def _call(self, name: str) -> None:
+        """遅延とエラーを注入"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+            failed = self._random.random() < self.error_rate
+        if delay > 0:
+            self.sleep(delay)
+        if failed:
+            raise ProviderError(f"合成データ提供元のエラー（{name}）")
+
+    def _rng(self, *keys: Any) -> np.random.Generator:
+        """証券コードなどから決まる乱数生成器"""
+        return np.random.default_rng([self.seed, *(zlib.crc32(str(key).encode()) for key in keys)])
+
+    def profile(self, symbol: str) -> Dict[str, Any]:
+        """企業プロフィール（ticker.info形式、遅延・エラーは注入しない）"""
+        rng = self._rng(symbol, "profile")
+        part, suffix = rng.integers(len(SYNTHETIC_NAME_PARTS)), rng.integers(len(SYNTHETIC_NAME_SUFFIXES))
+        return {
+            "symbol": to_yahoo_symbol(symbol),
+            "longName": f"{SYNTHETIC_NAME_PARTS[part]}{SYNTHETIC_NAME_SUFFIXES[suffix]}{symbol}株式会社",
+            "shortName": f"{SYNTHETIC_EN_PARTS[part]} {SYNTHETIC_EN_SUFFIXES[suffix]} {symbol}",
+            "exchange": "JPX",
+            "sector": SYNTHETIC_SECTORS[rng.integers(len(SYNTHETIC_SECTORS))],
+            "industry": SYNTHETIC_NAME_SUFFIXES[suffix],
+        }
+
+    def _daily(self, symbol: str, end: date) -> pd.DataFrame:
+        """起点から終了日までの日足（幾何ランダムウォーク）"""
+        index = _session_index(end)
+        # 系列ごとに別の乱数生成器を使い、先頭からの値が終了日によらず一定になるようにする
+        count = len(index)
+        base = 500 + self._rng(symbol, "base").random() * 9500
+        close = base * np.exp(np.cumsum(self._rng(symbol, "returns").normal(0, 0.01, count)))
+        gaps = self._rng(symbol, "gaps").normal(0, 0.005, count)
+        spreads = np.abs(self._rng(symbol, "spreads").normal(0, 0.01, count))
+        volume = self._rng(symbol, "volume").integers(10_000, 5_000_000, count)
+        open_ = np.concatenate([[base], close[:-1]]) * (1 + gaps)
+        return pd.DataFrame(
+            {
+                "Open": open_.round(1),
+                "High": (np.maximum(open_, close) * (1 + spreads)).round(1),
+                "Low": (np.minimum(open_, close) * (1 - spreads)).round(1),
+                "Close": close.round(1),
+                "Volume": volume.astype("float64"),
+            },
+            index=index,
+        )
+
+    def _intraday(self, symbol: str, daily: pd.DataFrame, minutes: int) -> pd.DataFrame:
+        """日足の始値から終値へ向かう分足（立会時間内）"""
+        frames = []
+        for timestamp, bar in daily.iterrows():
+            day = timestamp.date()
+            index = pd.date_range(
+                datetime.combine(day, market_calendar.SESSION_OPEN),
+                datetime.combine(day, market_calendar.SESSION_CLOSE),
+                freq=f"{minutes}min",
+                inclusive="left",
+                tz=market_calendar.MARKET_TZ,
+            )
+            rng = self._rng(symbol, day, minutes)
+            path = np.linspace(bar.Open, bar.Close, len(index) + 1) * (1 + rng.normal(0, 0.002, len(index) + 1))
+            opens, closes = path[:-1], path[1:]
+            spreads = np.abs(rng.normal(0, 0.001, len(index)))
+            frames.append(pd.DataFrame(
+                {
+                    "Open": opens.round(1),
+                    "High": (np.maximum(opens, closes) * (1 + spreads)).round(1),
+                    "Low": (np.minimum(opens, closes) * (1 - spreads)).round(1),
+                    "Close": closes.round(1),
+                    "Volume": np.full(len(index), bar.Volume // max(len(index), 1)),
+                },
+                index=index,
+            ))
+        if not frames:
+            return daily.iloc[0:0]
+        return pd.concat(frames)
+
+    @staticmethod
+    def _last_session(now: datetime) -> date:
+        """取引時間中は当日、それ以外は大引けを迎えた直近の営業日"""
+        if market_calendar.is_session_open(now):
+            return now.date()
+        return market_calendar.latest_closed_session(now)
+
+    def _history(
+        self,
+        symbol: str,
+        period: Optional[str],
+        start: Optional[date],
+        interval: str,
+        end: Optional[date] = None
+    ) -> pd.DataFrame:
+        if symbol not in self._universe:
+            return pd.DataFrame(columns=price_store.PRICE_COLUMNS, dtype="float64")
+
+        now = market_calendar.market_now()
+        if start is None and period is not None and period != "max":
+            start = price_store.requested_start(period, now)
+
+        frame = _filter_range(self._daily(symbol, self._last_session(now)), start, end)
+
+        if interval in INTRADAY_MINUTES:
+            return self._intraday(symbol, frame, INTRADAY_MINUTES[interval])
+        if interval in RESAMPLE_RULES:
+            return frame.resample(RESAMPLE_RULES[interval]).agg(
+                {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+            ).dropna()
+        return frame
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        self._call("info")
+        if symbol not in self._universe:
+            return {}
+        info = self.profile(symbol)
+        close = self._daily(symbol, self._last_session(market_calendar.market_now()))["Close"].iloc[-1]
+        info["marketCap"] = float(close * self._rng(symbol, "shares").integers(10_000_000, 2_000_000_000))
+        return info
+
+    def history(
+        self,
+        symbol: str,
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> pd.DataFrame:
+        self._call("history")
+        return self._history(symbol, period, start, interval, end)
+
+    def bulk_history(
+        self,
+        symbols: List[str],
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        interval: str = "1d",
+        end: Optional[date] = None
+    ) -> Dict[str, pd.DataFrame]:
+        self._call("bulk_history")
+        frames = {symbol: self._history(symbol, period, start, interval, end) for symbol in symbols}
+        return {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+
+    def search(self, query: str, limit: int) -> List[StockInfoResponse]:
+        self._call("search")
+        if self._profiles is None:
+            self._profiles = {
+                symbol: (profile, normalize(profile["longName"]) + "|" + normalize(profile["shortName"]))
+                for symbol, profile in ((symbol, self.profile(symbol)) for symbol in self.symbols)
+            }
+        key = normalize(query)
+        results = []
+        for symbol, (profile, names) in self._profiles.items():
+            if symbol.startswith(query) or key in names:
+                results.append(info_to_stock(symbol, profile))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def create_provider(config: ProviderConfig) -> MarketDataProvider:
+    """設定から株価データ提供元を作成"""
+    if config.name == "synthetic":
+        return SyntheticProvider(
+            seed=config.synthetic_seed,
+            latency=config.synthetic_latency,
+            jitter=config.synthetic_jitter,
+            error_rate=config.synthetic_error_rate,
+        )
+    if config.name == "fixture":
+        return CsvFixtureProvider(config.fixture_dir)
+    return YFinanceProvider()
+
+
+_provider: Optional[MarketDataProvider] = None
+
+
+def get_provider() -> MarketDataProvider:
+    """既定の株価データ提供元を取得（初回に設定から作成）"""
+    global _provider
+    if _provider is None:
+        _provider = create_provider(settings.provider)
+    return _provider
+
+
+def set_provider(provider: Optional[MarketDataProvider]) -> None:
+    """既定の株価データ提供元を差し替える（Noneの場合は次回に設定から作り直す）"""
+    global _provider
+    _provider = provider
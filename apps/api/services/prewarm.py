@@ -0,0 +1,240 @@
+"""
+人気・最近リクエストされた銘柄の事前取得
+取引時間・休業日に応じた間隔で企業メタデータと確定済みの日足（取引時間中は当日の足も）を取得し、キャッシュとデータベースに反映する。
+リクエストはスケジューラーが温めたデータから応答できるため、外部APIの呼び出しを待たない
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config import PrewarmConfig, settings
+from database import AsyncSessionLocal, SessionLocal
+from services import market_calendar
+from services.market_data import MarketDataProvider
+from services.stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+# 主要な日本株の証券コード
+POPULAR_SYMBOLS = [
+    "6758",  # ソニーグループ
+    "9984",  # ソフトバンクグループ
+    "7203",  # トヨタ自動車
+    "8306",  # 三菱UFJフィナンシャル・グループ
+    "6861",  # キーエンス
+    "9433",  # KDDI
+    "4063",  # 信越化学工業
+    "8035",  # 東京エレクトロン
+    "4519",  # 中外製薬
+    "6501",  # 日立製作所
+    "1605",  # INPEX
+]
+
+# 取引時間中にリクエストと同じ経路で取得する期間（直近の足のキャッシュは期間によらず共有される）
+SESSION_WARM_PERIOD = "5d"
+
+
+class RecentSymbols:
+    """最近リクエストされた証券コード（新しい順、最大件数と有効期間を超えたものは除外）"""
+
+    def __init__(self, max_symbols: int, ttl: float, clock: Callable[[], float] = time.time):
+        self.max_symbols = max_symbols
+        self.ttl = ttl
+        self.clock = clock
+        self._requested: "OrderedDict[str, float]" = OrderedDict()
+
+    def record(self, symbol: str) -> None:
+        """リクエストされた証券コードを記録"""
+        if self.max_symbols == 0:
+            return
+        self._requested[symbol] = self.clock()
+        self._requested.move_to_end(symbol)
+        while len(self._requested) > self.max_symbols:
+            self._requested.popitem(last=False)
+
+    def symbols(self) -> List[str]:
+        """有効期間内の証券コードを新しい順に取得"""
+        cutoff = self.clock() - self.ttl
+        while self._requested:
+            symbol, requested_at = next(iter(self._requested.items()))
+            if requested_at >= cutoff:
+                break
+            self._requested.popitem(last=False)
+        return list(reversed(self._requested))
+
+    def clear(self) -> None:
+        """すべての記録を削除"""
+        self._requested.clear()
+
+
+class PrewarmScheduler:
+    """事前取得を定期実行するスケジューラー（FastAPIのlifespanで開始・停止する）"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        async_session_factory: Callable[[], Any],
+        recent: RecentSymbols,
+        config: Optional[PrewarmConfig] = None,
+        provider: Optional[MarketDataProvider] = None,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        Args:
+            session_factory: 同期セッションの作成関数
+            async_session_factory: 非同期セッションの作成関数
+            recent: 最近リクエストされた証券コード
+            config: 事前取得の設定（省略時はアプリケーションの設定）
+            provider: 株価データ提供元（省略時は実行時点の既定の提供元）
+            rng: 実行間隔のばらつきに使う乱数生成器
+        """
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.recent = recent
+        self.config = config or settings.prewarm
+        self.provider = provider
+        self.rng = rng or random.Random()
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.next_run_at: Optional[datetime] = None
+
+    def symbols(self) -> List[str]:
+        """事前取得の対象（人気銘柄と最近リクエストされた銘柄）"""
+        return list(dict.fromkeys([*POPULAR_SYMBOLS, *self.recent.symbols()]))
+
+    def next_delay(self, now: datetime) -> float:
+        """
+        次の実行までの秒数
+
+        取引時間中は短い間隔、取引時間外・休業日は長い間隔で実行し、寄り付き・大引けをまたぐ場合は
+        その直後に実行する（大引け後はその日の確定した日足を保存する）。
+        複数のワーカーが同時に外部APIを呼ばないよう、ばらつきを加える
+        """
+        open_now = market_calendar.is_session_open(now)
+        interval = self.config.open_interval if open_now else self.config.closed_interval
+        until_change = (market_calendar.next_session_change(now) - now).total_seconds()
+        if until_change < interval:
+            return until_change + self.rng.uniform(0, self.config.jitter * self.config.open_interval)
+        return interval * (1 + self.rng.uniform(-self.config.jitter, self.config.jitter))
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        対象銘柄を1回事前取得する
+
+        企業メタデータは同時取得数を制限して取得し（有効期間内のものはキャッシュのまま）、
+        データベースにない銘柄は企業情報を保存する。日足は差分同期で確定済みの足のみ取得する。
+        取引時間中はさらにリクエストと同じ経路で株価を取得し、当日の足を直近の足のキャッシュに読み込む
+        """
+        started = time.perf_counter()
+        symbols = self.symbols()
+        db = self.session_factory()
+        try:
+            async with self.async_session_factory() as async_db:
+                service = StockService(db, provider=self.provider, async_session=async_db)
+                stored = {stock.symbol for stock in await service.get_stocks_by_symbols(symbols)}
+
+                semaphore = asyncio.Semaphore(self.config.concurrency)
+
+                async def prefetch(symbol: str):
+                    async with semaphore:
+                        return await service.prefetch_info(symbol)
+
+                results = await asyncio.gather(*(prefetch(symbol) for symbol in symbols), return_exceptions=True)
+
+                failed = []
+                saved = 0
+                for symbol, result in zip(symbols, results):
+                    if isinstance(result, Exception):
+                        logger.warning(f"企業メタデータの事前取得に失敗しました ({symbol}): {result}")
+                        failed.append(symbol)
+                    elif result is not None and symbol not in stored:
+                        try:
+                            await service.save_stock_info(result)
+                            saved += 1
+                        except Exception as e:
+                            logger.warning(f"企業情報の保存に失敗しました ({symbol}): {e}")
+
+                rows = await service.sync_prices(symbols)
+
+                warmed = 0
+                if market_calendar.is_session_open(market_calendar.market_now()):
+                    async def warm(symbol: str):
+                        async with semaphore:
+                            return await service.get_stock_price(symbol, SESSION_WARM_PERIOD, "1d")
+
+                    results = await asyncio.gather(*(warm(symbol) for symbol in symbols), return_exceptions=True)
+                    for symbol, result in zip(symbols, results):
+                        if isinstance(result, Exception):
+                            logger.warning(f"取引時間中の株価の事前取得に失敗しました ({symbol}): {result}")
+                        else:
+                            warmed += 1
+        finally:
+            db.close()
+
+        return {
+            "symbols": len(symbols),
+            "info_failed": failed,
+            "info_saved": saved,
+            "price_rows": sum(rows.values()),
+            "session_warmed": warmed,
+            "duration": time.perf_counter() - started,
+        }
+
+    async def _run(self) -> None:
+        """停止されるまで事前取得を繰り返す"""
+        # 起動直後の同時実行を避けるため、最初の実行もばらつかせる
+        await asyncio.sleep(self.rng.uniform(0, self.config.jitter * self.config.open_interval))
+        while True:
+            try:
+                self.last_run = await self.run_once()
+                self.runs += 1
+                logger.info(
+                    f"事前取得が完了しました: {self.last_run['symbols']}銘柄 "
+                    f"{self.last_run['price_rows']}行 ({self.last_run['duration']:.2f}秒)"
+                )
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"事前取得に失敗しました: {e}")
+
+            now = market_calendar.market_now()
+            delay = self.next_delay(now)
+            self.next_run_at = datetime.fromtimestamp(now.timestamp() + delay, market_calendar.MARKET_TZ)
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        """スケジューラーを開始"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """実行中の事前取得を中断してスケジューラーを停止"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+        return {
+            "running": self._task is not None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "symbols": len(self.symbols()),
+            "last_run": self.last_run,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+        }
+
+
+# アプリケーション全体で共有する記録とスケジューラー
+recent_symbols = RecentSymbols(settings.prewarm.recent_max_symbols, settings.prewarm.recent_ttl)
+prewarm_scheduler = PrewarmScheduler(SessionLocal, AsyncSessionLocal, recent_symbols)
@@ -0,0 +1,97 @@
+"""
+株価取得リクエストの集約
+同じ(証券コード, 期間, データ間隔)の同時リクエストを1回の取得にまとめ、
+完了した結果を短時間だけ再利用する（マイクロキャッシュ）
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import pandas as pd
+
+from config import settings
+from services.cache import CacheBackend, MemoryCache
+from services.singleflight import SingleFlight
+
+# 価格データ1行あたりのおおよそのメモリ使用量（バイト）
+ROW_BYTES = 400
+
+
+def estimate_result_size(result: Dict[str, Any]) -> int:
+    """株価取得結果のおおよそのメモリ使用量を見積もる"""
+    data = result.get("data")
+    if data is None:
+        rows = 0
+    elif isinstance(data, dict):
+        rows = len(data["dates"])
+    else:
+        # StockPriceResponseのリストまたはDataFrame
+        rows = len(data)
+    return 1024 + rows * ROW_BYTES
+
+
+def copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    リクエストごとに株価取得結果を複製する
+
+    DataFrame（layout=frame）は値ごと複製し、リスト・列指向の辞書は入れ物を複製する
+    （リストの要素のStockPriceResponseは共有するため変更しない）
+    """
+    data = result.get("data")
+    if isinstance(data, pd.DataFrame):
+        data = data.copy()
+    elif isinstance(data, dict):
+        data = {key: list(values) for key, values in data.items()}
+    elif isinstance(data, list):
+        data = list(data)
+    return {**result, "data": data}
+
+
+class PriceRequestCoalescer:
+    """同一キーの株価取得を集約し、結果を短時間キャッシュする"""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.singleflight = SingleFlight()
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        キャッシュ済みの結果を返し、なければ取得する
+
+        同じキーの取得が実行中であれば、その完了を待って同じ結果を使う。
+        キャッシュ・他のリクエストと共有しないよう、呼び出し元には複製を返す
+        """
+        if self.ttl > 0:
+            cached = self.backend.get(key)
+            if cached is not None:
+                return copy_result(cached)
+
+        async def load() -> Dict[str, Any]:
+            result = await fetch()
+            if self.ttl > 0:
+                self.backend.set(key, result, self.ttl)
+            return result
+
+        return copy_result(await self.singleflight.do(key, load))
+
+    def clear(self) -> None:
+        """キャッシュ済みの結果を削除"""
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+        return {
+            **self.backend.stats(),
+            "ttl": self.ttl,
+            **self.singleflight.stats(),
+        }
+
+
+# アプリケーション全体で共有する集約レイヤー
+price_coalescer = PriceRequestCoalescer(
+    MemoryCache(
+        max_entries=settings.cache.price_max_entries,
+        max_bytes=settings.cache.price_max_bytes,
+        sizer=estimate_result_size,
+    ),
+    ttl=settings.cache.price_ttl,
+)
@@ -0,0 +1,97 @@
+"""
+株価データの変換
+yfinance形式のDataFrameを列単位（NumPy）でレスポンス用の値に変換する
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter
+
+from models.stock import StockPriceResponse
+from services import json_response
+
+
+def float_column(series: pd.Series) -> List[Optional[float]]:
+    """数値列をfloatのリストに変換（NaNはNone）"""
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result.tolist()
+
+
+def int_column(series: pd.Series) -> List[Optional[int]]:
+    """数値列をintのリストに変換（NaNはNone）"""
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    missing = np.isnan(values)
+    result = np.where(missing, 0, values).astype(np.int64).astype(object)
+    result[missing] = None
+    return result.tolist()
+
+
+def index_to_datetimes(index: pd.DatetimeIndex) -> List[datetime]:
+    """
+    日時の索引をdatetimeのリストに変換
+
+    UTCとの差が一定のタイムゾーン（Asia/Tokyoなど）は固定オフセットのタイムゾーンに置き換える。
+    表す時刻とJSONでの表記は変わらず、ZoneInfoのオフセット計算を1件ずつ行わないためJSON変換が速い
+    """
+    if index.tz is not None and len(index):
+        offsets = (index.tz_localize(None) - index.tz_convert("UTC").tz_localize(None)).unique()
+        if len(offsets) == 1:
+            index = index.tz_convert(timezone(offsets[0].to_pytimedelta()))
+    return index.to_pydatetime().tolist()
+
+
+def frame_to_columns(hist: pd.DataFrame) -> Dict[str, List[Any]]:
+    """価格データを列指向の辞書に変換"""
+    close = float_column(hist['Close'])
+    return {
+        "dates": index_to_datetimes(hist.index),
+        "open": float_column(hist['Open']),
+        "high": float_column(hist['High']),
+        "low": float_column(hist['Low']),
+        "close": close,
+        "volume": int_column(hist['Volume']),
+        "adjusted_close": close,
+    }
+
+
+def frame_to_dicts(symbol: str, hist: pd.DataFrame) -> List[Dict[str, Any]]:
+    """価格データをStockPriceResponseと同じ項目の辞書のリストに変換"""
+    columns = frame_to_columns(hist)
+    return [
+        {
+            "symbol": symbol,
+            "date": date,
+            "open_price": open_price,
+            "high_price": high_price,
+            "low_price": low_price,
+            "close_price": close_price,
+            "volume": volume,
+            "adjusted_close": close_price,
+        }
+        for date, open_price, high_price, low_price, close_price, volume in zip(
+            columns["dates"],
+            columns["open"],
+            columns["high"],
+            columns["low"],
+            columns["close"],
+            columns["volume"],
+        )
+    ]
+
+
+# 1行ずつモデルを作るより、リスト全体をまとめて検証するほうが速い
+_RECORDS = TypeAdapter(List[StockPriceResponse])
+
+
+def frame_to_records(symbol: str, hist: pd.DataFrame) -> List[StockPriceResponse]:
+    """価格データを1行ずつのStockPriceResponseに変換"""
+    return _RECORDS.validate_python(frame_to_dicts(symbol, hist))
+
+
+def frame_to_ndjson(symbol: str, hist: pd.DataFrame) -> bytes:
+    """価格データをStockPriceResponseと同じ項目の1行1件のJSON（NDJSON）に変換"""
+    return b"".join(json_response.dumps(row) + b"\n" for row in frame_to_dicts(symbol, hist))
@@ -0,0 +1,506 @@
+"""
+株価データストア
+stock_pricesテーブルを読み取りキャッシュとして利用し、
+不足している期間だけを外部APIから取得できるようにする
+"""
+import logging
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.stock import StockPrice, StockPriceResponse
+from services import market_calendar
+from services.executor import db_executor
+from services.price_format import float_column, int_column
+
+logger = logging.getLogger(__name__)
+
+# yfinanceのhistory()と同じ列構成
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# データベースに保存する足種
+STORABLE_INTERVALS = {"1d"}
+
+# 日数指定の期間（営業日数として扱う）
+SESSION_PERIODS = {"1d": 1, "5d": 5}
+
+# 月数指定の期間
+MONTH_PERIODS = {"1mo": 1, "3mo": 3, "6mo": 6, "1y": 12, "2y": 24, "5y": 60, "10y": 120}
+
+# 期間の先頭がこの日数以内に揃っていれば保存済みとみなす（連休・上場日のずれを吸収）
+HEAD_TOLERANCE = timedelta(days=7)
+
+# 保存済みの期間の途中で欠けていても取得し直さない営業日数（売買停止などで足がない日を吸収）
+MAX_MISSING_SESSIONS = 3
+
+# INSERT ... ON CONFLICT DO UPDATEに対応した方言ごとのinsert
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# 1ステートメントのバインドパラメータ数の上限（asyncpg）
+MAX_BIND_PARAMS = 32767
+
+# 1行のバインドパラメータ数（idを除くstock_pricesの列。created_atは既定値がパラメータとして渡される）
+UPSERT_ROW_PARAMS = len(StockPrice.__table__.columns) - 1
+
+# PostgreSQLで1ステートメントにまとめる最大行数（パラメータ数の上限に収まる行数）
+# 同期のエンジン（psycopg2）はinsertmanyvaluesにより、非同期のエンジン（asyncpg）はupsert_pagesにより
+# 複数行のVALUESにまとめられ、日足10年分（約2,500行）は1ステートメントで保存できる
+UPSERT_PAGE_ROWS = MAX_BIND_PARAMS // UPSERT_ROW_PARAMS
+
+# upsert時に更新する列
+UPSERT_COLUMNS = ["open_price", "high_price", "low_price", "close_price", "volume", "adjusted_close"]
+
+
+def is_storable(symbol: str, period: str, interval: str) -> bool:
+    """
+    データベースから配信できる銘柄・期間・足種かどうか
+
+    足の確定を東証の大引けで判定するため、東証以外の銘柄は保存しない
+    """
+    return (
+        market_calendar.is_market_symbol(symbol)
+        and interval in STORABLE_INTERVALS
+        and (period in SESSION_PERIODS or period in MONTH_PERIODS or period == "ytd")
+    )
+
+
+def requested_start(period: str, now: datetime) -> date:
+    """期間指定に対応する開始日を計算"""
+    if market_calendar.is_session_open(now):
+        anchor = now.date()
+    else:
+        anchor = market_calendar.latest_closed_session(now)
+
+    if period in SESSION_PERIODS:
+        return market_calendar.sessions_back(anchor, SESSION_PERIODS[period])
+    if period == "ytd":
+        return date(anchor.year, 1, 1)
+    return (pd.Timestamp(anchor) - pd.DateOffset(months=MONTH_PERIODS[period])).date()
+
+
+def find_fetch_start(stored: pd.DataFrame, start: date, now: datetime, first_date: Optional[date] = None) -> Optional[date]:
+    """
+    外部APIから取得すべき開始日を判定
+
+    Args:
+        stored: 開始日以降の保存済み株価
+        start: 期間の開始日
+        now: 現在時刻
+        first_date: 外部APIで取得できる最初の日付（記録済みの場合。開始日より後ならその日を期間の先頭とみなす）
+
+    Returns:
+        取得開始日。保存済みデータで足りる場合はNone
+    """
+    head = max(start, first_date) if first_date else start
+    if stored.empty or stored.index[0].date() > head + HEAD_TOLERANCE:
+        return start
+
+    missing = missing_sessions(stored.index)
+    if len(missing) > MAX_MISSING_SESSIONS:
+        # 途中が欠けている場合は、最初に欠けている営業日から取得し直す
+        return missing[0]
+
+    return fetch_start_after(stored.index[-1].date(), now)
+
+
+def history_start(fetched: pd.DataFrame, fetch_start: date) -> Optional[date]:
+    """
+    期間の先頭から取得した株価が開始日より大きく遅れて始まる場合は、その最初の足の日付（それより前は外部APIにない）
+
+    上場から期間に満たない銘柄を、リクエストのたびに期間の先頭から取得し直さないために記録する
+    """
+    if fetched.empty:
+        return None
+    first = fetched.index[0].date()
+    return first if first > fetch_start + HEAD_TOLERANCE else None
+
+
+def missing_sessions(index: pd.DatetimeIndex, previous: Optional[date] = None) -> List[date]:
+    """
+    保存済みの足の日付の間で欠けている営業日を取得
+
+    Args:
+        index: 日付順の足の日付
+        previous: 直前の足の日付（指定した場合はその翌日から確認する）
+    """
+    if index.empty:
+        return []
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    days = index.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    first = days[0] if previous is None else np.datetime64(previous, "D") + 1
+    calendar = np.arange(first, days[-1] + 1, dtype="datetime64[D]")
+    holidays = np.array(market_calendar.holidays_between(first.item(), days[-1].item()), dtype="datetime64[D]")
+    sessions = calendar[np.is_busday(calendar, holidays=holidays)]
+    return sessions[~np.isin(sessions, days)].astype(date).tolist()
+
+
+def fetch_start_after(last_stored: date, now: datetime) -> Optional[date]:
+    """
+    保存済みの最終日から、外部APIで取得すべき直近の期間の開始日を判定
+
+    Returns:
+        取得開始日（保存済みの最終日）。保存済みデータが最新の場合はNone
+    """
+    if market_calendar.is_session_open(now):
+        # 取引時間中は当日の足を取りに行く
+        return last_stored
+    if last_stored < market_calendar.latest_closed_session(now):
+        return last_stored
+    return None
+
+
+def sync_start(last_date: Optional[date], now: datetime, overlap_sessions: int, initial_period: str) -> date:
+    """
+    差分同期で取得を始める日
+
+    保存済みの最終日を含めてoverlap_sessions営業日さかのぼる（取得元での事後修正を反映するため）。
+    未保存の銘柄はinitial_periodの開始日から取得する
+    """
+    if last_date is None:
+        return requested_start(initial_period, now)
+    if overlap_sessions == 0:
+        return last_date + timedelta(days=1)
+    return market_calendar.sessions_back(last_date, overlap_sessions)
+
+
+def closed_bars(frame: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """大引け前の未確定な足を除外"""
+    cutoff = pd.Timestamp(market_calendar.latest_closed_session(now) + timedelta(days=1))
+    return frame[frame.index < cutoff]
+
+
+def merge_frames(stored: pd.DataFrame, fetched: pd.DataFrame) -> pd.DataFrame:
+    """保存済みデータと取得データを結合（重複日は取得データを優先）"""
+    if fetched.empty:
+        return stored
+    if stored.empty:
+        return fetched
+    return pd.concat([stored[stored.index < fetched.index[0]], fetched])
+
+
+def localize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """保存済みの足（タイムゾーンなしの現地時刻）を、外部APIの取得結果と同じ取引所のタイムゾーン付きに戻す"""
+    if isinstance(frame.index, pd.DatetimeIndex) and frame.index.tz is None:
+        return frame.tz_localize(market_calendar.MARKET_TZ)
+    return frame
+
+
+def trim_frame(frame: pd.DataFrame, start: date) -> pd.DataFrame:
+    """開始日より前の足を除外"""
+    return frame[frame.index >= pd.Timestamp(start)]
+
+
+def split_bulk_frame(frame: pd.DataFrame, symbol_map: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+    """
+    一括ダウンロードの結果を銘柄ごとに分割
+
+    Args:
+        frame: yf.download(group_by="ticker")の結果
+        symbol_map: Yahoo Financeのシンボルから証券コードへの対応
+    """
+    if not isinstance(frame.columns, pd.MultiIndex):
+        # 1銘柄のみの場合は列が階層化されない
+        if len(symbol_map) != 1 or frame.empty:
+            return {}
+        (symbol,) = symbol_map.values()
+        return {symbol: frame.dropna(how="all")}
+
+    available = set(frame.columns.get_level_values(0))
+    return {
+        symbol: frame[yahoo_symbol].dropna(how="all")
+        for yahoo_symbol, symbol in symbol_map.items()
+        if yahoo_symbol in available
+    }
+
+
+def normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """yfinanceのDataFrameを保存用の形式に揃える（取引所の現地時刻・タイムゾーンなし）"""
+    frame = frame[PRICE_COLUMNS]
+    if frame.index.tz is not None:
+        frame = frame.tz_localize(None)
+    return frame
+
+
+def frame_from_prices(price_data: List[StockPriceResponse]) -> pd.DataFrame:
+    """StockPriceResponseのリストをDataFrameに変換"""
+    return pd.DataFrame(
+        {
+            "Open": [price.open_price for price in price_data],
+            "High": [price.high_price for price in price_data],
+            "Low": [price.low_price for price in price_data],
+            "Close": [price.close_price for price in price_data],
+            "Volume": [price.volume for price in price_data],
+        },
+        index=pd.DatetimeIndex([price.date for price in price_data]),
+        dtype="float64",
+    )
+
+
+def price_rows(symbol: str, frame: pd.DataFrame) -> List[dict]:
+    """株価データをstock_pricesの行（辞書）のリストに変換（NaNはNone）"""
+    frame = normalize_frame(frame)
+    # 同じ日付が1ステートメントに2回現れるとON CONFLICTが失敗するため、後の行を残す
+    frame = frame[~frame.index.duplicated(keep="last")]
+    close = float_column(frame["Close"])
+    columns = {
+        "date": frame.index.to_pydatetime().tolist(),
+        "open_price": float_column(frame["Open"]),
+        "high_price": float_column(frame["High"]),
+        "low_price": float_column(frame["Low"]),
+        "close_price": close,
+        "volume": int_column(frame["Volume"]),
+        "adjusted_close": close,
+    }
+    return [
+        {"symbol": symbol, **dict(zip(columns, values))}
+        for values in zip(*columns.values())
+    ]
+
+
+def frames_to_rows(frames: Dict[str, pd.DataFrame]) -> List[dict]:
+    """銘柄ごとの株価データをstock_pricesの行のリストに変換"""
+    return [row for symbol, frame in frames.items() if not frame.empty for row in price_rows(symbol, frame)]
+
+
+def upsert_statement(insert):
+    """
+    INSERT ... ON CONFLICT (symbol, date) DO UPDATEを作成
+
+    行はexecute()のパラメータとして渡す。ステートメントのコンパイルは1回で済み、
+    同期のエンジンではPostgreSQLは複数行のVALUES、SQLiteはexecutemanyで実行される
+
+    Args:
+        insert: 方言ごとのinsert（postgresql.insert または sqlite.insert）
+    """
+    statement = insert(StockPrice)
+    return statement.on_conflict_do_update(
+        index_elements=[StockPrice.symbol, StockPrice.date],
+        set_={column: statement.excluded[column] for column in UPSERT_COLUMNS},
+    ).execution_options(insertmanyvalues_page_size=UPSERT_PAGE_ROWS)
+
+
+def upsert_pages(insert, rows: List[dict]) -> Iterator:
+    """
+    UPSERT_PAGE_ROWS行ずつ、行を複数行のVALUESに埋め込んだINSERT ... ON CONFLICT DO UPDATEを作成
+
+    asyncpgではRETURNINGのないexecutemanyにinsertmanyvaluesが使われず、行ごとの実行になるため、
+    非同期のエンジンでは行をステートメントに埋め込んで1ページ1ステートメントで実行する
+
+    Args:
+        insert: 方言ごとのinsert（postgresql.insert または sqlite.insert）
+    """
+    for offset in range(0, len(rows), UPSERT_PAGE_ROWS):
+        statement = insert(StockPrice).values(rows[offset:offset + UPSERT_PAGE_ROWS])
+        yield statement.on_conflict_do_update(
+            index_elements=[StockPrice.symbol, StockPrice.date],
+            set_={column: statement.excluded[column] for column in UPSERT_COLUMNS},
+        )
+
+
+class PriceStore(ABC):
+    """
+    保存済みの株価データ（日足）のストア
+
+    読み込みはPRICE_COLUMNSの列を持ち、日付（タイムゾーンなし）を索引とするDataFrameを日付順に返す
+    """
+
+    def load(self, symbol: str, start: date, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """開始日以降の保存済み株価を日付順に取得"""
+        return self.load_many([symbol], start, columns)[symbol]
+
+    @abstractmethod
+    def load_many(self, symbols: List[str], start: date, columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        複数銘柄の保存済み株価を取得
+
+        Args:
+            symbols: 証券コードのリスト
+            start: 開始日
+            columns: 読み込む列（省略時はPRICE_COLUMNSのすべて）
+        """
+
+    def iter_batches(self, symbol: str, start: date, batch_size: int) -> Iterator[pd.DataFrame]:
+        """
+        開始日以降の保存済み株価を日付順に batch_size 行ずつ取得
+
+        既定では全体を読み込んでから分割する。全体を読み込まずに取得できるストアは上書きする
+        """
+        frame = self.load(symbol, start)
+        for i in range(0, len(frame), batch_size):
+            yield frame.iloc[i:i + batch_size]
+
+    def save(self, symbol: str, frame: pd.DataFrame) -> int:
+        """株価データを保存（同じ日付のレコードは更新）"""
+        return self.save_many({symbol: frame})
+
+    @abstractmethod
+    def save_many(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """複数銘柄の株価データを保存して保存した行数を返す"""
+
+    @abstractmethod
+    def last_dates(self, symbols: List[str]) -> Dict[str, date]:
+        """銘柄ごとの保存済みの最終日を取得（保存済みの株価がない銘柄は含まない）"""
+
+
+# 読み込む列とstock_pricesの列の対応
+SQL_COLUMNS = {
+    "Open": StockPrice.open_price,
+    "High": StockPrice.high_price,
+    "Low": StockPrice.low_price,
+    "Close": StockPrice.close_price,
+    "Volume": StockPrice.volume,
+}
+
+
+class SqlPriceStore(PriceStore):
+    """stock_pricesテーブルを使った株価データストア"""
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def load_many(self, symbols: List[str], start: date, columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の保存済み株価を1回のクエリで取得"""
+        columns = columns or PRICE_COLUMNS
+        rows = self.db.query(
+            StockPrice.symbol,
+            StockPrice.date,
+            *(SQL_COLUMNS[column] for column in columns),
+        ).filter(
+            StockPrice.symbol.in_(symbols),
+            StockPrice.date >= datetime.combine(start, datetime.min.time())
+        ).order_by(StockPrice.symbol, StockPrice.date).all()
+
+        frame = pd.DataFrame.from_records(rows, columns=["Symbol", "Date", *columns], index="Date")
+        frame.index = pd.DatetimeIndex(frame.index)
+        groups = {symbol: group for symbol, group in frame.groupby("Symbol", sort=False)}
+        empty = frame.iloc[0:0]
+        return {
+            symbol: groups.get(symbol, empty)[columns].astype("float64")
+            for symbol in symbols
+        }
+
+    def iter_batches(self, symbol: str, start: date, batch_size: int) -> Iterator[pd.DataFrame]:
+        """サーバーサイドカーソル（PostgreSQL）で batch_size 行ずつ取得し、全体をメモリに載せない"""
+        result = self.db.execute(
+            select(StockPrice.date, *SQL_COLUMNS.values())
+            .where(
+                StockPrice.symbol == symbol,
+                StockPrice.date >= datetime.combine(start, datetime.min.time())
+            )
+            .order_by(StockPrice.date)
+            .execution_options(yield_per=batch_size)
+        )
+        try:
+            for rows in result.partitions():
+                frame = pd.DataFrame.from_records(rows, columns=["Date", *PRICE_COLUMNS], index="Date")
+                frame.index = pd.DatetimeIndex(frame.index)
+                yield frame.astype("float64")
+        finally:
+            result.close()
+
+    def last_dates(self, symbols: List[str]) -> Dict[str, date]:
+        """銘柄ごとの保存済みの最終日を1回のクエリで取得"""
+        rows = self.db.execute(
+            select(StockPrice.symbol, func.max(StockPrice.date))
+            .where(StockPrice.symbol.in_(symbols))
+            .group_by(StockPrice.symbol)
+        ).all()
+        return {symbol: last.date() for symbol, last in rows}
+
+    def save_many(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """複数銘柄の株価データを保存して1回でコミット"""
+        rows = frames_to_rows(frames)
+        if not rows:
+            return 0
+
+        insert = UPSERT_INSERTS.get(self.db.get_bind().dialect.name)
+        if insert is None:
+            self._merge(rows)
+        else:
+            self.db.execute(upsert_statement(insert), rows)
+        self.db.commit()
+        return len(rows)
+
+    def _merge(self, rows: List[dict]) -> None:
+        """ON CONFLICTに対応していないデータベースでは既存レコードと突き合わせて保存"""
+        for symbol in {row["symbol"] for row in rows}:
+            symbol_rows = [row for row in rows if row["symbol"] == symbol]
+            existing_records = self.db.query(StockPrice).filter(
+                StockPrice.symbol == symbol,
+                StockPrice.date.in_([row["date"] for row in symbol_rows])
+            ).all()
+            existing_dict = {record.date: record for record in existing_records}
+
+            for row in symbol_rows:
+                existing = existing_dict.get(row["date"])
+                if existing:
+                    for column in UPSERT_COLUMNS:
+                        setattr(existing, column, row[column])
+                else:
+                    self.db.add(StockPrice(**row))
+
+
+class AsyncSqlPriceStore:
+    """AsyncSessionを使った株価データストア（最終日の取得と保存のみ）"""
+
+    def __init__(self, db_session: AsyncSession):
+        self.db = db_session
+
+    async def last_dates(self, symbols: List[str]) -> Dict[str, date]:
+        """銘柄ごとの保存済みの最終日を1回のクエリで取得（保存済みの株価がない銘柄は含まない）"""
+        rows = (await self.db.execute(
+            select(StockPrice.symbol, func.max(StockPrice.date))
+            .where(StockPrice.symbol.in_(symbols))
+            .group_by(StockPrice.symbol)
+        )).all()
+        return {symbol: last.date() for symbol, last in rows}
+
+    async def save(self, symbol: str, frame: pd.DataFrame) -> int:
+        """株価データを保存（同じ日付のレコードは更新）"""
+        return await self.save_many({symbol: frame})
+
+    async def save_many(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """複数銘柄の株価データを保存して1回でコミット"""
+        rows = frames_to_rows(frames)
+        if not rows:
+            return 0
+
+        dialect = self.db.get_bind().dialect.name
+        insert = UPSERT_INSERTS.get(dialect)
+        if insert is None:
+            await self.db.run_sync(lambda session: SqlPriceStore(session)._merge(rows))
+        elif dialect == "postgresql":
+            for statement in upsert_pages(insert, rows):
+                await self.db.execute(statement)
+        else:
+            # SQLiteはexecutemanyでもドライバーの1回の呼び出しで済む（複数行のVALUESは変数の上限がある）
+            await self.db.execute(upsert_statement(insert), rows)
+        await self.db.commit()
+        return len(rows)
+
+
+class ExecutorPriceStore:
+    """同期の株価データストアをスレッドプールで実行し、AsyncSqlPriceStoreと同じ非同期インターフェースで使う"""
+
+    def __init__(self, store: PriceStore):
+        self.store = store
+
+    async def last_dates(self, symbols: List[str]) -> Dict[str, date]:
+        """銘柄ごとの保存済みの最終日を取得"""
+        return await db_executor.run(self.store.last_dates, symbols)
+
+    async def save(self, symbol: str, frame: pd.DataFrame) -> int:
+        """株価データを保存（同じ日付のレコードは更新）"""
+        return await self.save_many({symbol: frame})
+
+    async def save_many(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """複数銘柄の株価データを保存"""
+        return await db_executor.run(self.store.save_many, frames)
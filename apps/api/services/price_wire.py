@@ -0,0 +1,241 @@
+"""
+株価データのバイナリ形式
+Acceptヘッダーで指定された形式（Apache Arrow IPCストリーム、MessagePack）に、
+価格データのDataFrameから1行ずつのオブジェクトを作らずに列単位で変換する
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import msgpack
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from services import json_response, market_calendar, price_format
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/x-msgpack"
+JSON = "application/json"
+
+# Acceptで受け付けるメディアタイプ（別名を含む）
+MEDIA_TYPES = {
+    ARROW_STREAM: ARROW_STREAM,
+    MSGPACK: MSGPACK,
+    "application/msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    JSON: JSON,
+    "application/*": JSON,
+    "*/*": JSON,
+}
+
+# Arrow IPCのバッファ圧縮（Acceptのcompressionパラメーターで指定）
+ARROW_COMPRESSIONS = ("zstd", "lz4")
+
+# 価格データ以外の項目（Arrowではスキーマのメタデータ、MessagePackでは同じ階層に入れる）
+SUMMARY_FIELDS = ("symbol", "company_name", "current_price", "change", "change_percent", "volume", "market_cap")
+
+
+class WireFormatError(ValueError):
+    """指定された形式・圧縮方式に対応していない"""
+
+
+class WireFormat(NamedTuple):
+    """応答する形式"""
+    media_type: str
+    compression: Optional[str] = None
+
+    @property
+    def content_type(self) -> str:
+        if self.compression:
+            return f"{self.media_type}; compression={self.compression}"
+        return self.media_type
+
+
+def _parse_accept(accept: str) -> List[Tuple[float, int, str, Dict[str, str]]]:
+    """Acceptヘッダーを(q値, 出現順, メディアタイプ, パラメーター)のリストに分解"""
+    entries = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *parameters = [part.strip() for part in item.split(";")]
+        params = {}
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            params[name.strip().lower()] = value.strip().strip('"')
+        try:
+            quality = float(params.pop("q", "1"))
+        except ValueError:
+            quality = 0.0
+        if media_type and quality > 0:
+            entries.append((quality, position, media_type.lower(), params))
+    return entries
+
+
+def negotiate(accept: Optional[str]) -> Optional[WireFormat]:
+    """
+    Acceptヘッダーから応答する形式を選ぶ
+
+    q値が最も大きく、同じ場合は先に書かれた対応形式を選ぶ。
+    JSONが選ばれた場合と、対応形式がない場合はNone（従来どおりJSONで応答する）
+
+    Raises:
+        WireFormatError: Arrowに対応していない圧縮方式が指定された場合
+    """
+    if not accept:
+        return None
+    candidates = [entry for entry in _parse_accept(accept) if entry[2] in MEDIA_TYPES]
+    if not candidates:
+        return None
+    _, _, media_type, params = max(candidates, key=lambda entry: (entry[0], -entry[1]))
+    media_type = MEDIA_TYPES[media_type]
+    if media_type == JSON:
+        return None
+
+    compression = params.get("compression") or None
+    if compression is not None and (media_type != ARROW_STREAM or compression not in ARROW_COMPRESSIONS):
+        raise WireFormatError(f"Unsupported compression for {media_type}: {compression}")
+    return WireFormat(media_type, compression)
+
+
+def _market_index(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """日時を取引所のタイムゾーン付きに揃える（保存済みの日足はタイムゾーンなしの現地時刻）"""
+    if index.tz is None:
+        return index.tz_localize(market_calendar.MARKET_TZ)
+    return index.tz_convert(market_calendar.MARKET_TZ)
+
+
+def _volume_array(hist: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """出来高をint64の値と欠損のマスクに変換"""
+    values = hist["Volume"].to_numpy(dtype="float64", na_value=np.nan)
+    missing = np.isnan(values)
+    return np.where(missing, 0, values).astype(np.int64), missing
+
+
+def summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """株価取得結果から価格データ以外の項目を取り出す"""
+    return {field: result.get(field) for field in SUMMARY_FIELDS}
+
+
+# Arrow IPC
+
+ARROW_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ns", tz=str(market_calendar.MARKET_TZ))),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("volume", pa.int64()),
+])
+
+
+def frame_to_record_batch(hist: pd.DataFrame, symbol: Optional[str] = None) -> pa.RecordBatch:
+    """
+    価格データをArrowのレコードバッチに変換（NumPyの列をそのまま渡す）
+
+    Args:
+        symbol: 指定した場合は先頭にsymbol列（辞書エンコード）を付ける
+    """
+    volume, missing = _volume_array(hist)
+    arrays = [
+        pa.array(_market_index(hist.index), type=ARROW_SCHEMA.field("date").type),
+        *(
+            pa.array(hist[column].to_numpy(dtype="float64", na_value=np.nan), type=pa.float64(), from_pandas=True)
+            for column in ("Open", "High", "Low", "Close")
+        ),
+        pa.array(volume, type=pa.int64(), mask=missing),
+    ]
+    schema = ARROW_SCHEMA
+    if symbol is not None:
+        indices = pa.array(np.zeros(len(hist), dtype=np.int32))
+        arrays.insert(0, pa.DictionaryArray.from_arrays(indices, pa.array([symbol])))
+        schema = _batch_schema()
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _batch_schema() -> pa.Schema:
+    """複数銘柄のスキーマ（symbol列を追加）"""
+    return ARROW_SCHEMA.insert(0, pa.field("symbol", pa.dictionary(pa.int32(), pa.string())))
+
+
+def _write_arrow(schema: pa.Schema, batches: List[pa.RecordBatch], metadata: Dict[str, Any], compression: Optional[str]) -> bytes:
+    """レコードバッチをArrow IPCストリームに書き込む（メタデータはJSON）"""
+    schema = schema.with_metadata({key: json_response.dumps(value) for key, value in metadata.items()})
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.ipc.new_stream(sink, schema, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def price_to_arrow(result: Dict[str, Any], compression: Optional[str] = None) -> bytes:
+    """
+    1銘柄の株価取得結果（dataはDataFrame）をArrow IPCストリームに変換
+
+    列は date（取引所のタイムゾーン付き）, open, high, low, close, volume で、
+    価格データ以外の項目はスキーマのメタデータ summary にJSONで入れる
+    """
+    batch = frame_to_record_batch(result["data"])
+    return _write_arrow(ARROW_SCHEMA, [batch], {"summary": summary(result)}, compression)
+
+
+def prices_to_arrow(results: List[Dict[str, Any]], missing: List[str], compression: Optional[str] = None) -> bytes:
+    """
+    複数銘柄の株価取得結果をArrow IPCストリームに変換
+
+    銘柄ごとに1つのレコードバッチとし、先頭にsymbol列を付ける。
+    メタデータには銘柄ごとの summary のリストと missing を入れる
+    """
+    batches = [frame_to_record_batch(result["data"], result["symbol"]) for result in results]
+    metadata = {"summary": [summary(result) for result in results], "missing": missing}
+    return _write_arrow(_batch_schema(), batches, metadata, compression)
+
+
+# MessagePack
+
+# MessagePackの日時の列（UNIXエポックからのナノ秒、ビッグエンディアンのint64を連結したbin）
+MSGPACK_DATE_DTYPE = ">i8"
+
+
+def frame_to_msgpack_columns(hist: pd.DataFrame) -> Dict[str, Any]:
+    """
+    価格データをMessagePack用の列指向の辞書に変換（frame_to_columnsと同じ項目）
+
+    日時は足ごとのオブジェクトを作らず、UNIXエポックからのナノ秒（UTC）のint64配列を
+    ビッグエンディアンのバイト列（bin）にそのまま詰める。欠損値はnil
+    """
+    close = price_format.float_column(hist["Close"])
+    return {
+        "dates": _market_index(hist.index).asi8.astype(MSGPACK_DATE_DTYPE).tobytes(),
+        "open": price_format.float_column(hist["Open"]),
+        "high": price_format.float_column(hist["High"]),
+        "low": price_format.float_column(hist["Low"]),
+        "close": close,
+        "volume": price_format.int_column(hist["Volume"]),
+        "adjusted_close": close,
+    }
+
+
+def price_to_msgpack(result: Dict[str, Any]) -> bytes:
+    """1銘柄の株価取得結果をMessagePackに変換（layout=columnsのJSONと同じ構造、datesのみbin）"""
+    return msgpack.packb({**summary(result), "data": frame_to_msgpack_columns(result["data"])})
+
+
+def prices_to_msgpack(results: List[Dict[str, Any]], missing: List[str]) -> bytes:
+    """複数銘柄の株価取得結果をMessagePackに変換（一括取得APIのJSONと同じ構造）"""
+    return msgpack.packb({
+        "results": [{**summary(result), "data": frame_to_msgpack_columns(result["data"])} for result in results],
+        "missing": missing,
+        "total": len(results),
+    })
+
+
+def encode_price(result: Dict[str, Any], wire_format: WireFormat) -> bytes:
+    """1銘柄の株価取得結果を指定された形式に変換"""
+    if wire_format.media_type == ARROW_STREAM:
+        return price_to_arrow(result, wire_format.compression)
+    return price_to_msgpack(result)
+
+
+def encode_prices(results: List[Dict[str, Any]], missing: List[str], wire_format: WireFormat) -> bytes:
+    """複数銘柄の株価取得結果を指定された形式に変換"""
+    if wire_format.media_type == ARROW_STREAM:
+        return prices_to_arrow(results, missing, wire_format.compression)
+    return prices_to_msgpack(results, missing)
@@ -0,0 +1,162 @@
+"""
+チャート用の株価データの集約
+日足などの価格データを週足・月足に集約し、チャートの描画に必要な点数まで間引く。
+いずれも行ごとのループを使わず、NumPyで列単位に計算する
+"""
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# 集約後の足種（キーはyfinanceのinterval表記）
+RESAMPLE_INTERVALS = ("1wk", "1mo", "3mo")
+
+# 間引き方
+# ohlc: 連続する足をまとめてOHLCVを集約（ローソク足向け）
+# lttb: Largest-Triangle-Three-Bucketsで終値の形を保つ足を選ぶ（折れ線向け）
+DOWNSAMPLE_METHODS = ("ohlc", "lttb")
+
+# 1970-01-01（木曜日）を月曜始まりの週に揃えるためのずれ
+_EPOCH_WEEKDAY_OFFSET = 3
+
+
+def _period_keys(index: pd.DatetimeIndex, interval: str) -> np.ndarray:
+    """足ごとの集約先の期間の番号（取引所の現地時刻の暦で週・月・四半期に分ける）"""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    values = index.to_numpy(dtype="datetime64[ns]")
+    if interval == "1wk":
+        return (values.astype("datetime64[D]").astype(np.int64) + _EPOCH_WEEKDAY_OFFSET) // 7
+    months = values.astype("datetime64[M]").astype(np.int64)
+    if interval == "1mo":
+        return months
+    return months // 3
+
+
+def aggregate_ohlcv(frame: pd.DataFrame, starts: np.ndarray) -> pd.DataFrame:
+    """
+    日付順の価格データを、starts（各グループの先頭の行番号）で区切ってOHLCVを集約
+
+    始値は先頭の足、高値は最大、安値は最小、終値は末尾の足、出来高は合計とし、
+    日付は各グループの先頭の足の日付とする
+    """
+    if frame.empty:
+        return frame
+    ends = np.append(starts[1:], len(frame)) - 1
+    high = frame["High"].to_numpy(dtype="float64", na_value=np.nan)
+    low = frame["Low"].to_numpy(dtype="float64", na_value=np.nan)
+    volume = frame["Volume"].to_numpy(dtype="float64", na_value=np.nan)
+    return pd.DataFrame(
+        {
+            "Open": frame["Open"].to_numpy(dtype="float64", na_value=np.nan)[starts],
+            # fmax・fminは欠損値を無視する
+            "High": np.fmax.reduceat(high, starts),
+            "Low": np.fmin.reduceat(low, starts),
+            "Close": frame["Close"].to_numpy(dtype="float64", na_value=np.nan)[ends],
+            "Volume": np.add.reduceat(np.nan_to_num(volume), starts),
+        },
+        index=frame.index[starts],
+    )
+
+
+def resample_ohlcv(frame: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    価格データを週足・月足・四半期足に集約
+
+    Args:
+        frame: 日付順の価格データ（Open, High, Low, Close, Volume）
+        interval: 集約後の足種（1wk, 1mo, 3mo）
+    """
+    if interval not in RESAMPLE_INTERVALS:
+        raise ValueError(f"Invalid resample interval: {interval}. Must be one of {list(RESAMPLE_INTERVALS)}")
+    if frame.empty:
+        return frame
+    keys = _period_keys(frame.index, interval)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    return aggregate_ohlcv(frame, starts)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Bucketsで残す点の位置を選ぶ
+
+    先頭と末尾の点は必ず残し、それ以外の点を threshold - 2 個のバケットに分け、
+    前に選んだ点と次のバケットの平均点とで作る三角形の面積が最大になる点を各バケットから1つ選ぶ
+
+    Args:
+        x: 横軸の値（昇順）
+        y: 縦軸の値
+        threshold: 残す点の数
+
+    Returns:
+        残す点の位置（昇順）
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1])[:threshold]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # 次のバケット（最後のバケットでは末尾の点）の平均
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - average_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (average_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(frame: pd.DataFrame, max_points: int, method: str = "ohlc") -> pd.DataFrame:
+    """
+    価格データを max_points 行以下に間引く
+
+    Args:
+        frame: 日付順の価格データ
+        max_points: 最大の行数
+        method: 間引き方（ohlc: 連続する足を集約、lttb: 終値の形を保つ足を選ぶ）
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Invalid downsample method: {method}. Must be one of {list(DOWNSAMPLE_METHODS)}")
+    if len(frame) <= max_points:
+        return frame
+
+    if method == "ohlc":
+        size = math.ceil(len(frame) / max_points)
+        return aggregate_ohlcv(frame, np.arange(0, len(frame), size))
+
+    # 終値のない足は折れ線に描けないため除いてから選ぶ
+    frame = frame[frame["Close"].notna()]
+    if len(frame) <= max_points:
+        return frame
+    x = frame.index.asi8.astype("float64")
+    y = frame["Close"].to_numpy(dtype="float64")
+    return frame.iloc[lttb_indices(x, y, max_points)]
+
+
+def shape_history(
+    frame: pd.DataFrame,
+    resample: Optional[str] = None,
+    max_points: Optional[int] = None,
+    method: str = "ohlc"
+) -> pd.DataFrame:
+    """チャート用に価格データを集約してから間引く（いずれも省略時はそのまま返す）"""
+    if resample:
+        frame = resample_ohlcv(frame, resample)
+    if max_points:
+        frame = downsample(frame, max_points, method)
+    return frame
@@ -0,0 +1,176 @@
+"""
+銘柄検索用のメモリ内インデックス
+証券コードの前方一致（ソート済み配列）と、正規化した企業名のn-gram転置インデックスで、
+データベースに問い合わせずに入力補完の検索を行う
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models.stock import StockInfoResponse
+
+# ひらがな（ぁ〜ゖ）をカタカナに変換する対応表
+_HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in range(0x3041, 0x3097)}
+
+
+def normalize(text: str) -> str:
+    """
+    検索用に文字列を正規化
+
+    NFKC正規化で全角・半角を揃え（ｿﾆｰ → ソニー、ＳＯＮＹ → SONY）、
+    小文字化してひらがなをカタカナに揃え（そにー → ソニー）、空白を除去する
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = text.translate(_HIRAGANA_TO_KATAKANA)
+    return "".join(text.split())
+
+
+def ngrams(text: str) -> Set[str]:
+    """1文字と2文字のn-gramを取得"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class _IndexState:
+    """インデックスの中身（再構築時は丸ごと差し替える）"""
+
+    def __init__(self):
+        self.entries: Dict[str, StockInfoResponse] = {}
+        self.names: Dict[str, List[str]] = {}
+        self.symbols: List[str] = []
+        self.grams: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, stock: StockInfoResponse) -> None:
+        names = [normalize(name) for name in (stock.company_name, stock.company_name_en) if name]
+        self.entries[stock.symbol] = stock
+        self.names[stock.symbol] = [name for name in names if name]
+        for name in self.names[stock.symbol]:
+            for gram in ngrams(name):
+                self.grams[gram].add(stock.symbol)
+
+    def remove(self, symbol: str) -> None:
+        if symbol not in self.entries:
+            return
+        for name in self.names.pop(symbol):
+            for gram in ngrams(name):
+                postings = self.grams.get(gram)
+                if postings is not None:
+                    postings.discard(symbol)
+                    if not postings:
+                        del self.grams[gram]
+        del self.entries[symbol]
+
+
+class SearchIndex:
+    """銘柄検索用のメモリ内インデックス"""
+
+    def __init__(self):
+        self._state = _IndexState()
+        self._lock = threading.Lock()
+        self.built_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        """構築済みかどうか"""
+        return self.built_at is not None
+
+    def is_stale(self, max_age: float) -> bool:
+        """最後の構築から指定秒数が経過しているかどうか"""
+        return self.built_at is None or time.monotonic() - self.built_at >= max_age
+
+    def __len__(self) -> int:
+        return len(self._state.entries)
+
+    def rebuild(self, stocks: Iterable[StockInfoResponse]) -> None:
+        """インデックスを作り直して差し替える"""
+        state = _IndexState()
+        for stock in stocks:
+            state.add(stock)
+        state.symbols = sorted(state.entries)
+        with self._lock:
+            self._state = state
+            self.built_at = time.monotonic()
+
+    def upsert(self, stock: StockInfoResponse) -> None:
+        """銘柄を追加または更新"""
+        with self._lock:
+            state = self._state
+            is_new = stock.symbol not in state.entries
+            state.remove(stock.symbol)
+            state.add(stock)
+            if is_new:
+                symbols = list(state.symbols)
+                symbols.insert(bisect_left(symbols, stock.symbol), stock.symbol)
+                state.symbols = symbols
+
+    def get(self, symbol: str) -> Optional[StockInfoResponse]:
+        """証券コードの完全一致で取得"""
+        return self._state.entries.get(symbol)
+
+    def clear(self) -> None:
+        """インデックスを空にして未構築の状態に戻す"""
+        with self._lock:
+            self._state = _IndexState()
+            self.built_at = None
+
+    def search(self, query: str, limit: int) -> List[StockInfoResponse]:
+        """
+        証券コードの前方一致と企業名の部分一致で検索
+
+        証券コードの一致を先に、企業名は完全一致・前方一致・名前の短い順に返す
+        """
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        state = self._state
+
+        symbols = self._match_symbols(state, normalized.upper(), limit)
+        if len(symbols) < limit:
+            found = set(symbols)
+            names = [symbol for symbol in self._match_names(state, normalized, limit + len(found)) if symbol not in found]
+            symbols.extend(names[:limit - len(symbols)])
+
+        return [state.entries[symbol] for symbol in symbols]
+
+    @staticmethod
+    def _match_symbols(state: _IndexState, prefix: str, limit: int) -> List[str]:
+        """証券コードの前方一致（完全一致が先頭になる）"""
+        symbols = state.symbols
+        matches = []
+        position = bisect_left(symbols, prefix)
+        while position < len(symbols) and len(matches) < limit and symbols[position].startswith(prefix):
+            matches.append(symbols[position])
+            position += 1
+        return matches
+
+    @staticmethod
+    def _match_names(state: _IndexState, query: str, limit: int) -> List[str]:
+        """企業名の部分一致"""
+        grams = {query} if len(query) == 1 else {query[i:i + 2] for i in range(len(query) - 1)}
+        postings = [state.grams.get(gram) for gram in grams]
+        if not postings or any(not posting for posting in postings):
+            return []
+
+        # 件数の少ない転置リストから絞り込み、n-gramの偶然の一致を除外
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+
+        def rank(symbol: str) -> Tuple[int, int, str]:
+            names = state.names[symbol]
+            if query in names:
+                position = 0
+            elif any(name.startswith(query) for name in names):
+                position = 1
+            else:
+                position = 2
+            return position, min(len(name) for name in names), symbol
+
+        matches = [symbol for symbol in candidates if any(query in name for name in state.names[symbol])]
+        return heapq.nsmallest(limit, matches, key=rank)
+
+
+# アプリケーション全体で共有するインデックス
+search_index = SearchIndex()
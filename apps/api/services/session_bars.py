@@ -0,0 +1,55 @@
+"""
+取引時間中の直近の足のキャッシュ
+取引時間中は保存済みの最終日以降の足（当日の未確定の足を含む）を外部APIから取得する必要があるため、
+事前取得やリクエストで取得した足を短時間保持し、同じ銘柄のリクエストには外部APIを呼ばずに応答する
+"""
+from datetime import date
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import settings
+from services.cache import CacheBackend, MemoryCache
+
+
+def frame_size(frame: pd.DataFrame) -> int:
+    """DataFrameのメモリ使用量（バイト）"""
+    return int(frame.memory_usage(index=True).sum())
+
+
+class SessionBarCache:
+    """(証券コード, 取得開始日)をキーとした、取引時間中に外部APIから取得した足のキャッシュ"""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get(self, symbol: str, start: date) -> Optional[pd.DataFrame]:
+        """有効期間内の足を取得（なければNone）"""
+        if self.ttl <= 0:
+            return None
+        return self.backend.get((symbol, start))
+
+    def set(self, symbol: str, start: date, frame: pd.DataFrame) -> None:
+        """取得開始日から取得した足を保存"""
+        if self.ttl > 0:
+            self.backend.set((symbol, start), frame, self.ttl)
+
+    def clear(self) -> None:
+        """すべてのキャッシュを削除"""
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+        return {**self.backend.stats(), "ttl": self.ttl}
+
+
+# アプリケーション全体で共有するキャッシュ
+session_bars = SessionBarCache(
+    MemoryCache(
+        max_entries=settings.cache.session_max_entries,
+        max_bytes=settings.cache.session_max_bytes,
+        sizer=frame_size,
+    ),
+    ttl=settings.cache.session_ttl,
+)
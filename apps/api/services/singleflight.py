@@ -0,0 +1,54 @@
+"""
+同一キーの同時呼び出しの集約（シングルフライト）
+同じキーで同時に発生した処理を1回の実行にまとめ、結果を共有する
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """同じキーの実行中の処理があれば、その完了を待って結果を共有する"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        キーごとに1回だけfuncを実行して結果を返す
+
+        呼び出し元がキャンセルされても実行中の処理は継続し、
+        同じキーで待っている他の呼び出し元に結果を返す
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 待っている呼び出し元がいない場合の未取得例外の警告を抑止
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self) -> int:
+        """実行中のキー数"""
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報を取得"""
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": self.inflight,
+        }
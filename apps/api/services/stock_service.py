@@ -2,24 +2,60 @@
 株価データ取得サービス
 外部APIから株価情報を取得し、データベースに保存・管理
 """
+import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import List, Dict, Any
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
 import pandas as pd
-import yfinance as yf
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models.stock import StockInfo, StockPrice, StockInfoResponse, StockPriceResponse
+from config import settings
+
+from models.stock import PriceHistoryStart, StockInfo, StockInfoResponse, StockPriceResponse
+from services import http_cache, market_calendar, price_format, price_store
+from services.executor import db_executor, provider_executor
+from services.http_cache import ResourceVersion
+from services.info_cache import MARKET_FIELDS, PROFILE_FIELDS, info_cache
+from services.market_data import MarketDataProvider, get_provider, info_to_stock
+from services.price_coalescer import price_coalescer
+from services.search_index import search_index
+from services.session_bars import session_bars
+from services.singleflight import SingleFlight
+from services.columnar_store import get_columnar_store
+from services.price_store import AsyncSqlPriceStore, ExecutorPriceStore, PriceStore, SqlPriceStore
+from services.resample import shape_history
+from services.timing import span
 
 logger = logging.getLogger(__name__)
 
+# 検索インデックスの同時再構築を1回にまとめる
+_index_rebuilds = SingleFlight()
+
 
 class StockService:
     """株価データ取得サービス"""
     
-    def __init__(self, db_session: Session):
+    def __init__(
+        self,
+        db_session: Session,
+        provider: Optional[MarketDataProvider] = None,
+        async_session: Optional[AsyncSession] = None
+    ):
         self.db = db_session
+        # 検索・保存などのクエリはスレッドプールを使わずAsyncSessionで実行する
+        self.async_db = async_session
+        if settings.price_store.backend == "sql":
+            self.price_store: PriceStore = SqlPriceStore(db_session)
+            self.async_price_store = AsyncSqlPriceStore(async_session) if async_session is not None else None
+        else:
+            # 列指向のストアはファイルを読み書きするため、非同期の処理もスレッドプールで実行する
+            self.price_store = get_columnar_store()
+            self.async_price_store = ExecutorPriceStore(self.price_store)
+        # 株価データ提供元（省略時は設定に応じた既定の提供元）
+        self.provider = provider or get_provider()
     
     async def search_stocks(self, query: str, limit: int = 10) -> List[StockInfoResponse]:
         """
@@ -33,8 +69,14 @@ class StockService:
             検索結果のリスト
         """
         try:
-            # データベースから検索
-            db_results = self._search_from_database(query, limit)
+            if await self._ensure_search_index():
+                # メモリ内インデックスから検索
+                with span("search.index"):
+                    db_results = search_index.search(query, limit)
+            else:
+                # データベースから検索
+                with span("db.search"):
+                    db_results = await self._search_from_database(query, limit)
             
             # データベースに結果がない場合、外部APIから検索
             if not db_results:
@@ -47,63 +89,163 @@ class StockService:
             logger.error(f"株式検索エラー: {e}")
             raise Exception(f"株式検索に失敗しました: {str(e)}")
     
-    def _search_from_database(self, query: str, limit: int) -> List[StockInfoResponse]:
+    async def get_stock_info(self, symbol: str) -> Optional[StockInfoResponse]:
+        """
+        証券コードの完全一致で株式情報を取得
+        
+        検索インデックス（無効な場合はデータベース）になければ外部APIから取得する
+        """
+        try:
+            if await self._ensure_search_index():
+                stock = search_index.get(symbol)
+            else:
+                with span("db.query"):
+                    stock = await self._get_stock_from_database(symbol)
+            if stock:
+                return stock
+            
+            external_results = await self._search_from_external_api(symbol, 1)
+            return external_results[0] if external_results else None
+            
+        except Exception as e:
+            logger.error(f"株式情報取得エラー ({symbol}): {e}")
+            raise Exception(f"株式情報の取得に失敗しました: {str(e)}")
+    
+    async def get_info_version(self, symbol: str) -> Optional[ResourceVersion]:
+        """stock_infoの更新日時から株式情報の版を取得（データベースにない場合はNone）"""
+        with span("db.query"):
+            updated_at = await self.async_db.scalar(
+                select(StockInfo.updated_at).where(
+                    StockInfo.symbol == symbol,
+                    StockInfo.is_active == True
+                ).limit(1)
+            )
+        return http_cache.info_version(symbol, updated_at) if updated_at else None
+    
+    async def _get_stock_from_database(self, symbol: str) -> Optional[StockInfoResponse]:
+        """証券コードの完全一致でデータベースから株式情報を取得"""
+        stock = await self.async_db.scalar(
+            select(StockInfo).where(
+                StockInfo.symbol == symbol,
+                StockInfo.is_active == True
+            ).limit(1)
+        )
+        return StockInfoResponse.model_validate(stock) if stock else None
+    
+    async def _ensure_search_index(self) -> bool:
+        """
+        検索インデックスを使える状態にする（未構築・期限切れの場合は再構築）
+        
+        Returns:
+            検索インデックスを使うかどうか
+        """
+        if not settings.search.index_enabled:
+            return False
+        if search_index.is_stale(settings.search.index_max_age):
+            with span("search.rebuild"):
+                await _index_rebuilds.do("rebuild", self.rebuild_search_index)
+        return True
+    
+    async def rebuild_search_index(self) -> int:
+        """アクティブな銘柄から検索インデックスを再構築"""
+        return await db_executor.run(self._rebuild_search_index)
+    
+    def _rebuild_search_index(self) -> int:
+        """検索インデックスの再構築（スレッドプールで実行）"""
+        stocks = self.db.query(StockInfo).filter(StockInfo.is_active == True).all()
+        search_index.rebuild(StockInfoResponse.model_validate(stock) for stock in stocks)
+        return len(stocks)
+    
+    async def _search_from_database(self, query: str, limit: int) -> List[StockInfoResponse]:
         """データベースから株式情報を検索"""
         results = []
         
         # 証券コードで検索（完全一致）
         if query.isdigit():
-            stock = self.db.query(StockInfo).filter(
-                StockInfo.symbol == query,
-                StockInfo.is_active == True
-            ).first()
+            stock = await self._get_stock_from_database(query)
             if stock:
-                results.append(StockInfoResponse.model_validate(stock))
+                results.append(stock)
         
-        # 企業名で検索（部分一致）
-        stocks = self.db.query(StockInfo).filter(
-            StockInfo.company_name.ilike(f"%{query}%"),
-            StockInfo.is_active == True
-        ).limit(limit).all()
+        # 企業名・英語名で検索（部分一致、関連度順）
+        pattern = f"%{self._escape_like(query)}%"
+        stocks = (await self.async_db.scalars(
+            select(StockInfo).where(
+                or_(
+                    StockInfo.company_name.ilike(pattern, escape="\\"),
+                    StockInfo.company_name_en.ilike(pattern, escape="\\")
+                ),
+                StockInfo.is_active == True
+            ).order_by(*self._name_search_order(query)).limit(limit)
+        )).all()
         
+        found_symbols = {result.symbol for result in results}
         for stock in stocks:
-            if len(results) < limit:
+            if len(results) < limit and stock.symbol not in found_symbols:
                 results.append(StockInfoResponse.model_validate(stock))
         
         return results
     
+    @staticmethod
+    def _escape_like(query: str) -> str:
+        """LIKEのワイルドカード文字をエスケープ"""
+        return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    
+    def _name_search_order(self, query: str) -> List[Any]:
+        """
+        企業名検索の並び順
+        
+        PostgreSQLではpg_trgmの類似度（GINインデックスで部分一致を高速化）、
+        それ以外（テスト用SQLiteなど）では完全一致・前方一致・名前の短さの順
+        """
+        if self.async_db.get_bind().dialect.name == "postgresql":
+            similarity = func.greatest(
+                func.similarity(StockInfo.company_name, query),
+                func.similarity(func.coalesce(StockInfo.company_name_en, ""), query)
+            )
+            return [similarity.desc(), StockInfo.symbol]
+        
+        prefix = f"{self._escape_like(query)}%"
+        rank = case(
+            (or_(StockInfo.company_name == query, StockInfo.company_name_en == query), 0),
+            (or_(
+                StockInfo.company_name.ilike(prefix, escape="\\"),
+                StockInfo.company_name_en.ilike(prefix, escape="\\")
+            ), 1),
+            else_=2
+        )
+        return [rank, func.length(StockInfo.company_name), StockInfo.symbol]
+    
     async def _search_from_external_api(self, query: str, limit: int) -> List[StockInfoResponse]:
         """外部APIから株式情報を検索"""
         results = []
         
         try:
-            # Yahoo Financeから検索
             if query.isdigit():
-                # 証券コードの場合、日本株として検索
-                symbol = f"{query}.T"
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
+                # 証券コードの場合、日本株として企業メタデータを取得（キャッシュ経由）
+                info = await self._get_info(query, PROFILE_FIELDS)
                 
                 if info and info.get('symbol'):
-                    stock_info = StockInfoResponse(
-                        symbol=query,
-                        company_name=info.get('longName', ''),
-                        company_name_en=info.get('shortName', ''),
-                        market=info.get('exchange', ''),
-                        sector=info.get('sector', ''),
-                        industry=info.get('industry', '')
-                    )
-                    results.append(stock_info)
-            
-            # 企業名での検索は複雑なため、基本的な検索のみ実装
-            # 実際の実装では、より高度な検索機能が必要
+                    results.append(info_to_stock(query, info))
+            else:
+                # 企業名での検索（提供元が対応している場合のみ結果が返る）
+                with span("provider.search"):
+                    results = await provider_executor.run(self.provider.search, query, limit)
             
         except Exception as e:
             logger.error(f"外部API検索エラー: {e}")
         
         return results
     
-    async def get_stock_price(self, symbol: str, period: str = "1d", interval: str = "1d") -> Dict[str, Any]:
+    async def get_stock_price(
+        self,
+        symbol: str,
+        period: str = "1d",
+        interval: str = "1d",
+        layout: str = "rows",
+        resample: Optional[str] = None,
+        max_points: Optional[int] = None,
+        downsample: str = "ohlc"
+    ) -> Dict[str, Any]:
         """
         株価データを取得
         
@@ -111,146 +253,640 @@ class StockService:
             symbol: 証券コード
             period: 取得期間
             interval: データ間隔
+            layout: 価格データの形式（rows: StockPriceResponseのリスト、columns: 列指向の辞書、frame: DataFrameのまま）
+            resample: 集約後の足種（1wk, 1mo, 3mo）。取得した足からOHLCVを集約する
+            max_points: 最大の足数。超える場合はdownsampleの方法で間引く
+            downsample: 間引き方（ohlc: 連続する足を集約、lttb: 終値の形を保つ足を選ぶ）
             
         Returns:
             株価データの辞書
         """
+        # 同じ条件の同時リクエストは1回の取得にまとめる
+        return await price_coalescer.get(
+            (symbol, period, interval, layout, resample, max_points, downsample),
+            lambda: self._get_shared_stock_price(symbol, period, interval, layout, resample, max_points, downsample)
+        )
+    
+    async def _get_shared_stock_price(self, *args: Any) -> Dict[str, Any]:
+        """
+        集約レイヤーで共有する株価取得を専用のセッションで実行
+        
+        共有された取得は最初のリクエストが切断されても続くため、そのリクエストのセッション
+        （切断時に閉じられる）は使わず、同じエンジンに接続した別のセッションを開く
+        """
+        with Session(bind=self.db.get_bind(), autoflush=False) as db:
+            return await StockService(db, self.provider)._get_stock_price(*args)
+    
+    async def get_price_version(
+        self,
+        symbol: str,
+        period: str = "1d",
+        interval: str = "1d",
+        layout: str = "rows",
+        resample: Optional[str] = None,
+        max_points: Optional[int] = None,
+        downsample: str = "ohlc"
+    ) -> Optional[ResourceVersion]:
+        """
+        株価データの版を保存済みの足のみから計算（外部APIは呼ばない）
+        
+        get_stock_priceの結果の"version"と同じ値になる。
+        保存済みの足や企業情報だけでは応答できない（外部APIからの取得が必要な）場合はNone
+        """
+        if not price_store.is_storable(symbol, period, interval):
+            return None
+        
+        now = market_calendar.market_now()
+        start = price_store.requested_start(period, now)
+        with span("db.load"):
+            stored = await db_executor.run(self.price_store.load, symbol, start)
+        if stored.empty or (await self._find_fetch_starts({symbol: stored}, start, now))[symbol] is not None:
+            return None
+        profile = await self._peek_company_profile(symbol)
+        if profile is None:
+            return None
+        return http_cache.price_version(
+            (symbol, period, interval, layout, resample, max_points, downsample, *profile),
+            price_store.localize_frame(stored),
+            now
+        )
+    
+    async def _get_stock_price(
+        self,
+        symbol: str,
+        period: str,
+        interval: str,
+        layout: str,
+        resample: Optional[str] = None,
+        max_points: Optional[int] = None,
+        downsample: str = "ohlc"
+    ) -> Dict[str, Any]:
+        """株価データを取得（集約レイヤーを通さない）"""
         try:
-            # 日本株の場合、.Tを追加
-            yahoo_symbol = f"{symbol}.T" if symbol.isdigit() else symbol
-            
-            # Yahoo Financeからデータを取得
-            ticker = yf.Ticker(yahoo_symbol)
-            
-            # 基本情報を取得
-            info = ticker.info
-            
-            # 価格データを取得
-            hist = ticker.history(period=period, interval=interval)
+            # 価格データを取得（保存済みの期間はデータベースから）
+            hist, from_provider = await self._load_history(symbol, period, interval)
             
             if hist.empty:
                 raise Exception(f"株価データが見つかりません: {symbol}")
             
-            # 最新の価格情報
-            latest = hist.iloc[-1]
+            # 企業情報を取得（本文に含まれるため版の計算にも使う）
+            company_name, market_cap = await self._get_company_profile(symbol, from_provider)
             
-            # 前日比の計算
-            change = 0
-            change_percent = 0
-            if len(hist) > 1:
-                prev_close = hist.iloc[-2]['Close']
-                change = latest['Close'] - prev_close
-                change_percent = (change / prev_close) * 100
+            version = http_cache.price_version(
+                (symbol, period, interval, layout, resample, max_points, downsample, company_name, market_cap),
+                hist,
+                market_calendar.market_now()
+            )
             
-            # 価格データをリストに変換
-            price_data = []
-            for date, row in hist.iterrows():
-                price_data.append(StockPriceResponse(
-                    symbol=symbol,
-                    date=date,
-                    open_price=float(row['Open']) if not pd.isna(row['Open']) else None,
-                    high_price=float(row['High']) if not pd.isna(row['High']) else None,
-                    low_price=float(row['Low']) if not pd.isna(row['Low']) else None,
-                    close_price=float(row['Close']) if not pd.isna(row['Close']) else None,
-                    volume=int(row['Volume']) if not pd.isna(row['Volume']) else None,
-                    adjusted_close=float(row['Close']) if not pd.isna(row['Close']) else None
-                ))
+            if resample or max_points:
+                with span("resample"):
+                    hist = shape_history(hist, resample, max_points, downsample)
             
-            return {
-                "symbol": symbol,
-                "company_name": info.get('longName', ''),
-                "current_price": float(latest['Close']) if not pd.isna(latest['Close']) else None,
-                "change": change,
-                "change_percent": change_percent,
-                "volume": int(latest['Volume']) if not pd.isna(latest['Volume']) else None,
-                "market_cap": info.get('marketCap'),
-                "data": price_data
-            }
+            with span("build"):
+                return {**self._build_price_response(symbol, hist, company_name, market_cap, layout), "version": version}
             
         except Exception as e:
             logger.error(f"株価取得エラー ({symbol}): {e}")
             raise Exception(f"株価データの取得に失敗しました: {str(e)}")
     
-    async def save_stock_info(self, stock_info: StockInfoResponse) -> None:
-        """株式情報をデータベースに保存"""
+    async def stream_stock_price(
+        self,
+        symbol: str,
+        period: str = "1d",
+        interval: str = "1d",
+        batch_size: int = 1000
+    ) -> AsyncIterator[pd.DataFrame]:
+        """
+        株価データを batch_size 足ずつ日付順に取得
+        
+        保存済みの期間はデータベースのカーソル（列指向のストアはファイルのレコードバッチ）から読んだ分だけ返し、
+        最後に不足している直近の期間だけを外部APIから取得して返す。
+        期間の先頭が保存されていない場合と保存しない期間・足種は、外部APIの取得結果を分割して返す
+        
+        Args:
+            symbol: 証券コード
+            period: 取得期間
+            interval: データ間隔
+            batch_size: 1回に返す足の数
+        """
+        if not price_store.is_storable(symbol, period, interval):
+            with span("provider.history"):
+                hist = await provider_executor.run(self.provider.history, symbol, period=period, interval=interval)
+            for i in range(0, len(hist), batch_size):
+                yield hist.iloc[i:i + batch_size]
+            return
+        
+        now = market_calendar.market_now()
+        start = price_store.requested_start(period, now)
+        batches = self.price_store.iter_batches(symbol, start, batch_size)
+        last_stored = None
+        gap = None
+        missing_count = 0
+        try:
+            while True:
+                batch = await db_executor.run(next, batches, None)
+                if batch is None:
+                    break
+                if last_stored is None and batch.index[0].date() > start + price_store.HEAD_TOLERANCE:
+                    break
+                missing = price_store.missing_sessions(batch.index, None if last_stored is None else last_stored.date())
+                missing_count += len(missing)
+                if missing_count > price_store.MAX_MISSING_SESSIONS:
+                    # 途中が欠けている場合は、欠けている営業日より前の足までを返して残りを取得する
+                    gap = missing[0]
+                    batch = batch[batch.index < pd.Timestamp(gap)]
+                    if not batch.empty:
+                        last_stored = batch.index[-1]
+                        yield price_store.localize_frame(batch)
+                    break
+                last_stored = batch.index[-1]
+                yield price_store.localize_frame(batch)
+        finally:
+            await db_executor.run(batches.close)
+        
+        if last_stored is None:
+            # 期間の先頭が保存されていないため、まとめて取得（保存済みの期間との結合・書き戻しを含む）
+            hist, _ = await self._load_history(symbol, period, interval)
+            for i in range(0, len(hist), batch_size):
+                yield hist.iloc[i:i + batch_size]
+            return
+        
+        fetch_start = gap or price_store.fetch_start_after(last_stored.date(), now)
+        if fetch_start is None:
+            return
+        with span("provider.history"):
+            fetched = await provider_executor.run(self.provider.history, symbol, start=fetch_start, interval=interval)
+        if fetched.empty:
+            return
+        fetched = price_store.normalize_frame(fetched)
         try:
-            # 既存のレコードをチェック
-            existing = self.db.query(StockInfo).filter(StockInfo.symbol == stock_info.symbol).first()
+            # 確定済みの足のみ書き戻す
+            with span("db.save"):
+                await db_executor.run(self.price_store.save, symbol, price_store.closed_bars(fetched, now))
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"株価データ書き戻しエラー ({symbol}): {e}")
+        # 返し済みの足より後の足のみ返す
+        yield price_store.localize_frame(fetched[fetched.index > last_stored])
+    
+    async def get_stock_prices(
+        self,
+        symbols: List[str],
+        period: str = "1d",
+        interval: str = "1d",
+        layout: str = "rows"
+    ) -> List[Dict[str, Any]]:
+        """
+        複数銘柄の株価データを一括取得
+        
+        外部APIへの問い合わせは不足分をまとめた1回の一括ダウンロードのみで、
+        企業名はデータベースから取得する（時価総額は返さない）
+        
+        Args:
+            symbols: 証券コードのリスト
+            period: 取得期間
+            interval: データ間隔
+            layout: 価格データの形式（rows: StockPriceResponseのリスト、columns: 列指向の辞書、frame: DataFrameのまま）
             
-            if existing:
-                # 更新
-                existing.company_name = stock_info.company_name
-                existing.company_name_en = stock_info.company_name_en
-                existing.market = stock_info.market
-                existing.sector = stock_info.sector
-                existing.industry = stock_info.industry
-                existing.updated_at = datetime.now(timezone.utc)
-            else:
-                # 新規作成
-                new_stock = StockInfo(
-                    symbol=stock_info.symbol,
-                    company_name=stock_info.company_name,
-                    company_name_en=stock_info.company_name_en,
-                    market=stock_info.market,
-                    sector=stock_info.sector,
-                    industry=stock_info.industry
-                )
-                self.db.add(new_stock)
+        Returns:
+            株価データが見つかった銘柄ごとの辞書のリスト（指定順）
+        """
+        try:
+            symbols = list(dict.fromkeys(symbols))
+            histories = await self._load_histories(symbols, period, interval)
+            with span("db.query"):
+                company_names = await db_executor.run(self._get_company_names, symbols)
             
-            self.db.commit()
+            with span("build"):
+                return [
+                    self._build_price_response(symbol, histories[symbol], company_names.get(symbol), None, layout)
+                    for symbol in symbols
+                    if not histories[symbol].empty
+                ]
             
+        except Exception as e:
+            logger.error(f"株価一括取得エラー: {e}")
+            raise Exception(f"株価データの一括取得に失敗しました: {str(e)}")
+    
+    def _build_price_response(
+        self,
+        symbol: str,
+        hist: pd.DataFrame,
+        company_name: Optional[str],
+        market_cap: Optional[float],
+        layout: str = "rows"
+    ) -> Dict[str, Any]:
+        """
+        価格データのDataFrameからレスポンス用の辞書を作成
+        
+        Args:
+            layout: dataの形式（rows: StockPriceResponseのリスト、columns: 列指向の辞書（dates, open, ...）、
+                frame: DataFrameのまま（バイナリ形式への変換用））
+        """
+        # 現在値と前日比は最後の2本の足から計算
+        latest = price_format.frame_to_columns(hist.iloc[-2:])
+        closes = latest["close"]
+        
+        change = 0
+        change_percent = 0
+        if len(closes) > 1 and closes[-1] is not None and closes[-2]:
+            change = closes[-1] - closes[-2]
+            change_percent = (change / closes[-2]) * 100
+        
+        if layout == "frame":
+            data = hist
+        elif layout == "columns":
+            data = price_format.frame_to_columns(hist)
+        else:
+            data = price_format.frame_to_records(symbol, hist)
+        
+        return {
+            "symbol": symbol,
+            "company_name": company_name,
+            "current_price": closes[-1],
+            "change": change,
+            "change_percent": change_percent,
+            "volume": latest["volume"][-1],
+            "market_cap": market_cap,
+            "data": data
+        }
+    
+    async def _load_history(self, symbol: str, period: str, interval: str) -> Tuple[pd.DataFrame, bool]:
+        """
+        価格データを読み込む（保存済みの期間はデータベースから、不足分のみ外部APIから取得）
+        
+        Returns:
+            価格データと、外部APIを呼び出したかどうか
+        """
+        if not price_store.is_storable(symbol, period, interval):
+            with span("provider.history"):
+                return await provider_executor.run(self.provider.history, symbol, period=period, interval=interval), True
+        
+        now = market_calendar.market_now()
+        start = price_store.requested_start(period, now)
+        with span("db.load"):
+            stored = await db_executor.run(self.price_store.load, symbol, start)
+        
+        fetch_start = (await self._find_fetch_starts({symbol: stored}, start, now))[symbol]
+        if fetch_start is None:
+            return price_store.localize_frame(stored), False
+        
+        # 取引時間中は事前取得・直前のリクエストで取得した直近の足を再利用する
+        session_open = market_calendar.is_session_open(now)
+        fetched = session_bars.get(symbol, fetch_start) if session_open else None
+        from_provider = fetched is None
+        if from_provider:
+            with span("provider.history"):
+                fetched = await provider_executor.run(self.provider.history, symbol, start=fetch_start, interval=interval)
+            if not fetched.empty:
+                fetched = price_store.normalize_frame(fetched)
+            if session_open:
+                session_bars.set(symbol, fetch_start, fetched)
+        if fetched.empty:
+            return price_store.localize_frame(stored), from_provider
+        
+        if from_provider:
+            first_date = price_store.history_start(fetched, start) if fetch_start == start else None
+            try:
+                # 確定済みの足のみ書き戻す
+                with span("db.save"):
+                    await db_executor.run(self.price_store.save, symbol, price_store.closed_bars(fetched, now))
+                    if first_date:
+                        await db_executor.run(self._save_history_starts, {symbol: first_date})
+            except Exception as e:
+                self.db.rollback()
+                logger.warning(f"株価データ書き戻しエラー ({symbol}): {e}")
+        
+        with span("merge"):
+            merged = price_store.merge_frames(stored, fetched)
+            return price_store.localize_frame(price_store.trim_frame(merged, start)), from_provider
+    
+    async def _load_histories(self, symbols: List[str], period: str, interval: str) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の価格データを読み込む（不足分は1回の一括ダウンロードで取得）"""
+        empty = pd.DataFrame(columns=price_store.PRICE_COLUMNS, dtype="float64")
+        
+        storable = [symbol for symbol in symbols if price_store.is_storable(symbol, period, interval)]
+        others = [symbol for symbol in symbols if symbol not in storable]
+        histories = {}
+        if others:
+            # 保存しない銘柄・期間・足種は外部APIから取得
+            fetched = await self._download_histories(others, period=period, interval=interval)
+            histories.update({symbol: fetched.get(symbol, empty) for symbol in others})
+        if storable:
+            histories.update(await self._load_stored_histories(storable, period, interval))
+        return {symbol: histories[symbol] for symbol in symbols}
+    
+    async def _load_stored_histories(self, symbols: List[str], period: str, interval: str) -> Dict[str, pd.DataFrame]:
+        """保存できる銘柄の価格データを読み込む（保存済みの期間はデータベースから、不足分は1回の一括ダウンロードで取得）"""
+        now = market_calendar.market_now()
+        start = price_store.requested_start(period, now)
+        with span("db.load"):
+            histories = await db_executor.run(self.price_store.load_many, symbols, start)
+        
+        fetch_starts = await self._find_fetch_starts(histories, start, now)
+        pending = [symbol for symbol in symbols if fetch_starts[symbol] is not None]
+        if not pending:
+            return {symbol: price_store.localize_frame(frame) for symbol, frame in histories.items()}
+        
+        # 不足している銘柄をまとめて、最も古い不足日から取得
+        fetch_start = min(fetch_starts[symbol] for symbol in pending)
+        fetched = await self._download_histories(pending, start=fetch_start, interval=interval)
+        
+        closed = {}
+        first_dates = {}
+        with span("merge"):
+            for symbol, frame in fetched.items():
+                if frame.empty:
+                    continue
+                frame = price_store.normalize_frame(frame)
+                closed[symbol] = price_store.closed_bars(frame, now)
+                first_date = price_store.history_start(frame, start) if fetch_starts[symbol] == start else None
+                if first_date:
+                    first_dates[symbol] = first_date
+                merged = price_store.merge_frames(histories[symbol], frame)
+                histories[symbol] = price_store.trim_frame(merged, start)
+        
+        try:
+            # 確定済みの足のみ書き戻す
+            with span("db.save"):
+                await db_executor.run(self.price_store.save_many, closed)
+                if first_dates:
+                    await db_executor.run(self._save_history_starts, first_dates)
         except Exception as e:
             self.db.rollback()
+            logger.warning(f"株価データ書き戻しエラー: {e}")
+        
+        return {symbol: price_store.localize_frame(frame) for symbol, frame in histories.items()}
+    
+    async def _find_fetch_starts(
+        self,
+        histories: Dict[str, pd.DataFrame],
+        start: date,
+        now: datetime
+    ) -> Dict[str, Optional[date]]:
+        """
+        銘柄ごとに外部APIから取得すべき開始日を判定
+        
+        期間の先頭が保存されていない銘柄のみ、記録済みの取得できる最初の日付を1回のクエリで読み、
+        上場から期間に満たない銘柄は最初の日付から保存済みであれば取得しない
+        """
+        fetch_starts = {symbol: price_store.find_fetch_start(frame, start, now) for symbol, frame in histories.items()}
+        headless = [symbol for symbol, frame in histories.items() if not frame.empty and fetch_starts[symbol] == start]
+        if headless:
+            with span("db.query"):
+                first_dates = await db_executor.run(self._get_history_starts, headless)
+            for symbol, first_date in first_dates.items():
+                fetch_starts[symbol] = price_store.find_fetch_start(histories[symbol], start, now, first_date)
+        return fetch_starts
+    
+    def _get_history_starts(self, symbols: List[str]) -> Dict[str, date]:
+        """銘柄ごとの外部APIで取得できる最初の日付をデータベースから取得（記録のない銘柄は含まない）"""
+        rows = self.db.query(PriceHistoryStart.symbol, PriceHistoryStart.first_date).filter(
+            PriceHistoryStart.symbol.in_(symbols)
+        )
+        return {row.symbol: row.first_date.date() for row in rows}
+    
+    def _save_history_starts(self, first_dates: Dict[str, date]) -> None:
+        """銘柄ごとの外部APIで取得できる最初の日付を記録"""
+        records = {
+            record.symbol: record
+            for record in self.db.query(PriceHistoryStart).filter(PriceHistoryStart.symbol.in_(list(first_dates)))
+        }
+        for symbol, first_date in first_dates.items():
+            record = records.get(symbol)
+            if record is None:
+                record = PriceHistoryStart(symbol=symbol)
+                self.db.add(record)
+            record.first_date = datetime.combine(first_date, datetime.min.time())
+        self.db.commit()
+    
+    async def sync_prices(self, symbols: List[str]) -> Dict[str, int]:
+        """
+        株価データを差分同期する
+        
+        保存済みの最終日以降（取得元での事後修正を反映するため、直近の保存済み営業日を含む）から
+        大引けを迎えた直近の営業日までのみを外部APIから取得して保存する。
+        取得開始日が同じ銘柄は1回の一括ダウンロードにまとめる
+        
+        Args:
+            symbols: 証券コードのリスト
+            
+        Returns:
+            証券コードごとの保存した行数
+        """
+        try:
+            symbols = list(dict.fromkeys(symbols))
+            # 東証以外の銘柄は足の確定を判定できないため保存しない
+            symbols_to_sync = [symbol for symbol in symbols if market_calendar.is_market_symbol(symbol)]
+            now = market_calendar.market_now()
+            end = market_calendar.latest_closed_session(now)
+            with span("db.query"):
+                last_dates = await self.async_price_store.last_dates(symbols_to_sync)
+            
+            groups: Dict[date, List[str]] = {}
+            for symbol in symbols_to_sync:
+                start = price_store.sync_start(
+                    last_dates.get(symbol), now, settings.sync.overlap_sessions, settings.sync.initial_period
+                )
+                if start <= end:
+                    groups.setdefault(start, []).append(symbol)
+            
+            frames = {}
+            for start, group in groups.items():
+                fetched = await self._download_histories(group, start=start, end=end, interval="1d")
+                for symbol, frame in fetched.items():
+                    frames[symbol] = price_store.closed_bars(price_store.normalize_frame(frame), now)
+            
+            with span("db.save"):
+                await self.async_price_store.save_many(frames)
+            return {symbol: len(frames[symbol]) if symbol in frames else 0 for symbol in symbols}
+            
+        except Exception as e:
+            if self.async_db is not None:
+                await self.async_db.rollback()
+            logger.error(f"株価データ同期エラー: {e}")
+            raise Exception(f"株価データの同期に失敗しました: {str(e)}")
+    
+    async def _download_histories(self, symbols: List[str], **kwargs: Any) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の価格データを1回の一括ダウンロードで取得"""
+        with span("provider.bulk_history"):
+            return await provider_executor.run(self.provider.bulk_history, symbols, **kwargs)
+    
+    async def _get_company_profile(self, symbol: str, from_provider: bool) -> Tuple[str, Optional[float]]:
+        """企業名と時価総額を取得（データベースのみで応答できる場合は外部APIを呼ばない）"""
+        fields = ["longName", *MARKET_FIELDS]
+        
+        info = info_cache.peek(symbol, fields)
+        if info is None and not from_provider:
+            profile = await self._peek_company_profile(symbol)
+            if profile is not None:
+                return profile
+        
+        if info is None:
+            info = await self._get_info(symbol, fields)
+        return info.get('longName') or '', info.get('marketCap')
+    
+    async def _peek_company_profile(self, symbol: str) -> Optional[Tuple[str, Optional[float]]]:
+        """企業名と時価総額をキャッシュとデータベースのみから取得（外部APIが必要な場合はNone）"""
+        info = info_cache.peek(symbol, ["longName", *MARKET_FIELDS])
+        if info is not None:
+            return info.get('longName') or '', info.get('marketCap')
+        
+        with span("db.query"):
+            stock = await db_executor.run(
+                self.db.query(StockInfo.company_name).filter(StockInfo.symbol == symbol).first
+            )
+        if stock is None:
+            return None
+        # 時価総額はキャッシュに有効な値がある場合のみ返す
+        cached = info_cache.peek(symbol, MARKET_FIELDS)
+        return stock.company_name, cached.get('marketCap') if cached else None
+    
+    async def _get_info(self, symbol: str, fields: List[str]) -> Dict[str, Any]:
+        """企業メタデータ（ticker.info形式）をキャッシュ経由で取得"""
+        async def fetch() -> Dict[str, Any]:
+            with span("provider.info"):
+                return await provider_executor.run(self.provider.info, symbol)
+        
+        return await info_cache.get_or_fetch(symbol, fields, fetch)
+
+    async def prefetch_info(self, symbol: str) -> Optional[StockInfoResponse]:
+        """企業プロフィールと時価総額をキャッシュに読み込み、株式情報を返す（見つからない場合はNone）"""
+        info = await self._get_info(symbol, [*PROFILE_FIELDS, *MARKET_FIELDS])
+        return info_to_stock(symbol, info) if info and info.get('symbol') else None
+
+    def _get_company_names(self, symbols: List[str]) -> Dict[str, str]:
+        """証券コードごとの企業名をデータベースから取得"""
+        rows = self.db.query(StockInfo.symbol, StockInfo.company_name).filter(
+            StockInfo.symbol.in_(symbols)
+        ).all()
+        return {row.symbol: row.company_name for row in rows}
+    
+    async def get_stocks_by_symbols(self, symbols: List[str]) -> List[StockInfoResponse]:
+        """証券コードのリストに一致する株式情報をデータベースから一括取得"""
+        with span("db.query"):
+            stocks = (await self.async_db.scalars(
+                select(StockInfo).where(
+                    StockInfo.symbol.in_(symbols),
+                    StockInfo.is_active == True
+                )
+            )).all()
+        return [StockInfoResponse.model_validate(stock) for stock in stocks]
+    
+    async def fetch_stock_infos(
+        self,
+        symbols: List[str],
+        concurrency: int,
+        timeout: float
+    ) -> Tuple[List[StockInfoResponse], List[str]]:
+        """
+        複数銘柄の株式情報を外部APIから並行取得し、データベースに保存
+        
+        同時取得数を制限し、1銘柄ごとのタイムアウトを超えた銘柄は結果に含めない。
+        タイムアウトした取得も継続し、完了するとキャッシュに保存されるため次回のリクエストで使われる
+        
+        Args:
+            symbols: 証券コードのリスト
+            concurrency: 同時に取得する銘柄数
+            timeout: 1銘柄の取得のタイムアウト（秒）
+            
+        Returns:
+            取得できた株式情報（証券コードの順）と、取得できなかった証券コード
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch(symbol: str) -> Optional[StockInfoResponse]:
+            async with semaphore:
+                info = await asyncio.wait_for(self._get_info(symbol, PROFILE_FIELDS), timeout)
+            return info_to_stock(symbol, info) if info and info.get('symbol') else None
+        
+        results = await asyncio.gather(*(fetch(symbol) for symbol in symbols), return_exceptions=True)
+        
+        stocks = []
+        missing = []
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning(f"株式情報の取得がタイムアウトしました ({symbol}): {timeout}秒")
+                missing.append(symbol)
+            elif isinstance(result, Exception):
+                logger.warning(f"株式情報取得エラー ({symbol}): {result}")
+                missing.append(symbol)
+            elif result is None:
+                missing.append(symbol)
+            else:
+                stocks.append(result)
+        
+        # 次回以降はデータベースから応答できるよう保存（セッションを共有するため1件ずつ）
+        for stock in stocks:
+            try:
+                await self.save_stock_info(stock)
+            except Exception as e:
+                logger.warning(f"株式情報の保存に失敗しました ({stock.symbol}): {e}")
+        
+        return stocks, missing
+    
+    async def save_stock_info(self, stock_info: StockInfoResponse) -> None:
+        """株式情報をデータベースに保存"""
+        try:
+            with span("db.save"):
+                await self._upsert_stock_info(stock_info)
+            
+            # 検索インデックスに反映
+            if search_index.ready:
+                search_index.upsert(stock_info)
+            
+        except Exception as e:
+            if self.async_db is not None:
+                await self.async_db.rollback()
             logger.error(f"株式情報保存エラー: {e}")
             raise Exception(f"株式情報の保存に失敗しました: {str(e)}")
     
+    async def _upsert_stock_info(self, stock_info: StockInfoResponse) -> None:
+        """
+        株式情報を追加または更新してコミット
+
+        INSERT ... ON CONFLICT (symbol) DO UPDATEの1ステートメントで保存し、
+        同じ銘柄を同時に保存しても一意制約違反にならないようにする
+        """
+        values = {
+            "company_name": stock_info.company_name,
+            "company_name_en": stock_info.company_name_en,
+            "market": stock_info.market,
+            "sector": stock_info.sector,
+            "industry": stock_info.industry,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        insert = price_store.UPSERT_INSERTS.get(self.async_db.get_bind().dialect.name)
+        if insert is None:
+            # ON CONFLICTに対応していないデータベースでは既存レコードと突き合わせて保存
+            existing = await self.async_db.scalar(
+                select(StockInfo).where(StockInfo.symbol == stock_info.symbol).limit(1)
+            )
+            if existing:
+                for column, value in values.items():
+                    setattr(existing, column, value)
+            else:
+                self.async_db.add(StockInfo(symbol=stock_info.symbol, **values))
+        else:
+            statement = insert(StockInfo).values(symbol=stock_info.symbol, **values)
+            await self.async_db.execute(statement.on_conflict_do_update(
+                index_elements=[StockInfo.symbol],
+                set_={column: statement.excluded[column] for column in values},
+            ))
+        
+        await self.async_db.commit()
+    
     async def save_stock_price(self, symbol: str, price_data: List[StockPriceResponse]) -> None:
         """株価データをデータベースに保存"""
         try:
             if not price_data:
                 return
             
-            # 日付のリストを作成して一括クエリで既存レコードを取得
-            dates = [price.date for price in price_data]
-            existing_records = self.db.query(StockPrice).filter(
-                StockPrice.symbol == symbol,
-                StockPrice.date.in_(dates)
-            ).all()
-            
-            # 既存レコードを辞書に変換（日付をキーとして）
-            existing_dict = {(record.symbol, record.date): record for record in existing_records}
-            
-            for price in price_data:
-                key = (price.symbol, price.date)
-                
-                if key in existing_dict:
-                    # 更新
-                    existing = existing_dict[key]
-                    existing.open_price = price.open_price
-                    existing.high_price = price.high_price
-                    existing.low_price = price.low_price
-                    existing.close_price = price.close_price
-                    existing.volume = price.volume
-                    existing.adjusted_close = price.adjusted_close
-                else:
-                    # 新規作成
-                    new_price = StockPrice(
-                        symbol=price.symbol,
-                        date=price.date,
-                        open_price=price.open_price,
-                        high_price=price.high_price,
-                        low_price=price.low_price,
-                        close_price=price.close_price,
-                        volume=price.volume,
-                        adjusted_close=price.adjusted_close
-                    )
-                    self.db.add(new_price)
-            
-            self.db.commit()
+            with span("db.save"):
+                await self.async_price_store.save(symbol, price_store.frame_from_prices(price_data))
             
         except Exception as e:
-            self.db.rollback()
+            if self.async_db is not None:
+                await self.async_db.rollback()
             logger.error(f"株価データ保存エラー: {e}")
             raise Exception(f"株価データの保存に失敗しました: {str(e)}")
-
-
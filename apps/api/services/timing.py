@@ -0,0 +1,253 @@
+"""
+リクエスト処理時間の計測
+ルート・処理段階（外部API、データベース、シリアライズなど）ごとの所要時間を記録し、
+Server-Timingヘッダーとして返すとともに、Prometheus形式のヒストグラムに集計する
+
+計測が無効（ミドルウェア未登録）の場合、span() は共有の何もしないコンテキストを返すだけになる
+"""
+import bisect
+import functools
+import inspect
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+
+# ヒストグラムのバケット境界（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ルートに一致しなかったリクエストのラベル（任意のパスでラベルが増え続けないようにする）
+UNMATCHED_ROUTE = "unmatched"
+
+# エンドポイントの処理後、レスポンス開始までの段階（レスポンスモデルの検証・JSON変換）
+SERIALIZE_STAGE = "serialize"
+
+_NULL_SPAN = nullcontext()
+
+
+class RequestTimings:
+    """1リクエスト内の処理段階ごとの所要時間"""
+
+    __slots__ = ("started", "stages", "handler_finished")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # 処理段階ごとの [合計秒数, 回数]（記録順を保持）
+        self.stages: Dict[str, List[float]] = {}
+        self.handler_finished: Optional[float] = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        """処理段階の所要時間を加算"""
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timingヘッダーの値（ミリ秒）"""
+        metrics = [f"{stage};dur={seconds * 1000:.2f}" for stage, (seconds, _) in self.stages.items()]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+class _Span:
+    """処理段階の所要時間を計測するコンテキスト"""
+
+    __slots__ = ("timings", "stage", "started")
+
+    def __init__(self, timings: RequestTimings, stage: str):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.timings.add(self.stage, time.perf_counter() - self.started)
+
+
+def span(stage: str):
+    """
+    処理段階の所要時間を計測する
+
+    計測中のリクエストがない場合は何もしない
+
+    Args:
+        stage: 処理段階の名前（例: provider.history, db.load）
+    """
+    timings = _current.get()
+    if timings is None:
+        return _NULL_SPAN
+    return _Span(timings, stage)
+
+
+class Histogram:
+    """ラベルごとの累積ヒストグラム（Prometheus形式）"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # ラベル値 -> [バケットごとの件数..., +Infの件数], 合計秒数
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Tuple[str, ...], seconds: float) -> None:
+        """所要時間を記録（イベントループ上で呼び出す）"""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        total[0] += seconds
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        """記録された件数"""
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def sum(self, labels: Tuple[str, ...]) -> float:
+        """記録された秒数の合計"""
+        series = self._series.get(labels)
+        return series[1][0] if series else 0.0
+
+    def clear(self) -> None:
+        """すべての記録を削除"""
+        self._series.clear()
+
+    def render(self) -> List[str]:
+        """Prometheusのテキスト形式で出力"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            label_pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+            label_text = ",".join(label_pairs)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = ",".join([*label_pairs, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = ",".join([*label_pairs, 'le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {total[0]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    """ラベル値のエスケープ"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class TimingMetrics:
+    """ルート・処理段階ごとの所要時間の集計"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.requests = Histogram(
+            "mokabulens_http_request_duration_seconds",
+            "HTTPリクエストの処理時間",
+            ("method", "route", "status"),
+            buckets,
+        )
+        self.stages = Histogram(
+            "mokabulens_stage_duration_seconds",
+            "リクエスト内の処理段階ごとの所要時間",
+            ("route", "stage"),
+            buckets,
+        )
+
+    def record(self, method: str, route: str, status: int, total: float, timings: RequestTimings) -> None:
+        """1リクエストの計測結果を記録"""
+        self.requests.observe((method, route, str(status)), total)
+        for stage, (seconds, _) in timings.stages.items():
+            self.stages.observe((route, stage), seconds)
+
+    def clear(self) -> None:
+        """すべての記録を削除"""
+        self.requests.clear()
+        self.stages.clear()
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        return "\n".join([*self.requests.render(), *self.stages.render()]) + "\n"
+
+
+# アプリケーション全体で共有する集計
+timing_metrics = TimingMetrics()
+
+
+class TimingMiddleware:
+    """
+    リクエストの処理時間を計測するASGIミドルウェア
+
+    レスポンス開始時にServer-Timingヘッダーを付け、完了時にヒストグラムへ記録する
+    """
+
+    def __init__(self, app: Any, metrics: TimingMetrics = timing_metrics, server_timing: bool = True):
+        self.app = app
+        self.metrics = metrics
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                if timings.handler_finished is not None:
+                    timings.add(SERIALIZE_STAGE, now - timings.handler_finished)
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing(now - timings.started).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", UNMATCHED_ROUTE)
+            total = time.perf_counter() - timings.started
+            self.metrics.record(scope["method"], route_path, status, total, timings)
+
+
+def _mark_handler_finished(endpoint: Callable) -> Callable:
+    """エンドポイントの終了時刻を記録するラッパー（以降をシリアライズの段階とする）"""
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timings = _current.get()
+            if timings is not None:
+                timings.handler_finished = time.perf_counter()
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """エンドポイントの処理とレスポンスのシリアライズを分けて計測するルート"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _mark_handler_finished(endpoint)
+        super().__init__(path, endpoint, **kwargs)
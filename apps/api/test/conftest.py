@@ -3,16 +3,24 @@ pytest設定ファイル
 テストの共通設定とフィクスチャを定義
 """
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from config import settings
 from main import app
-from database import Base, get_db
-from test_config import TestingSessionLocal, engine
+from database import Base, get_async_db, get_db
+from test_config import TestingAsyncSessionLocal, TestingSessionLocal, engine
+from services.compression import compressed_cache
+from services.info_cache import info_cache
+from services.price_coalescer import price_coalescer
+from services.search_index import search_index
+from services.session_bars import session_bars
 
-# テスト用データベースの作成
+# テスト用データベースの作成（モデルの制約・インデックスを反映するため作り直す）
+Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
 
 def override_get_db():
@@ -23,8 +31,17 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    """テスト用非同期データベースセッションをオーバーライド"""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+# テストでは事前取得のスケジューラーを開始しない（外部APIを呼ばない）
+settings.prewarm.enabled = False
+
 # 依存関係をオーバーライド
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 @pytest.fixture
 def client():
@@ -41,6 +58,12 @@ def db_session():
     finally:
         session.close()
 
+@pytest_asyncio.fixture
+async def async_db_session():
+    """テスト用非同期データベースセッション"""
+    async with TestingAsyncSessionLocal() as session:
+        yield session
+
 @pytest.fixture(autouse=True)
 def clean_db(db_session):
     """各テスト後にデータベースをクリーンアップ"""
@@ -49,3 +72,13 @@ def clean_db(db_session):
     for table in reversed(Base.metadata.sorted_tables):
         db_session.execute(table.delete())
     db_session.commit()
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """各テスト前にプロセス内キャッシュをクリア"""
+    info_cache.clear()
+    price_coalescer.clear()
+    compressed_cache.clear()
+    search_index.clear()
+    session_bars.clear()
+    yield
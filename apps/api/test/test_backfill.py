@@ -0,0 +1,211 @@
+"""
+株価一括取り込みのテスト
+"""
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from models.stock import PriceBackfillCheckpoint, StockInfo, StockPrice
+from services import market_calendar
+from services.backfill import DONE, EMPTY, FAILED, PriceBackfill, load_symbols_from_database, load_symbols_from_file
+from services.market_data import CsvFixtureProvider, MarketDataProvider, YFinanceProvider
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+def make_frame(start: str, end: str) -> pd.DataFrame:
+    """営業日ごとの株価DataFrameを作成"""
+    index = pd.bdate_range(start, end, tz=market_calendar.MARKET_TZ)
+    return pd.DataFrame(
+        {"Open": 100.0, "High": 110.0, "Low": 90.0, "Close": 100.0, "Volume": 1000.0},
+        index=index,
+    )
+
+
+class FakeProvider(MarketDataProvider):
+    """呼び出しを記録し、指定した銘柄を含む取得を失敗させる"""
+
+    def __init__(self, frames: dict, failing: set = frozenset()):
+        self.frames = frames
+        self.failing = failing
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def info(self, symbol):
+        return {}
+
+    def history(self, symbol, period=None, start=None, interval="1d", end=None):
+        return self.bulk_history([symbol], period, start, interval, end).get(symbol, pd.DataFrame())
+
+    def bulk_history(self, symbols, period=None, start=None, interval="1d", end=None):
+        with self.lock:
+            self.calls.append(list(symbols))
+        if self.failing & set(symbols):
+            raise RuntimeError("provider unavailable")
+        return {symbol: self.frames[symbol] for symbol in symbols if symbol in self.frames}
+
+    def search(self, query, limit):
+        return []
+
+
+class SerialProvider(FakeProvider):
+    """yfinanceと同じく一括ダウンロードを1つずつしか実行できない、遅い提供元"""
+
+    parallel_bulk_history = False
+
+    def __init__(self, frames: dict, delay: float):
+        super().__init__(frames)
+        self.delay = delay
+        self.download_lock = threading.Lock()
+
+    def bulk_history(self, symbols, period=None, start=None, interval="1d", end=None):
+        with self.download_lock:
+            time.sleep(self.delay)
+            return super().bulk_history(symbols, period, start, interval, end)
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+
+
+@pytest.fixture
+def frames():
+    return {symbol: make_frame("2025-09-01", "2025-10-17") for symbol in ["1301", "1332", "1605", "6758", "7203"]}
+
+
+def checkpoint_statuses(db_session: Session) -> dict:
+    return {row.symbol: row.status for row in db_session.query(PriceBackfillCheckpoint)}
+
+
+class TestPriceBackfill:
+    """PriceBackfillのテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_downloads_in_chunks(self, db_session: Session, frames):
+        """銘柄を一括ダウンロード単位に分けて取得し、まとめて保存する"""
+        provider = FakeProvider(frames)
+        backfill = PriceBackfill(db_session, provider, chunk_size=2, concurrency=2)
+
+        report = await backfill.run(list(frames))
+
+        assert sorted(map(sorted, provider.calls)) == [["1301", "1332"], ["1605", "6758"], ["7203"]]
+        bars = len(pd.bdate_range("2025-09-01", "2025-10-17"))
+        assert report.completed == 5
+        assert report.rows == 5 * bars
+        assert report.rows_per_second > 0
+        assert db_session.query(StockPrice).count() == 5 * bars
+        checkpoint = db_session.query(PriceBackfillCheckpoint).filter(PriceBackfillCheckpoint.symbol == "6758").one()
+        assert checkpoint.status == DONE
+        assert checkpoint.rows == bars
+        assert checkpoint.last_date == datetime(2025, 10, 17)
+
+    @pytest.mark.asyncio
+    async def test_resumes_failed_chunks(self, db_session: Session, frames):
+        """失敗した銘柄だけを次回の実行で取得する"""
+        failing = FakeProvider(frames, failing={"6758"})
+        report = await PriceBackfill(db_session, failing, chunk_size=2).run(list(frames))
+
+        assert report.failed == 2
+        assert report.completed == 3
+        statuses = checkpoint_statuses(db_session)
+        assert statuses["1605"] == statuses["6758"] == FAILED
+
+        provider = FakeProvider(frames)
+        report = await PriceBackfill(db_session, provider, chunk_size=2).run(list(frames))
+
+        assert provider.calls == [["1605", "6758"]]
+        assert report.skipped == 3
+        assert report.completed == 2
+        assert set(checkpoint_statuses(db_session).values()) == {DONE}
+
+    @pytest.mark.asyncio
+    async def test_serial_provider_does_not_time_out_queued_chunks(self, db_session: Session, frames):
+        """同時に呼べない提供元は1回ずつ実行し、順番待ちの分割単位をタイムアウトさせない"""
+        provider = SerialProvider(frames, delay=0.1)
+        backfill = PriceBackfill(db_session, provider, chunk_size=1, concurrency=4, timeout=0.3)
+        assert backfill.concurrency == 1
+        assert not YFinanceProvider.parallel_bulk_history
+
+        report = await backfill.run(list(frames))
+
+        assert report.failed == 0
+        assert report.completed == 5
+        assert set(checkpoint_statuses(db_session).values()) == {DONE}
+
+    @pytest.mark.asyncio
+    async def test_symbols_without_data(self, db_session: Session, frames):
+        """取得結果に含まれない銘柄は完了にせず、次回の実行で再取得する"""
+        provider = FakeProvider(frames)
+        report = await PriceBackfill(db_session, provider).run(["6758", "0000"])
+
+        assert report.completed == 1
+        assert report.empty == 1
+        assert checkpoint_statuses(db_session) == {"6758": DONE, "0000": EMPTY}
+
+        report = await PriceBackfill(db_session, provider).run(["6758", "0000"])
+        assert report.skipped == 1
+        assert provider.calls[-1] == ["0000"]
+
+    @pytest.mark.asyncio
+    async def test_skips_non_market_symbols(self, db_session: Session, frames):
+        """東証以外の銘柄は取り込まない"""
+        provider = FakeProvider({**frames, "AAPL": frames["6758"]})
+        report = await PriceBackfill(db_session, provider).run(["6758", "AAPL"])
+
+        assert provider.calls == [["6758"]]
+        assert report.total == 1
+        assert set(checkpoint_statuses(db_session)) == {"6758"}
+
+    @pytest.mark.asyncio
+    async def test_restart(self, db_session: Session, frames):
+        """チェックポイントを削除すると最初から取り込む"""
+        provider = FakeProvider(frames)
+        await PriceBackfill(db_session, provider).run(["6758"])
+
+        backfill = PriceBackfill(db_session, provider)
+        assert backfill.reset() == 1
+        await backfill.run(["6758"])
+
+        assert len(provider.calls) == 2
+        assert db_session.query(StockPrice).count() == len(pd.bdate_range("2025-09-01", "2025-10-17"))
+
+
+class TestSymbolSources:
+    """銘柄リストの読み込みテストクラス"""
+
+    def test_load_symbols_from_file(self, tmp_path):
+        """空行・コメント・重複を除いて読み込む"""
+        path = tmp_path / "symbols.txt"
+        path.write_text("# 東証プライム\n6758\n7203  # トヨタ\n\n6758\n", encoding="utf-8")
+        assert load_symbols_from_file(str(path)) == ["6758", "7203"]
+
+    def test_load_symbols_from_database(self, db_session: Session):
+        """アクティブな銘柄のみ取得する"""
+        db_session.add_all([
+            StockInfo(symbol="7203", company_name="トヨタ自動車株式会社"),
+            StockInfo(symbol="6758", company_name="ソニーグループ株式会社"),
+            StockInfo(symbol="9999", company_name="上場廃止", is_active=False),
+        ])
+        db_session.commit()
+        assert load_symbols_from_database(db_session) == ["6758", "7203"]
+
+
+class TestCsvFixtureProvider:
+    """CsvFixtureProviderのテストクラス"""
+
+    def test_reads_csv_from_start(self, tmp_path):
+        """<証券コード>.csvを読み込み、開始日以降を返す"""
+        make_frame("2025-10-01", "2025-10-10").tz_localize(None).rename_axis("Date").to_csv(tmp_path / "6758.csv")
+        provider = CsvFixtureProvider(str(tmp_path))
+
+        frames = provider.bulk_history(["6758", "0000"], start=date(2025, 10, 6))
+
+        assert list(frames) == ["6758"]
+        assert frames["6758"].index[0] == pd.Timestamp("2025-10-06", tz=market_calendar.MARKET_TZ)
+        assert len(frames["6758"]) == 5
@@ -0,0 +1,65 @@
+"""
+ベンチマークのベースライン比較・データベース準備のテスト
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from benchmarks.bench_api import DatabaseNotEmptyError, compare_results, prepare_schema
+from benchmarks.stats import percentile
+
+
+def make_results(**scenarios):
+    return {"meta": {}, "scenarios": scenarios}
+
+
+class TestCompareResults:
+    """compare_resultsのテストクラス"""
+
+    def test_no_regression_within_threshold(self):
+        """しきい値以内の変化は劣化とみなさない"""
+        baseline = make_results(price={"p95_ms": 100.0, "throughput_rps": 50.0, "errors": 0})
+        current = make_results(price={"p95_ms": 115.0, "throughput_rps": 45.0, "errors": 0})
+        assert compare_results(baseline, current, 0.2) == []
+
+    def test_latency_and_throughput_regressions(self):
+        """レイテンシの増加とスループットの低下を検出する"""
+        baseline = make_results(price={"p95_ms": 100.0, "throughput_rps": 50.0, "errors": 0})
+        current = make_results(price={"p95_ms": 150.0, "throughput_rps": 30.0, "errors": 2})
+        regressions = compare_results(baseline, current, 0.2)
+        assert [regression.split(":")[0] for regression in regressions] == [
+            "price.p95_ms", "price.throughput_rps", "price.errors"
+        ]
+
+    def test_improvements_and_new_scenarios_ignored(self):
+        """改善やベースラインにないシナリオは劣化とみなさない"""
+        baseline = make_results(info={"p95_ms": 10.0, "throughput_rps": 100.0})
+        current = make_results(
+            info={"p95_ms": 5.0, "throughput_rps": 300.0},
+            save={"p95_ms": 1000.0, "throughput_rps": 1.0},
+        )
+        assert compare_results(baseline, current, 0.2) == []
+
+
+def test_percentile_interpolation():
+    """パーセンタイルは線形補間で計算する"""
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([], 95) == 0.0
+
+
+class TestPrepareSchema:
+    """ベンチマーク用のテーブル作成のテストクラス"""
+
+    def test_refuses_non_empty_database(self, tmp_path):
+        """テーブルがあるデータベースは--resetなしでは使わず、既存のテーブルを残す"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'existing.db'}")
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE important (id INTEGER)"))
+
+        with pytest.raises(DatabaseNotEmptyError):
+            prepare_schema(engine, reset=False)
+        assert inspect(engine).get_table_names() == ["important"]
+
+    def test_creates_tables_in_empty_database(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+        prepare_schema(engine, reset=False)
+        assert "stock_info" in inspect(engine).get_table_names()
@@ -0,0 +1,179 @@
+"""
+キャッシュ基盤のテスト
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.cache import MemoryCache
+from services.info_cache import InfoCache
+from services.singleflight import SingleFlight
+
+
+class FakeClock:
+    """テスト用の時計"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestMemoryCache:
+    """MemoryCacheのテストクラス"""
+
+    def test_lru_eviction_by_entries(self):
+        """件数の上限を超えると最も使われていないものから削除する"""
+        cache = MemoryCache(max_entries=2, max_bytes=10_000)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        assert cache.get("a") == 1
+        cache.set("c", 3, ttl=60)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_eviction_by_bytes(self):
+        """メモリ使用量の上限を超えると削除する"""
+        cache = MemoryCache(max_entries=100, max_bytes=250, sizer=lambda value: 100)
+        cache.set("a", "x", ttl=60)
+        cache.set("b", "y", ttl=60)
+        cache.set("c", "z", ttl=60)
+
+        assert len(cache) == 2
+        assert cache.stats()["bytes"] == 200
+        assert cache.get("a") is None
+
+    def test_expiration(self):
+        """有効期限を過ぎた値は返さない"""
+        clock = FakeClock()
+        cache = MemoryCache(max_entries=10, max_bytes=10_000, clock=clock)
+        cache.set("a", 1, ttl=60)
+        clock.now += 61
+
+        assert cache.get("a") is None
+        stats = cache.stats()
+        assert stats["expirations"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 0
+
+
+class TestInfoCache:
+    """InfoCacheのテストクラス"""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def cache(self, clock):
+        return InfoCache(
+            MemoryCache(max_entries=10, max_bytes=100_000, clock=clock),
+            {"symbol": 3600, "longName": 3600, "marketCap": 60},
+            clock=clock,
+        )
+
+    @pytest.mark.asyncio
+    async def test_per_field_ttl(self, cache, clock):
+        """項目ごとの有効期間で判定する"""
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return {"symbol": "6758.T", "longName": "ソニー", "marketCap": 1.0, "other": "x"}
+
+        info = await cache.get_or_fetch("6758.T", ["longName", "marketCap"], fetch)
+        assert info == {"symbol": "6758.T", "longName": "ソニー", "marketCap": 1.0}
+
+        clock.now += 120
+        # 企業名は有効期間内
+        await cache.get_or_fetch("6758.T", ["longName"], fetch)
+        assert len(calls) == 1
+        # 時価総額は期限切れ
+        await cache.get_or_fetch("6758.T", ["longName", "marketCap"], fetch)
+        assert len(calls) == 2
+        assert cache.stats()["stale"] == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_fetch_once(self, cache):
+        """同時のキャッシュミスは1回の取得にまとめる"""
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"symbol": "7203.T", "longName": "トヨタ"}
+
+        results = await asyncio.gather(
+            *(cache.get_or_fetch("7203.T", ["longName"], fetch) for _ in range(5))
+        )
+
+        assert len(calls) == 1
+        assert all(result["longName"] == "トヨタ" for result in results)
+        assert cache.stats()["coalesced"] == 4
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_not_cached(self, cache):
+        """銘柄が見つからなかった結果はキャッシュしない"""
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return {}
+
+        await cache.get_or_fetch("0000.T", ["longName"], fetch)
+        await cache.get_or_fetch("0000.T", ["longName"], fetch)
+        assert len(calls) == 2
+
+
+class TestSingleFlight:
+    """SingleFlightのテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_exception_shared(self):
+        """実行中の例外は待っているすべての呼び出し元に伝わる"""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.executions == 1
+        assert flight.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_leader_cancellation_does_not_cancel_followers(self):
+        """最初の呼び出し元がキャンセルされても他の呼び出し元は結果を受け取る"""
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == 42
+
+
+class TestCacheMetrics:
+    """キャッシュメトリクスエンドポイントのテストクラス"""
+
+    def test_cache_metrics(self, client: TestClient):
+        """キャッシュの統計情報を返す"""
+        response = client.get("/metrics/cache")
+        assert response.status_code == 200
+        info = response.json()["info"]
+        for key in ["hits", "misses", "evictions", "entries", "bytes", "coalesced"]:
+            assert key in info
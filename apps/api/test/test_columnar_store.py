@@ -0,0 +1,144 @@
+"""
+列指向の株価データストアのテスト
+"""
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.stock import StockInfo, StockPriceResponse
+from services import columnar_store, market_calendar
+from services.columnar_store import ColumnarPriceStore, migrate_from_sql
+from services.price_store import PRICE_COLUMNS, ExecutorPriceStore, SqlPriceStore
+from services.stock_service import StockService
+from test_price_store import fake_ticker, make_frame
+
+
+@pytest.fixture(params=["parquet", "arrow"])
+def store(request, tmp_path):
+    """Parquet・Arrow IPCそれぞれのストア"""
+    return ColumnarPriceStore(str(tmp_path / "prices"), format=request.param)
+
+
+class TestColumnarPriceStore:
+    """列指向の株価データストアのテストクラス"""
+
+    def test_round_trip_across_years(self, store):
+        """年ごとのファイルに分けて保存し、開始日以降を日付順に読み込む"""
+        frame = make_frame("2024-11-01", "2025-02-28")
+        assert store.save("6758", frame) == len(frame)
+        assert sorted(path.name for path in (store.directory / "6758").iterdir()) == [
+            f"2024{store.extension}", f"2025{store.extension}"
+        ]
+
+        loaded = store.load("6758", date(2024, 12, 20))
+        expected = frame[frame.index >= pd.Timestamp("2024-12-20", tz=market_calendar.MARKET_TZ)]
+        assert list(loaded.columns) == PRICE_COLUMNS
+        assert loaded.index[0] == pd.Timestamp("2024-12-20")
+        assert loaded["Close"].tolist() == expected["Close"].tolist()
+
+    def test_skips_years_before_start(self, store):
+        """開始日より前の年のファイルは開かない"""
+        store.save("6758", make_frame("2023-01-02", "2025-10-17"))
+        (store.directory / "6758" / f"2023{store.extension}").write_bytes(b"broken")
+
+        assert len(store.load("6758", date(2025, 10, 1))) == 12
+
+    def test_column_projection(self, store):
+        """指定した列だけを読み込む"""
+        store.save("6758", make_frame("2025-09-01", "2025-10-17"))
+
+        loaded = store.load("6758", date(2025, 10, 1), columns=["Close"])
+        assert list(loaded.columns) == ["Close"]
+
+    def test_iter_batches(self, store):
+        """年ごとのファイルをまたいで、batch_size行ずつ日付順に返す"""
+        store.save("6758", make_frame("2024-11-01", "2025-02-28"))
+
+        batches = list(store.iter_batches("6758", date(2024, 12, 1), 10))
+
+        assert all(len(batch) <= 10 for batch in batches)
+        pd.testing.assert_frame_equal(pd.concat(batches), store.load("6758", date(2024, 12, 1)))
+
+    def test_upsert(self, store):
+        """同じ日付の足は更新し、それ以外の足は残す"""
+        store.save("6758", make_frame("2025-10-01", "2025-10-17"))
+        updated = make_frame("2025-10-16", "2025-10-20")
+        updated["Close"] = 500.0
+        updated.iloc[0, updated.columns.get_loc("Volume")] = np.nan
+        store.save("6758", updated)
+
+        loaded = store.load("6758", date(2025, 10, 1))
+        assert loaded.index.is_monotonic_increasing
+        assert len(loaded) == 13
+        assert loaded["Close"].iloc[-3:].tolist() == [500.0, 500.0, 500.0]
+        assert loaded["Close"].iloc[0] == 100.0
+        assert np.isnan(loaded.loc["2025-10-16", "Volume"])
+
+    def test_last_dates_and_missing_symbols(self, store):
+        """保存済みの最終日を返し、未保存の銘柄は空のDataFrameを返す"""
+        store.save_many({"6758": make_frame("2025-09-01", "2025-10-17"), "7203": make_frame("2025-09-01", "2025-10-10")})
+
+        assert store.last_dates(["6758", "7203", "0000"]) == {"6758": date(2025, 10, 17), "7203": date(2025, 10, 10)}
+        assert store.load("0000", date(2025, 1, 1)).empty
+
+
+class TestMigration:
+    """stock_pricesからの移行のテストクラス"""
+
+    def test_migrate_from_sql(self, db_session: Session, tmp_path):
+        """全期間を移行し、SQLのストアと同じ内容を読み込める"""
+        sql_store = SqlPriceStore(db_session)
+        frame = make_frame("2024-06-03", "2025-10-17")
+        sql_store.save_many({"6758": frame, "7203": frame})
+        target = ColumnarPriceStore(str(tmp_path / "prices"))
+
+        migrated = migrate_from_sql(db_session, target, batch_size=1)
+
+        assert migrated == {"symbols": 2, "rows": 2 * len(frame)}
+        expected = sql_store.load("7203", date(2025, 1, 1))
+        pd.testing.assert_frame_equal(target.load("7203", date(2025, 1, 1)), expected, check_names=False)
+
+
+class TestServiceWithColumnarStore:
+    """列指向のストアを使った株価取得のテストクラス"""
+
+    @pytest.fixture
+    def parquet_backend(self, monkeypatch, tmp_path):
+        """PRICE_STORE_BACKEND=parquet"""
+        monkeypatch.setattr(settings.price_store, "backend", "parquet")
+        store = ColumnarPriceStore(str(tmp_path / "prices"))
+        columnar_store.set_columnar_store(store)
+        yield store
+        columnar_store.set_columnar_store(None)
+
+    @pytest.mark.asyncio
+    async def test_read_through(self, db_session: Session, fake_ticker, parquet_backend):
+        """不足分を外部APIから取得してファイルに書き戻し、次回はファイルから応答する"""
+        db_session.add(StockInfo(symbol="6758", company_name="ソニーグループ株式会社"))
+        db_session.commit()
+        service = StockService(db_session)
+        assert isinstance(service.async_price_store, ExecutorPriceStore)
+
+        result = await service.get_stock_price("6758", "1mo", "1d")
+        assert result["data"][-1].date == datetime(2025, 10, 17, tzinfo=market_calendar.MARKET_TZ)
+        assert parquet_backend.last_dates(["6758"]) == {"6758": date(2025, 10, 17)}
+
+        calls = len(fake_ticker.history_calls)
+        await StockService(db_session).get_stock_price("6758", "5d", "1d")
+        assert len(fake_ticker.history_calls) == calls
+
+    @pytest.mark.asyncio
+    async def test_save_error_without_async_session(self, db_session: Session, parquet_backend, monkeypatch):
+        """AsyncSessionを使わない場合も、保存の失敗はロールバックせずに保存エラーとして返す"""
+        def failing_save_many(frames):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(parquet_backend, "save_many", failing_save_many)
+        price = StockPriceResponse(symbol="6758", date=datetime(2025, 10, 17), close_price=100.0)
+
+        with pytest.raises(Exception, match="株価データの保存に失敗しました: disk full"):
+            await StockService(db_session).save_stock_price("6758", [price])
@@ -0,0 +1,196 @@
+"""
+レスポンスの圧縮のテスト
+"""
+import gzip
+import json
+import zlib
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import CompressionConfig
+from services import compression, market_calendar, market_data, price_wire
+from services.cache import MemoryCache
+from services.compression import StreamCompressor
+from services.info_cache import info_cache
+from services.market_data import SyntheticProvider
+from services.price_coalescer import price_coalescer
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+PRICE_URL = "/api/v1/stocks/6758/price?period=6mo&interval=1d"
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        import brotli
+        return brotli.decompress(body)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    previous = market_data.get_provider()
+    provider = SyntheticProvider(seed=1)
+    market_data.set_provider(provider)
+    yield provider
+    market_data.set_provider(previous)
+
+
+class TestCompression:
+    """圧縮方式の選択と圧縮処理のテストクラス"""
+
+    def test_negotiate(self):
+        """q値が最も大きい方式を選び、同じ場合は優先順に従う"""
+        encodings = ("zstd", "br", "gzip")
+        assert compression.negotiate(None, encodings) is None
+        assert compression.negotiate("identity", encodings) is None
+        assert compression.negotiate("gzip, br", encodings) == "br"
+        assert compression.negotiate("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+        assert compression.negotiate("*", encodings) == "zstd"
+        assert compression.negotiate("*;q=0.5, zstd;q=0", encodings) == "br"
+        assert compression.negotiate("gzip;q=0", encodings) is None
+        # インストールされていない方式は選ばない
+        assert compression.negotiate("zstd, br, gzip;q=0.1", ("gzip",)) == "gzip"
+
+    def test_stream_compressor_flushes_each_chunk(self):
+        """チャンクごとにフラッシュし、受け取った分だけで展開できる"""
+        compressor = StreamCompressor("gzip", CompressionConfig())
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+        assert decompressor.decompress(compressor.compress(b'{"a":1}\n')) == b'{"a":1}\n'
+        assert decompressor.decompress(compressor.compress(b'{"a":2}\n')) == b'{"a":2}\n'
+        decompressor.decompress(compressor.finish())
+        assert decompressor.eof
+
+    @pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+    def test_round_trip(self, encoding):
+        """本文全体の圧縮と、チャンクごとの圧縮はどちらも元の本文に展開できる"""
+        pytest.importorskip({"gzip": "gzip", "br": "brotli", "zstd": "zstandard"}[encoding])
+        body = b'{"close":100.0}\n' * 500
+
+        assert decompress(compression.compress(body, encoding), encoding) == body
+
+        compressor = StreamCompressor(encoding, CompressionConfig())
+        chunks = [compressor.compress(body[:4000]), compressor.compress(body[4000:]), compressor.finish()]
+        assert decompress(b"".join(chunks), encoding) == body
+
+    def test_compress_cached(self):
+        """同じ表現・方式は1回だけ圧縮し、最小サイズ未満は圧縮しない"""
+        config = CompressionConfig(minimum_size=100)
+        renders = []
+
+        def render() -> bytes:
+            renders.append(1)
+            return b"x" * 1000
+
+        body, encoding = compression.compress_cached("etag", render, "gzip", config)
+        assert encoding == "gzip"
+        assert gzip.decompress(body) == b"x" * 1000
+        assert compression.compress_cached("etag", render, "gzip", config) == (body, "gzip")
+        assert len(renders) == 1
+
+        assert compression.compress_cached("small", lambda: b"small", "gzip", config) == (b"small", None)
+        assert compression.compress_cached("etag", lambda: b"x" * 1000, None, config) == (b"x" * 1000, None)
+        # キーがない場合はキャッシュしない
+        compression.compress_cached(None, render, "gzip", config)
+        assert len(renders) == 2
+
+    def test_compressed_cache_bounded(self, monkeypatch):
+        """圧縮済みの本文はバイト数の上限付きのキャッシュに保持し、古いものから削除する"""
+        cache = MemoryCache(max_entries=100, max_bytes=100, sizer=len)
+        monkeypatch.setattr(compression, "compressed_cache", cache)
+        config = CompressionConfig(minimum_size=0, gzip_level=1)
+
+        for key in range(10):
+            compression.compress_cached(key, lambda key=key: bytes([key]) * 1000, "gzip", config)
+
+        assert 0 < len(cache) < 10
+        assert cache.stats()["bytes"] <= 100
+        assert cache.get((9, "gzip")) is not None
+        assert cache.get((0, "gzip")) is None
+
+
+class TestCompressionMiddleware:
+    """APIのレスポンスの圧縮のテストクラス"""
+
+    def test_compresses_large_response(self, client: TestClient, provider):
+        """最小サイズ以上の本文はAccept-Encodingに応じて圧縮する"""
+        response = client.get(PRICE_URL, headers=GZIP)
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"].split(", ")
+        assert int(response.headers["content-length"]) < len(response.content) / 3
+        assert response.json()["symbol"] == "6758"
+
+    def test_skips_small_and_identity(self, client: TestClient):
+        """最小サイズ未満と、圧縮を受け付けないリクエストは圧縮しない"""
+        response = client.get("/health", headers=GZIP)
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+
+        response = client.get("/api/v1/stocks/popular?limit=50", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+    def test_streaming_response(self, client: TestClient, provider):
+        """逐次送信の本文はチャンクごとに圧縮し、Content-Lengthを付けない"""
+        expected = client.get(PRICE_URL).json()["data"]
+
+        response = client.get(PRICE_URL + "&stream=true", headers=GZIP)
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+    def test_price_compressed_once(self, client: TestClient, provider, monkeypatch):
+        """キャッシュされた株価取得結果は、圧縮済みの本文をそのまま使う"""
+        calls = []
+        original = compression.compress
+
+        def counting_compress(body, encoding, config=None):
+            calls.append(encoding)
+            return original(body, encoding, config)
+
+        monkeypatch.setattr(compression, "compress", counting_compress)
+        first = client.get(PRICE_URL, headers=GZIP)
+        second = client.get(PRICE_URL, headers=GZIP)
+
+        assert calls == ["gzip"]
+        assert second.content == first.content
+        assert second.headers["content-encoding"] == "gzip"
+
+    def test_price_recompressed_when_profile_changes(self, client: TestClient, provider, monkeypatch):
+        """足が同じでも企業情報が変わった場合は、圧縮済みの古い本文を返さない"""
+        first = client.get(PRICE_URL, headers=GZIP)
+
+        info = provider.info("6758")
+        monkeypatch.setattr(provider, "info", lambda symbol: {**info, "longName": "改称後株式会社"})
+        info_cache.clear()
+        price_coalescer.clear()
+        second = client.get(PRICE_URL, headers={**GZIP, "If-None-Match": first.headers["etag"]})
+
+        assert second.status_code == 200
+        assert second.headers["etag"] != first.headers["etag"]
+        assert second.json()["company_name"] == "改称後株式会社"
+
+    def test_skips_arrow_buffer_compression(self, client: TestClient, provider):
+        """Arrowのバッファ圧縮を指定した応答は重ねて圧縮しない"""
+        response = client.get(PRICE_URL, headers={**GZIP, "Accept": f"{price_wire.ARROW_STREAM}; compression=zstd"})
+
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+
+    def test_not_modified_vary(self, client: TestClient, provider):
+        """304にも200と同じVaryを付ける"""
+        response = client.get(PRICE_URL, headers=GZIP)
+        not_modified = client.get(PRICE_URL, headers={**GZIP, "If-None-Match": response.headers["etag"]})
+
+        assert not_modified.status_code == 304
+        assert not_modified.headers["vary"] == response.headers["vary"] == "Accept, Accept-Encoding"
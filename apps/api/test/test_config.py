@@ -3,8 +3,9 @@
 """
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 # テスト用データベース（メモリ内SQLite）
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -17,6 +18,15 @@ engine = create_engine(
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 同じデータベースファイルを使う非同期エンジン（aiosqlite）
+# テストごとにイベントループが変わるため、接続は使い回さない
+async_engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://"),
+    poolclass=NullPool,
+)
+
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_test_db():
     """テスト用データベースセッション"""
     db = TestingSessionLocal()
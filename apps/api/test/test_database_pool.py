@@ -0,0 +1,68 @@
+"""
+コネクションプール設定のテスト
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from config import DatabaseConfig
+from database import MonitoredQueuePool, create_database_engine, pool_metrics
+
+
+@pytest.fixture
+def pool_engine(tmp_path):
+    """常時保持1・超過作成1の小さなプール"""
+    pool_metrics.reset()
+    config = DatabaseConfig(pool_size=1, max_overflow=1, pool_timeout=0.05, pool_recycle=60)
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'pool.db'}", config)
+    yield engine
+    engine.dispose()
+
+
+class TestConnectionPool:
+    """コネクションプールのテストクラス"""
+
+    def test_pool_settings(self, pool_engine):
+        """DatabaseConfigの設定がプールに反映される"""
+        pool = pool_engine.pool
+        assert isinstance(pool, MonitoredQueuePool)
+        assert pool.size() == 1
+        assert pool._max_overflow == 1
+        assert pool._timeout == 0.05
+        assert pool._recycle == 60
+        assert pool._pre_ping is True
+
+    def test_checkout_overflow_and_timeout(self, pool_engine):
+        """使用中・超過作成の接続数と、取得待ちのタイムアウトを記録する"""
+        first = pool_engine.connect()
+        second = pool_engine.connect()
+
+        stats = pool_metrics.stats(pool_engine.pool)
+        assert stats["checked_out"] == 2
+        assert stats["overflow"] == 1
+
+        with pytest.raises(PoolTimeoutError):
+            pool_engine.connect()
+
+        first.close()
+        second.close()
+
+        stats = pool_metrics.stats(pool_engine.pool)
+        assert stats["checkouts"] == 2
+        assert stats["timeouts"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["max_checked_out"] == 2
+        assert stats["max_overflow"] == 1
+        assert stats["wait_seconds"] >= 0.05
+
+    def test_pool_metrics_endpoints(self, client: TestClient):
+        """プールの統計情報をJSONとPrometheus形式で返す"""
+        response = client.get("/metrics/pool")
+        assert response.status_code == 200
+        for engine in ["sync", "async"]:
+            for key in ["checkouts", "timeouts", "wait_seconds", "size", "checked_out", "overflow"]:
+                assert key in response.json()[engine]
+
+        body = client.get("/metrics").text
+        assert 'mokabulens_db_pool_checked_out{engine="sync"}' in body
+        assert 'mokabulens_db_pool_timeouts_total{engine="async"}' in body
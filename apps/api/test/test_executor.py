@@ -0,0 +1,70 @@
+"""
+ブロッキング処理実行基盤のテスト
+"""
+import asyncio
+import time
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from services.executor import BlockingExecutor, ExecutorTimeoutError
+from services.stock_service import StockService
+
+
+class SleepyTicker:
+    """呼び出しごとにブロッキングするティッカー"""
+
+    def history(self, **kwargs):
+        time.sleep(0.2)
+        index = pd.date_range("2025-10-17 09:00", periods=3, freq="5min", tz="Asia/Tokyo")
+        return pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 1}, index=index)
+
+    @property
+    def info(self):
+        time.sleep(0.2)
+        return {"longName": "テスト", "marketCap": None}
+
+
+class TestBlockingExecutor:
+    """BlockingExecutorのテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_runs_calls_concurrently(self):
+        """複数のブロッキング処理が並行して実行される"""
+        executor = BlockingExecutor("test", max_workers=4)
+        started = time.perf_counter()
+        await asyncio.gather(*(executor.run(time.sleep, 0.2) for _ in range(4)))
+        assert time.perf_counter() - started < 0.6
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_timeout(self):
+        """タイムアウト時はExecutorTimeoutErrorを送出する"""
+        executor = BlockingExecutor("test", max_workers=1, timeout=0.05)
+        with pytest.raises(ExecutorTimeoutError):
+            await executor.run(time.sleep, 0.3)
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_restart_after_shutdown(self):
+        """停止後に呼び出すとスレッドプールを再作成する"""
+        executor = BlockingExecutor("test", max_workers=1)
+        executor.shutdown()
+        assert await executor.run(sum, [1, 2, 3]) == 6
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_price_requests(self, db_session: Session, monkeypatch):
+        """同時の株価取得は直列の合計時間ではなく最も遅い1件程度で完了する"""
+        monkeypatch.setattr("services.market_data.yf.Ticker", lambda symbol: SleepyTicker())
+        service = StockService(db_session)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(service.get_stock_price(str(1000 + i), "1d", "5m") for i in range(4))
+        )
+
+        # 直列なら 4件 x 2回 x 0.2秒 = 1.6秒
+        assert time.perf_counter() - started < 1.0
+        assert all(len(result["data"]) == 3 for result in results)
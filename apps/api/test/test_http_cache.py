@@ -0,0 +1,134 @@
+"""
+HTTPキャッシュ（ETag・Last-Modified・304）のテスト
+"""
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from config import HttpCacheConfig, settings
+from models.stock import StockInfo
+from services import http_cache, market_calendar, market_data
+from services.http_cache import ResourceVersion
+from services.market_data import SyntheticProvider
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+# 2025-10-17（金）取引時間中
+DURING_SESSION = datetime(2025, 10, 17, 10, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+class TestHttpCache:
+    """版の計算と条件付きリクエストの判定のテストクラス"""
+
+    def test_etag_matches(self):
+        """弱い比較で一致を判定し、複数指定と*に対応する"""
+        etag = http_cache.make_etag("6758", 1)
+        opaque = etag.removeprefix("W/")
+        assert http_cache.etag_matches(etag, etag)
+        assert http_cache.etag_matches(opaque, etag)
+        assert http_cache.etag_matches(f'"other", {etag}', etag)
+        assert http_cache.etag_matches("*", etag)
+        assert not http_cache.etag_matches(http_cache.make_etag("6758", 2), etag)
+
+    def test_if_modified_since(self):
+        """If-None-Matchがなければ更新日時と比較する"""
+        version = ResourceVersion('W/"a"', datetime(2025, 10, 17, 6, 30, 0, 500000, tzinfo=timezone.utc))
+        assert http_cache.is_not_modified({"if-modified-since": "Fri, 17 Oct 2025 06:30:00 GMT"}, version)
+        assert not http_cache.is_not_modified({"if-modified-since": "Fri, 17 Oct 2025 06:29:59 GMT"}, version)
+        assert not http_cache.is_not_modified({"if-modified-since": "invalid"}, version)
+        # If-None-Matchを優先する
+        assert not http_cache.is_not_modified(
+            {"if-none-match": 'W/"b"', "if-modified-since": "Fri, 17 Oct 2025 06:30:00 GMT"}, version
+        )
+
+    def test_price_version(self):
+        """最後の足の値が変わると版も変わり、日足の更新日時は大引けとする"""
+        index = pd.DatetimeIndex(["2025-10-16", "2025-10-17"])
+        hist = pd.DataFrame({"Open": [1.0, 2.0], "High": [1.0, 2.0], "Low": [1.0, 2.0], "Close": [1.0, 2.0], "Volume": [10.0, 20.0]}, index=index)
+        version = http_cache.price_version(("6758", "5d"), hist, AFTER_CLOSE)
+
+        assert version.last_modified == datetime(2025, 10, 17, 15, 30, tzinfo=market_calendar.MARKET_TZ)
+        assert http_cache.price_version(("6758", "5d"), hist.copy(), AFTER_CLOSE) == version
+        hist.iloc[-1, hist.columns.get_loc("Close")] = 2.5
+        assert http_cache.price_version(("6758", "5d"), hist, AFTER_CLOSE).etag != version.etag
+        assert http_cache.price_version(("6758", "1mo"), hist, AFTER_CLOSE).etag != version.etag
+
+    def test_max_age(self):
+        """取引時間中は短く、取引時間外は次の寄り付きまでを上限とする"""
+        config = HttpCacheConfig(open_max_age=15, closed_max_age=3600)
+        assert http_cache.max_age(DURING_SESSION, config) == 15
+        assert http_cache.max_age(AFTER_CLOSE, config) == 3600
+        # 月曜の寄り付き10分前
+        before_open = datetime(2025, 10, 20, 8, 50, tzinfo=market_calendar.MARKET_TZ)
+        assert http_cache.max_age(before_open, config) == 600
+
+
+class TestConditionalRequests:
+    """株価・株式情報APIの条件付きリクエストのテストクラス"""
+
+    @pytest.fixture
+    def provider(self, monkeypatch):
+        monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+        previous = market_data.get_provider()
+        provider = SyntheticProvider(seed=1)
+        market_data.set_provider(provider)
+        yield provider
+        market_data.set_provider(previous)
+
+    def test_price_not_modified_without_provider_call(self, client: TestClient, provider):
+        """保存済みの日足で応答できる場合は、外部APIを呼ばずに304を返す"""
+        url = "/api/v1/stocks/6758/price?period=1mo&interval=1d"
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert response.headers["last-modified"] == "Fri, 17 Oct 2025 06:30:00 GMT"
+        assert response.headers["cache-control"] == "public, max-age=3600"
+
+        calls = provider.calls
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert provider.calls == calls
+
+        # 条件の異なる表現は別の版
+        response = client.get(url + "&layout=columns", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_price_not_modified_after_fetch(self, client: TestClient, provider):
+        """保存しない足種は取得後に版を比較して304を返す"""
+        url = "/api/v1/stocks/6758/price?period=1d&interval=5m"
+        etag = client.get(url).headers["etag"]
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert client.get(url, headers={"If-None-Match": 'W/"stale"'}).status_code == 200
+
+    def test_info_version_follows_updated_at(self, client: TestClient, db_session: Session, provider):
+        """stock_infoの更新日時から版を計算し、更新されると200を返す"""
+        stock = StockInfo(symbol="6758", company_name="ソニーグループ株式会社", updated_at=datetime(2025, 10, 1, 0, 0))
+        db_session.add(stock)
+        db_session.commit()
+
+        response = client.get("/api/v1/stocks/6758/info")
+        assert response.status_code == 200
+        assert response.headers["last-modified"] == "Wed, 01 Oct 2025 00:00:00 GMT"
+        etag = response.headers["etag"]
+        assert client.get("/api/v1/stocks/6758/info", headers={"If-None-Match": etag}).status_code == 304
+
+        stock.updated_at = datetime(2025, 10, 17, 0, 0)
+        db_session.commit()
+        response = client.get("/api/v1/stocks/6758/info", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_disabled(self, client: TestClient, provider, monkeypatch):
+        """無効にするとキャッシュ用のヘッダーを付けない"""
+        monkeypatch.setattr(settings.http_cache, "enabled", False)
+        response = client.get("/api/v1/stocks/6758/price?period=5d&interval=1d", headers={"If-None-Match": "*"})
+        assert response.status_code == 200
+        assert "etag" not in response.headers
@@ -0,0 +1,157 @@
+"""
+株価データ提供元のテスト
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from config import ProviderConfig
+from models.stock import StockPrice
+from services import market_calendar, market_data
+from services.market_data import (
+    ProviderError, SyntheticProvider, YFinanceProvider, create_provider
+)
+from services.stock_service import StockService
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+
+
+class TestSyntheticProvider:
+    """SyntheticProviderのテストクラス"""
+
+    def test_reproducible_series(self):
+        """同じシードなら同じ値になり、取得期間によらず同じ日付の値は一定"""
+        month = SyntheticProvider(seed=1).history("6758", period="1mo")
+        year = SyntheticProvider(seed=1).history("6758", start=date(2025, 1, 6))
+
+        assert month.index[-1] == pd.Timestamp("2025-10-17", tz=market_calendar.MARKET_TZ)
+        pd.testing.assert_frame_equal(year.loc[month.index], month)
+        assert not SyntheticProvider(seed=2).history("6758", period="1mo").equals(month)
+
+    def test_ohlc_consistency(self):
+        """高値・安値が始値・終値を含む"""
+        frame = SyntheticProvider().history("7203", period="1y")
+        assert (frame["High"] >= frame[["Open", "Close"]].max(axis=1)).all()
+        assert (frame["Low"] <= frame[["Open", "Close"]].min(axis=1)).all()
+        assert (frame["Volume"] > 0).all()
+
+    def test_intraday_within_session(self):
+        """分足は立会時間内の足を返す"""
+        frame = SyntheticProvider().history("6758", period="1d", interval="5m")
+        assert len(frame) == 78
+        assert frame.index[0] == pd.Timestamp("2025-10-17 09:00", tz=market_calendar.MARKET_TZ)
+        assert frame.index[-1] == pd.Timestamp("2025-10-17 15:25", tz=market_calendar.MARKET_TZ)
+
+    def test_bulk_history_and_unknown_symbols(self):
+        """存在しない銘柄は結果に含めない"""
+        provider = SyntheticProvider()
+        frames = provider.bulk_history(["6758", "7203", "0000"], start=date(2025, 10, 1))
+        assert list(frames) == ["6758", "7203"]
+        assert provider.info("0000") == {}
+
+    def test_info_and_search(self):
+        """企業メタデータと企業名検索"""
+        provider = SyntheticProvider()
+        info = provider.info("6758")
+        assert info["symbol"] == "6758.T"
+        assert info["marketCap"] > 0
+
+        results = provider.search(info["longName"][:2], 5)
+        assert 0 < len(results) <= 5
+        assert provider.search("6758", 5)[0].company_name == info["longName"]
+
+    def test_injected_latency_and_errors(self):
+        """遅延とエラーを注入できる"""
+        sleeps = []
+        provider = SyntheticProvider(latency=0.2, error_rate=1.0, sleep=sleeps.append)
+        with pytest.raises(ProviderError):
+            provider.history("6758", period="5d")
+        assert sleeps == [0.2]
+        assert provider.calls == 1
+
+
+class TestYFinanceProvider:
+    """YFinanceProviderのテストクラス"""
+
+    def test_concurrent_bulk_history(self, monkeypatch):
+        """同時に呼んだ一括取得が互いの結果を上書きしない"""
+        shared = {}
+
+        def fake_download(tickers, **kwargs):
+            # yfinanceと同じく、呼び出しのたびに共有の結果を初期化してから銘柄ごとに集める
+            shared.clear()
+            for ticker in tickers:
+                time.sleep(0.01)
+                index = pd.DatetimeIndex([pd.Timestamp("2025-10-17", tz=market_calendar.MARKET_TZ)])
+                shared[ticker] = pd.DataFrame(
+                    {"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 1.0}, index=index
+                )
+            return pd.concat(dict(shared), axis=1)
+
+        monkeypatch.setattr(market_data.yf, "download", fake_download)
+        provider = YFinanceProvider()
+        requests = [["1301", "1332", "1605"], ["6758", "7203", "9984"]]
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            first = pool.submit(provider.bulk_history, requests[0])
+            # 1つ目の取得の途中で2つ目を開始する
+            time.sleep(0.015)
+            second = pool.submit(provider.bulk_history, requests[1])
+            results = [first.result(), second.result()]
+
+        assert [sorted(result) for result in results] == requests
+
+
+class TestCreateProvider:
+    """設定からの提供元作成テストクラス"""
+
+    def test_default_is_yfinance(self):
+        assert isinstance(create_provider(ProviderConfig()), YFinanceProvider)
+
+    def test_synthetic(self):
+        provider = create_provider(ProviderConfig(name="synthetic", synthetic_latency=0.1, synthetic_error_rate=0.5))
+        assert isinstance(provider, SyntheticProvider)
+        assert provider.latency == 0.1
+        assert provider.error_rate == 0.5
+
+    def test_invalid_name(self):
+        with pytest.raises(ValueError):
+            ProviderConfig(name="bloomberg")
+
+
+class TestStockServiceWithProvider:
+    """提供元を差し替えたStockServiceのテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_price_from_synthetic_provider(self, db_session: Session):
+        """合成データで株価を取得し、確定済みの足を保存する"""
+        provider = SyntheticProvider()
+        service = StockService(db_session, provider)
+
+        result = await service.get_stock_price("6758", "1mo", "1d")
+
+        expected = provider.history("6758", period="1mo")
+        assert result["current_price"] == expected["Close"].iloc[-1]
+        assert result["company_name"] == provider.info("6758")["longName"]
+        assert db_session.query(StockPrice).count() == len(expected)
+
+    @pytest.mark.asyncio
+    async def test_search_by_name_from_provider(self, db_session: Session):
+        """データベースにない企業名は提供元の検索を使う"""
+        provider = SyntheticProvider(symbols=["6758", "7203"])
+        service = StockService(db_session, provider)
+        name = provider.info("7203")["longName"]
+
+        results = await service.search_stocks(name, 10)
+
+        assert [result.symbol for result in results] == ["7203"]
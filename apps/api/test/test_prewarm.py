@@ -0,0 +1,150 @@
+"""
+事前取得スケジューラーのテスト
+"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from config import PrewarmConfig
+from models.stock import StockInfo, StockPrice
+from services import market_calendar, market_data
+from services.info_cache import info_cache
+from services.price_coalescer import price_coalescer
+from services.market_data import SyntheticProvider
+from services.prewarm import POPULAR_SYMBOLS, PrewarmScheduler, RecentSymbols
+from test_config import TestingAsyncSessionLocal, TestingSessionLocal
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+def at(month: int, day: int, hour: int, minute: int = 0) -> datetime:
+    """2025年の市場タイムゾーンの時刻"""
+    return datetime(2025, month, day, hour, minute, tzinfo=market_calendar.MARKET_TZ)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """外部APIの代わりに合成データ提供元を使う"""
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    previous = market_data.get_provider()
+    synthetic = SyntheticProvider(seed=1)
+    market_data.set_provider(synthetic)
+    yield synthetic
+    market_data.set_provider(previous)
+
+
+def make_scheduler(recent: RecentSymbols, **config) -> PrewarmScheduler:
+    """テスト用データベースを使うスケジューラー（既定ではばらつきなし）"""
+    config.setdefault("jitter", 0)
+    return PrewarmScheduler(TestingSessionLocal, TestingAsyncSessionLocal, recent, config=PrewarmConfig(**config))
+
+
+class TestRecentSymbols:
+    """最近リクエストされた銘柄の記録のテストクラス"""
+
+    def test_newest_first_and_bounded(self):
+        """新しい順に返し、最大件数を超えた古いものから除外する"""
+        recent = RecentSymbols(max_symbols=2, ttl=60)
+        for symbol in ["6758", "7203", "6758", "9984"]:
+            recent.record(symbol)
+        assert recent.symbols() == ["9984", "6758"]
+
+    def test_expires_after_ttl(self):
+        """有効期間を過ぎた銘柄は対象から外す"""
+        now = [0.0]
+        recent = RecentSymbols(max_symbols=10, ttl=60, clock=lambda: now[0])
+        recent.record("6758")
+        now[0] = 30.0
+        recent.record("7203")
+        now[0] = 61.0
+        assert recent.symbols() == ["7203"]
+
+
+class TestSchedule:
+    """実行間隔のテストクラス"""
+
+    def test_open_session_interval(self):
+        """取引時間中は短い間隔で実行する"""
+        scheduler = make_scheduler(RecentSymbols(10, 60), open_interval=300, closed_interval=3600)
+        assert scheduler.next_delay(at(10, 17, 10)) == 300
+
+    def test_runs_right_after_close(self):
+        """大引けをまたぐ場合は大引けの直後に実行する"""
+        scheduler = make_scheduler(RecentSymbols(10, 60), open_interval=300, closed_interval=3600)
+        assert scheduler.next_delay(at(10, 17, 15, 28)) == 120
+
+    def test_holiday_waits_for_next_open(self):
+        """休業日（スポーツの日）は長い間隔で実行し、翌営業日の寄り付きを優先する"""
+        scheduler = make_scheduler(RecentSymbols(10, 60), open_interval=300, closed_interval=3600)
+        assert scheduler.next_delay(at(10, 13, 12)) == 3600
+        assert scheduler.next_delay(at(10, 14, 8, 30)) == 1800
+
+    def test_jitter(self):
+        """ばらつきは実行間隔に対する割合の範囲に収まる"""
+        scheduler = make_scheduler(RecentSymbols(10, 60), open_interval=300, closed_interval=3600, jitter=0.1)
+        delays = [scheduler.next_delay(at(10, 17, 10)) for _ in range(50)]
+        assert all(270 <= delay <= 330 for delay in delays)
+        assert len(set(delays)) > 1
+
+
+class TestPrewarm:
+    """事前取得のテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_run_once(self, db_session: Session, provider):
+        """人気銘柄と最近リクエストされた銘柄の企業情報・日足を保存し、メタデータをキャッシュする"""
+        recent = RecentSymbols(10, 60)
+        recent.record("1301")
+        scheduler = make_scheduler(recent)
+
+        result = await scheduler.run_once()
+
+        symbols = [*POPULAR_SYMBOLS, "1301"]
+        assert result["symbols"] == len(symbols)
+        assert result["info_saved"] == len(symbols)
+        assert result["info_failed"] == []
+        assert db_session.query(StockInfo).count() == len(symbols)
+        assert db_session.query(StockPrice).filter(StockPrice.symbol == "1301").count() > 0
+        assert info_cache.peek("1301", ["longName", "marketCap"]) is not None
+
+        # 2回目は保存済みの企業情報を書き直さず、日足は直近の修正対象期間のみ取得する
+        second = await scheduler.run_once()
+        assert second["info_saved"] == 0
+        assert second["price_rows"] < result["price_rows"]
+
+    @pytest.mark.asyncio
+    async def test_popular_served_from_warm_data(self, client: TestClient, provider):
+        """事前取得後の人気株式一覧は外部APIを呼ばずに応答する"""
+        await make_scheduler(RecentSymbols(10, 60)).run_once()
+        calls = provider.calls
+
+        response = client.get(f"/api/v1/stocks/popular?limit={len(POPULAR_SYMBOLS)}")
+        assert response.status_code == 200
+        assert response.json()["total"] == len(POPULAR_SYMBOLS)
+        assert provider.calls == calls
+
+    @pytest.mark.asyncio
+    async def test_price_during_session_served_from_warm_data(self, client: TestClient, provider, monkeypatch):
+        """取引時間中も、事前取得後の株価取得は外部APIを呼ばずに当日の足まで応答する"""
+        monkeypatch.setattr(market_calendar, "market_now", lambda: at(10, 17, 10))
+        result = await make_scheduler(RecentSymbols(10, 60)).run_once()
+        assert result["session_warmed"] == len(POPULAR_SYMBOLS)
+        # 集約レイヤーのマイクロキャッシュではなく、直近の足のキャッシュから応答することを確かめる
+        price_coalescer.clear()
+        calls = provider.calls
+
+        for period in ["5d", "1mo"]:
+            response = client.get(f"/api/v1/stocks/6758/price?period={period}&interval=1d")
+            assert response.status_code == 200
+            assert response.json()["data"][-1]["date"].startswith("2025-10-17")
+        assert provider.calls == calls
+
+    def test_prewarm_metrics_endpoint(self, client: TestClient):
+        """スケジューラーの状態を返す"""
+        response = client.get("/metrics/prewarm")
+        assert response.status_code == 200
+        for key in ["running", "runs", "failures", "symbols", "last_run", "next_run_at"]:
+            assert key in response.json()
@@ -0,0 +1,141 @@
+"""
+株価取得リクエスト集約のテスト
+"""
+import asyncio
+import time
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from services.cache import MemoryCache
+from services.price_coalescer import PriceRequestCoalescer, estimate_result_size, price_coalescer
+from services.stock_service import StockService
+from test_config import TestingSessionLocal
+
+
+class CountingTicker:
+    """呼び出し回数を数える遅いティッカー"""
+
+    history_calls = 0
+
+    def history(self, **kwargs):
+        CountingTicker.history_calls += 1
+        time.sleep(0.1)
+        index = pd.date_range("2025-10-17 09:00", periods=3, freq="5min", tz="Asia/Tokyo")
+        return pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 1}, index=index)
+
+    @property
+    def info(self):
+        return {"symbol": "7203.T", "longName": "トヨタ自動車", "marketCap": 1.0}
+
+
+@pytest.fixture
+def counting_ticker(monkeypatch):
+    CountingTicker.history_calls = 0
+    monkeypatch.setattr("services.market_data.yf.Ticker", lambda symbol: CountingTicker())
+    return CountingTicker
+
+
+class TestPriceRequestCoalescer:
+    """株価取得リクエスト集約のテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests(self, db_session: Session, counting_ticker):
+        """同じ条件の同時リクエストは1回の取得にまとめる"""
+        service = StockService(db_session)
+
+        results = await asyncio.gather(
+            *(service.get_stock_price("7203", "1d", "5m") for _ in range(10))
+        )
+
+        assert counting_ticker.history_calls == 1
+        assert all(result == results[0] for result in results)
+        assert price_coalescer.stats()["coalesced"] == 9
+
+    @pytest.mark.asyncio
+    async def test_waiters_get_copies(self, db_session: Session, counting_ticker):
+        """DataFrameのまま返す結果は、待っていたリクエストごとに別のDataFrameになる"""
+        service = StockService(db_session)
+
+        first, second = await asyncio.gather(
+            service.get_stock_price("7203", "1d", "5m", "frame"),
+            service.get_stock_price("7203", "1d", "5m", "frame"),
+        )
+        first["data"]["Close"] = 999.0
+        cached = await service.get_stock_price("7203", "1d", "5m", "frame")
+
+        assert counting_ticker.history_calls == 1
+        assert first["data"] is not second["data"]
+        assert list(second["data"]["Close"]) == list(cached["data"]["Close"]) == [1.0, 1.0, 1.0]
+
+    @pytest.mark.asyncio
+    async def test_shared_fetch_uses_own_session(self, monkeypatch, counting_ticker):
+        """共有する取得は最初のリクエストのセッションを使わず、切断されても他のリクエストは結果を受け取る"""
+        sessions = []
+        original = StockService._get_stock_price
+
+        async def recording_get_stock_price(self, *args):
+            sessions.append(self.db)
+            return await original(self, *args)
+
+        monkeypatch.setattr(StockService, "_get_stock_price", recording_get_stock_price)
+        first_session, second_session = TestingSessionLocal(), TestingSessionLocal()
+        try:
+            first = asyncio.create_task(StockService(first_session).get_stock_price("7203", "1d", "5m"))
+            await asyncio.sleep(0.02)
+            # 最初のリクエストが切断され、get_dbがセッションを閉じる
+            first.cancel()
+            first_session.close()
+
+            result = await StockService(second_session).get_stock_price("7203", "1d", "5m")
+        finally:
+            first_session.close()
+            second_session.close()
+
+        assert result["symbol"] == "7203"
+        assert counting_ticker.history_calls == 1
+        assert len(sessions) == 1
+        assert sessions[0] is not first_session and sessions[0] is not second_session
+
+    @pytest.mark.asyncio
+    async def test_different_keys_are_not_coalesced(self, db_session: Session, counting_ticker):
+        """条件が異なるリクエストは別々に取得する"""
+        service = StockService(db_session)
+
+        await asyncio.gather(
+            service.get_stock_price("7203", "1d", "5m"),
+            service.get_stock_price("7203", "5d", "5m"),
+        )
+
+        assert counting_ticker.history_calls == 2
+
+    @pytest.mark.asyncio
+    async def test_micro_cache(self, db_session: Session, counting_ticker):
+        """完了した結果は有効期間内であれば再利用する"""
+        service = StockService(db_session)
+
+        await service.get_stock_price("7203", "1d", "5m")
+        await service.get_stock_price("7203", "1d", "5m")
+
+        assert counting_ticker.history_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_micro_cache_disabled(self):
+        """有効期間0の場合は完了した結果を再利用しない"""
+        coalescer = PriceRequestCoalescer(MemoryCache(max_entries=10, max_bytes=10_000), ttl=0)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return {"data": []}
+
+        await coalescer.get("key", fetch)
+        await coalescer.get("key", fetch)
+        assert len(calls) == 2
+
+    def test_estimate_result_size(self):
+        """行数に応じてメモリ使用量を見積もる"""
+        rows = estimate_result_size({"data": [None] * 10})
+        columns = estimate_result_size({"data": {"dates": [None] * 10}})
+        assert rows == columns > estimate_result_size({"data": []})
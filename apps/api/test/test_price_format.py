@@ -0,0 +1,113 @@
+"""
+株価データ変換のテスト
+"""
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.stock import StockPriceColumnarDataResponse, StockPriceColumns, StockPriceDataResponse
+from services import json_response, market_calendar, price_format
+
+
+@pytest.fixture
+def hist():
+    index = pd.date_range("2025-10-14", periods=4, freq="D", tz=market_calendar.MARKET_TZ)
+    return pd.DataFrame(
+        {
+            "Open": [100.0, np.nan, 102.0, 103.0],
+            "High": [110.0, 111.0, np.nan, 113.0],
+            "Low": [90.0, 91.0, 92.0, 93.0],
+            "Close": [105.0, 106.0, 107.0, np.nan],
+            "Volume": [1000.0, np.nan, 3000.0, 4000.0],
+        },
+        index=index,
+    )
+
+
+class TestPriceFormat:
+    """株価データ変換のテストクラス"""
+
+    def test_float_column_masks_nan(self, hist):
+        """NaNはNoneに、値はPythonのfloatに変換される"""
+        values = price_format.float_column(hist["Open"])
+        assert values == [100.0, None, 102.0, 103.0]
+        assert type(values[0]) is float
+
+    def test_int_column_masks_nan(self, hist):
+        """出来高はPythonのintに変換される"""
+        values = price_format.int_column(hist["Volume"])
+        assert values == [1000, None, 3000, 4000]
+        assert type(values[0]) is int
+
+    def test_frame_to_columns(self, hist):
+        """列指向の辞書に変換される"""
+        columns = price_format.frame_to_columns(hist)
+        assert columns["dates"][0] == datetime(2025, 10, 14, tzinfo=market_calendar.MARKET_TZ)
+        assert columns["close"] == [105.0, 106.0, 107.0, None]
+        assert columns["adjusted_close"] == columns["close"]
+
+    def test_frame_to_records_matches_columns(self, hist):
+        """1行ずつの変換結果は列指向の変換結果と一致する"""
+        records = price_format.frame_to_records("6758", hist)
+        assert len(records) == 4
+        assert records[1].open_price is None
+        assert records[1].volume is None
+        assert records[3].close_price is None
+        assert records[2].high_price is None
+        assert records[0].symbol == "6758"
+
+    def test_fixed_offset_dates(self, hist):
+        """タイムゾーン付きの日時は同じ時刻・同じJSON表記のまま固定オフセットになる"""
+        dates = price_format.index_to_datetimes(hist.index)
+        assert dates == hist.index.to_pydatetime().tolist()
+        assert dates[0].isoformat() == "2025-10-14T00:00:00+09:00"
+
+    def test_orjson_matches_pydantic(self, hist):
+        """orjsonでの変換結果はPydanticのJSON変換と一致する"""
+        for data, model in [
+            (price_format.frame_to_records("6758", hist), StockPriceDataResponse),
+            (StockPriceColumns.model_construct(**price_format.frame_to_columns(hist)), StockPriceColumnarDataResponse),
+        ]:
+            fields = {"symbol": "6758", "company_name": "ソニーグループ株式会社", "current_price": 107.0, "volume": 3000, "data": data}
+            expected = model(**fields).model_dump(mode="json")
+            assert json.loads(json_response.dumps(model.model_construct(**fields))) == expected
+
+    def test_empty_frame(self):
+        """空のDataFrameは空のリストになる"""
+        empty = pd.DataFrame(
+            columns=["Open", "High", "Low", "Close", "Volume"],
+            index=pd.DatetimeIndex([]),
+            dtype="float64",
+        )
+        assert price_format.frame_to_records("6758", empty) == []
+        assert price_format.frame_to_columns(empty)["volume"] == []
+
+
+class TestPriceLayout:
+    """価格データの形式指定のテストクラス"""
+
+    def test_columns_layout(self, client, hist, monkeypatch):
+        """layout=columnsでは列指向で返す"""
+
+        class Ticker:
+            def history(self, **kwargs):
+                return hist
+
+            @property
+            def info(self):
+                return {"longName": "ソニーグループ株式会社"}
+
+        monkeypatch.setattr("services.market_data.yf.Ticker", lambda symbol: Ticker())
+        response = client.get("/api/v1/stocks/6758/price?period=1d&interval=5m&layout=columns")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["volume"] == [1000, None, 3000, 4000]
+        assert len(data["dates"]) == 4
+
+    def test_invalid_layout(self, client):
+        """不明な形式はバリデーションエラー"""
+        response = client.get("/api/v1/stocks/6758/price?layout=table")
+        assert response.status_code == 422
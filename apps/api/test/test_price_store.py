@@ -0,0 +1,508 @@
+"""
+株価データストア（読み取りキャッシュ）のテスト
+"""
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.stock import PriceHistoryStart, StockInfo, StockPrice
+from services import market_calendar, price_store
+from services.price_coalescer import price_coalescer
+from services.stock_service import StockService
+from test_config import engine
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+class FakeTicker:
+    """yfinance.Tickerの代替（呼び出しを記録する）"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self.history_calls = []
+        self.info_calls = 0
+
+    def history(self, **kwargs):
+        self.history_calls.append(kwargs)
+        start = kwargs.get("start")
+        if start is None:
+            return self.frame
+        return self.frame[self.frame.index >= pd.Timestamp(start, tz=market_calendar.MARKET_TZ)]
+
+    @property
+    def info(self):
+        self.info_calls += 1
+        return {"symbol": "6758.T", "longName": "ソニーグループ株式会社", "marketCap": 1.0e13}
+
+
+def session_range(start: str, end: str) -> pd.DatetimeIndex:
+    """東証の営業日（土日・休業日を除く）の日付"""
+    holidays = market_calendar.holidays_between(date.fromisoformat(start), date.fromisoformat(end))
+    return pd.bdate_range(start, end, freq="C", holidays=holidays, tz=market_calendar.MARKET_TZ)
+
+
+def make_frame(start: str, end: str) -> pd.DataFrame:
+    """営業日ごとの株価DataFrameを作成"""
+    index = session_range(start, end)
+    return pd.DataFrame(
+        {
+            "Open": 100.0,
+            "High": 110.0,
+            "Low": 90.0,
+            "Close": [100.0 + i for i in range(len(index))],
+            "Volume": 1000,
+        },
+        index=index,
+    )
+
+
+@pytest.fixture
+def fake_ticker(monkeypatch):
+    ticker = FakeTicker(make_frame("2025-08-01", "2025-10-17"))
+    monkeypatch.setattr("services.market_data.yf.Ticker", lambda symbol: ticker)
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    return ticker
+
+
+class TestMarketCalendar:
+    """市場カレンダーのテストクラス"""
+
+    def test_latest_closed_session_before_close(self):
+        """大引け前は前営業日が確定済みの最新日"""
+        now = datetime(2025, 10, 20, 10, 0, tzinfo=market_calendar.MARKET_TZ)
+        assert market_calendar.is_session_open(now)
+        assert market_calendar.latest_closed_session(now) == date(2025, 10, 17)
+
+    def test_latest_closed_session_weekend(self):
+        """週末は金曜日が確定済みの最新日"""
+        now = datetime(2025, 10, 19, 12, 0, tzinfo=market_calendar.MARKET_TZ)
+        assert not market_calendar.is_session_open(now)
+        assert market_calendar.latest_closed_session(now) == date(2025, 10, 17)
+
+    def test_holidays(self):
+        """祝日は休業日として扱い、次の寄り付きは翌営業日"""
+        now = datetime(2025, 10, 13, 10, 0, tzinfo=market_calendar.MARKET_TZ)
+        assert not market_calendar.is_session_open(now)
+        assert market_calendar.latest_closed_session(now) == date(2025, 10, 10)
+        assert market_calendar.next_session_change(now) == datetime(2025, 10, 14, 9, 0, tzinfo=market_calendar.MARKET_TZ)
+
+    def test_rule_based_holidays(self):
+        """休業日は祝日の規則と年末年始から求め、表にない年も扱える"""
+        for year in (2025, 2026):
+            expected = {day for day in market_calendar.HOLIDAY_TABLE if day.year == year}
+            assert market_calendar.year_holidays(year) == expected
+        # 2027-01-11（成人の日）と2027-12-31（大納会の翌日）は休業日
+        assert not market_calendar.is_trading_day(date(2027, 1, 11))
+        assert not market_calendar.is_trading_day(date(2027, 12, 31))
+        assert market_calendar.is_trading_day(date(2027, 1, 4))
+        assert market_calendar.holidays_between(date(2026, 12, 1), date(2027, 1, 31)) == [
+            date(2026, 12, 31), date(2027, 1, 1), date(2027, 1, 11)
+        ]
+
+    def test_holiday_table_fallback_warns(self, monkeypatch, caplog):
+        """jpholidayがない場合は表を使い、表にない年は警告して土日のみを休業日とする"""
+        monkeypatch.setattr(market_calendar, "jpholiday", None)
+        market_calendar.year_holidays.cache_clear()
+        try:
+            assert market_calendar.year_holidays(2026) == {
+                day for day in market_calendar.HOLIDAY_TABLE if day.year == 2026
+            }
+            assert not caplog.records
+
+            with caplog.at_level("WARNING", logger="services.market_calendar"):
+                assert market_calendar.year_holidays(2027) == frozenset()
+            assert "2027年" in caplog.text
+        finally:
+            market_calendar.year_holidays.cache_clear()
+
+    def test_next_session_change(self):
+        """取引時間中は大引け、大引け後は翌営業日の寄り付き"""
+        during = datetime(2025, 10, 17, 10, 0, tzinfo=market_calendar.MARKET_TZ)
+        assert market_calendar.next_session_change(during) == datetime(2025, 10, 17, 15, 30, tzinfo=market_calendar.MARKET_TZ)
+        assert market_calendar.next_session_change(AFTER_CLOSE) == datetime(2025, 10, 20, 9, 0, tzinfo=market_calendar.MARKET_TZ)
+
+    def test_requested_start(self):
+        """期間指定から開始日を計算"""
+        assert price_store.requested_start("1d", AFTER_CLOSE) == date(2025, 10, 17)
+        # 2025-10-13（スポーツの日）は休業日
+        assert price_store.requested_start("5d", AFTER_CLOSE) == date(2025, 10, 10)
+        assert price_store.requested_start("1mo", AFTER_CLOSE) == date(2025, 9, 17)
+        assert price_store.requested_start("ytd", AFTER_CLOSE) == date(2025, 1, 1)
+
+
+class TestPriceReadThrough:
+    """保存済み株価の読み取りテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_served_from_database_when_covered(self, db_session: Session, fake_ticker):
+        """保存済みの期間は外部APIを呼ばずに応答する"""
+        db_session.add(StockInfo(symbol="6758", company_name="ソニーグループ株式会社"))
+        db_session.commit()
+        service = StockService(db_session)
+        service.price_store.save("6758", make_frame("2025-09-01", "2025-10-17"))
+
+        result = await service.get_stock_price("6758", "1mo", "1d")
+
+        assert fake_ticker.history_calls == []
+        assert fake_ticker.info_calls == 0
+        assert result["company_name"] == "ソニーグループ株式会社"
+        assert result["data"][0].date == datetime(2025, 9, 17, tzinfo=market_calendar.MARKET_TZ)
+        assert result["data"][-1].date == datetime(2025, 10, 17, tzinfo=market_calendar.MARKET_TZ)
+
+    @pytest.mark.asyncio
+    async def test_fetches_only_missing_tail(self, db_session: Session, fake_ticker):
+        """不足している直近の期間だけを取得して書き戻す"""
+        service = StockService(db_session)
+        service.price_store.save("6758", make_frame("2025-09-01", "2025-10-10"))
+
+        result = await service.get_stock_price("6758", "1mo", "1d")
+
+        assert fake_ticker.history_calls == [{"start": "2025-10-10", "interval": "1d"}]
+        assert result["data"][-1].date == datetime(2025, 10, 17, tzinfo=market_calendar.MARKET_TZ)
+        stored = db_session.query(StockPrice).filter(StockPrice.symbol == "6758").count()
+        assert stored == len(session_range("2025-09-01", "2025-10-17"))
+
+    @pytest.mark.asyncio
+    async def test_fetches_full_range_when_head_missing(self, db_session: Session, fake_ticker):
+        """期間の先頭が保存されていない場合は全期間を取得する"""
+        service = StockService(db_session)
+
+        result = await service.get_stock_price("6758", "1mo", "1d")
+
+        assert fake_ticker.history_calls == [{"start": "2025-09-17", "interval": "1d"}]
+        assert result["market_cap"] == 1.0e13
+        assert len(result["data"]) == len(session_range("2025-09-17", "2025-10-17"))
+
+        # 2回目はデータベースのみで応答
+        await service.get_stock_price("6758", "1mo", "1d")
+        assert len(fake_ticker.history_calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_recently_listed_symbol_not_refetched(self, db_session: Session, fake_ticker):
+        """上場から期間に満たない銘柄は、取得できる最初の日付を記録して2回目以降は先頭を取得し直さない"""
+        fake_ticker.frame = make_frame("2025-10-01", "2025-10-17")
+        service = StockService(db_session)
+
+        await service.get_stock_price("6758", "1mo", "1d")
+        first_date = db_session.query(PriceHistoryStart.first_date).filter(PriceHistoryStart.symbol == "6758").scalar()
+        assert first_date == datetime(2025, 10, 1)
+
+        price_coalescer.clear()
+        result = await service.get_stock_price("6758", "1mo", "1d")
+        assert fake_ticker.history_calls == [{"start": "2025-09-17", "interval": "1d"}]
+        assert len(result["data"]) == len(session_range("2025-10-01", "2025-10-17"))
+        assert await service.get_price_version("6758", "1mo", "1d") == result["version"]
+
+    @pytest.mark.asyncio
+    async def test_stored_bars_keep_market_timezone(self, db_session: Session, fake_ticker):
+        """データベースから返す足も、外部APIから取得した足と同じ取引所のタイムゾーン付きの日時"""
+        service = StockService(db_session)
+        fetched = await service.get_stock_price("6758", "1mo", "1d", "columns")
+        price_coalescer.clear()
+
+        stored = await service.get_stock_price("6758", "1mo", "1d", "columns")
+
+        assert len(fake_ticker.history_calls) == 1
+        assert stored["data"]["dates"] == fetched["data"]["dates"]
+        assert stored["data"]["dates"][-1].isoformat() == "2025-10-17T00:00:00+09:00"
+
+    @pytest.mark.asyncio
+    async def test_refetches_from_mid_range_gap(self, db_session: Session, fake_ticker):
+        """保存済みの期間の途中が欠けている場合は、最初に欠けている営業日から取得し直す"""
+        fake_ticker.frame = make_frame("2024-10-01", "2025-10-17")
+        stored = fake_ticker.frame
+        gap = (stored.index >= "2025-03-01") & (stored.index < "2025-08-01")
+        service = StockService(db_session)
+        service.price_store.save("6758", stored[~gap])
+
+        result = await service.get_stock_price("6758", "1y", "1d")
+
+        # 2025-03-01は土曜日
+        assert fake_ticker.history_calls == [{"start": "2025-03-03", "interval": "1d"}]
+        assert len(result["data"]) == len(session_range("2024-10-17", "2025-10-17"))
+        stored = db_session.query(StockPrice).filter(StockPrice.symbol == "6758").count()
+        assert stored == len(session_range("2024-10-01", "2025-10-17"))
+
+    def test_tolerates_few_missing_sessions(self):
+        """売買停止などで数日欠けているだけなら取得し直さない"""
+        stored = price_store.normalize_frame(make_frame("2025-09-01", "2025-10-17"))
+        start = date(2025, 9, 1)
+        assert price_store.find_fetch_start(stored.drop(stored.index[10:13]), start, AFTER_CLOSE) is None
+        assert price_store.find_fetch_start(stored.drop(stored.index[10:14]), start, AFTER_CLOSE) == stored.index[10].date()
+        assert price_store.missing_sessions(stored.index[12:14], stored.index[10].date()) == [stored.index[11].date()]
+
+    @pytest.mark.asyncio
+    async def test_info_cached_between_requests(self, db_session: Session, fake_ticker):
+        """企業メタデータはキャッシュされ、2回目以降は外部APIを呼ばない"""
+        service = StockService(db_session)
+
+        await service.get_stock_price("6758", "1d", "5m")
+        result = await service.get_stock_price("6758", "1d", "5m")
+
+        assert fake_ticker.info_calls == 1
+        assert result["market_cap"] == 1.0e13
+
+    @pytest.mark.asyncio
+    async def test_intraday_interval_bypasses_store(self, db_session: Session, fake_ticker):
+        """分足はデータベースを使わずに外部APIから取得する"""
+        service = StockService(db_session)
+
+        await service.get_stock_price("6758", "1d", "5m")
+
+        assert fake_ticker.history_calls == [{"period": "1d", "interval": "5m"}]
+        assert db_session.query(StockPrice).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_non_market_symbol_bypasses_store(self, db_session: Session, fake_ticker):
+        """東証以外の銘柄は東証の大引けで足の確定を判定できないため、保存せずに外部APIから取得する"""
+        service = StockService(db_session)
+
+        await service.get_stock_price("AAPL", "1mo", "1d")
+
+        assert fake_ticker.history_calls == [{"period": "1mo", "interval": "1d"}]
+        assert db_session.query(StockPrice).count() == 0
+        assert await service.get_price_version("AAPL", "1mo", "1d") is None
+
+
+class FakeDownload:
+    """yfinance.downloadの代替（呼び出しを記録する）"""
+
+    def __init__(self, frames: dict):
+        self.frames = frames
+        self.calls = []
+
+    def __call__(self, tickers, **kwargs):
+        self.calls.append((list(tickers), kwargs))
+        start = pd.Timestamp(kwargs.get("start", "1900-01-01"), tz=market_calendar.MARKET_TZ)
+        # yfinanceと同じくendの日は含まない
+        end = pd.Timestamp(kwargs.get("end", "2100-01-01"), tz=market_calendar.MARKET_TZ)
+        frames = {
+            ticker: self.frames[ticker][(self.frames[ticker].index >= start) & (self.frames[ticker].index < end)]
+            for ticker in tickers
+            if ticker in self.frames
+        }
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+
+@pytest.fixture
+def fake_download(monkeypatch):
+    download = FakeDownload({
+        "7203.T": make_frame("2025-08-01", "2025-10-17"),
+        "6758.T": make_frame("2025-08-01", "2025-10-17"),
+        "AAPL": make_frame("2025-08-01", "2025-10-17"),
+    })
+    monkeypatch.setattr("services.market_data.yf.download", download)
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    return download
+
+
+class TestBatchPrices:
+    """複数銘柄の株価一括取得テストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_single_bulk_call_for_missing_symbols(self, db_session: Session, fake_download):
+        """不足している銘柄は1回の一括ダウンロードで取得する"""
+        service = StockService(db_session)
+        service.price_store.save("9984", make_frame("2025-09-01", "2025-10-17"))
+
+        results = await service.get_stock_prices(["7203", "9984", "6758", "0000"], "1mo", "1d")
+
+        assert [result["symbol"] for result in results] == ["7203", "9984", "6758"]
+        assert len(fake_download.calls) == 1
+        tickers, kwargs = fake_download.calls[0]
+        assert tickers == ["7203.T", "6758.T", "0000.T"]
+        assert kwargs["start"] == "2025-09-17"
+
+        # 2回目はデータベースのみで応答
+        await service.get_stock_prices(["7203", "6758"], "1mo", "1d")
+        assert len(fake_download.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_recently_listed_symbol_not_refetched(self, db_session: Session, fake_download):
+        """上場から期間に満たない銘柄も、2回目はデータベースのみで応答する"""
+        fake_download.frames["7203.T"] = make_frame("2025-10-01", "2025-10-17")
+        service = StockService(db_session)
+
+        await service.get_stock_prices(["7203", "6758"], "1mo", "1d")
+        await service.get_stock_prices(["7203", "6758"], "1mo", "1d")
+
+        assert len(fake_download.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_non_market_symbols_bypass_store(self, db_session: Session, fake_download):
+        """東証以外の銘柄は期間指定で取得し、データベースに保存しない"""
+        service = StockService(db_session)
+
+        results = await service.get_stock_prices(["AAPL", "6758"], "1mo", "1d")
+
+        assert [result["symbol"] for result in results] == ["AAPL", "6758"]
+        assert [(tickers, kwargs.get("period")) for tickers, kwargs in fake_download.calls] == [
+            (["AAPL"], "1mo"), (["6758.T"], None)
+        ]
+        assert {row.symbol for row in db_session.query(StockPrice.symbol)} == {"6758"}
+
+    def test_batch_endpoint(self, client, fake_download):
+        """一括取得エンドポイントは見つからなかった銘柄を返す"""
+        response = client.post(
+            "/api/v1/stocks/prices/batch",
+            json={"symbols": ["7203", "0000"], "period": "5d", "interval": "1d"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["missing"] == ["0000"]
+        assert len(data["results"][0]["data"]) == 5
+
+    def test_batch_endpoint_validation(self, client):
+        """無効な期間や空の銘柄リストはバリデーションエラー"""
+        response = client.post("/api/v1/stocks/prices/batch", json={"symbols": [], "period": "1d"})
+        assert response.status_code == 422
+        response = client.post("/api/v1/stocks/prices/batch", json={"symbols": ["7203"], "period": "2w"})
+        assert response.status_code == 422
+
+
+class TestIncrementalSync:
+    """株価の差分同期テストクラス"""
+
+    def test_sync_start(self):
+        """保存済みの最終日を含めて指定営業日数さかのぼる"""
+        assert price_store.sync_start(date(2025, 10, 14), AFTER_CLOSE, 3, "1mo") == date(2025, 10, 9)
+        assert price_store.sync_start(date(2025, 10, 14), AFTER_CLOSE, 0, "1mo") == date(2025, 10, 15)
+        assert price_store.sync_start(None, AFTER_CLOSE, 3, "1mo") == date(2025, 9, 17)
+
+    @pytest.mark.asyncio
+    async def test_fetches_only_new_bars_and_trailing_window(
+        self, db_session: Session, async_db_session: AsyncSession, fake_download
+    ):
+        """保存済みの最終日以降と直近の修正対象期間だけを取得して保存する"""
+        service = StockService(db_session, async_session=async_db_session)
+        stale = make_frame("2025-09-01", "2025-10-14")
+        stale["Close"] = 1.0
+        service.price_store.save_many({"7203": stale, "6758": stale})
+
+        synced = await service.sync_prices(["7203", "6758", "0000", "AAPL"])
+
+        # 10/9（木）〜10/17（金）の6営業日分のみ（10/13は休業日）。東証以外の銘柄は保存しない
+        assert synced == {"7203": 6, "6758": 6, "0000": 0, "AAPL": 0}
+        calls = [(tickers, kwargs) for tickers, kwargs in fake_download.calls]
+        assert len(calls) == 2
+        assert calls[0][0] == ["7203.T", "6758.T"]
+        assert calls[0][1]["start"] == "2025-10-09"
+        assert calls[0][1]["end"] == "2025-10-18"
+        # 未保存の銘柄は初期期間から取得
+        assert calls[1][0] == ["0000.T"]
+        assert calls[1][1]["start"] == "2025-09-17"
+
+        rows = db_session.query(StockPrice).filter(StockPrice.symbol == "7203").order_by(StockPrice.date).all()
+        assert len(rows) == len(session_range("2025-09-01", "2025-10-17"))
+        # 修正対象期間の値は取得元の値で更新され、それより前は書き換えない
+        assert rows[-1].date == datetime(2025, 10, 17)
+        assert rows[-4].close_price != 1.0
+        assert rows[-7].close_price == 1.0
+
+    def test_save_endpoint_is_incremental(self, client, fake_download):
+        """保存エンドポイントは既定で差分同期し、保存した行数を返す"""
+        response = client.post("/api/v1/stocks/7203/save")
+        assert response.status_code == 200
+        assert response.json()["rows"] == len(session_range("2025-09-17", "2025-10-17"))
+
+        response = client.post("/api/v1/stocks/7203/save")
+        assert response.json()["rows"] == 3
+        assert fake_download.calls[-1][1]["start"] == "2025-10-15"
+
+
+class TestPriceUpsert:
+    """株価データのupsertテストクラス"""
+
+    def test_updates_existing_dates_without_duplicates(self, db_session: Session):
+        """同じ日付は更新され、レコードは重複しない"""
+        store = price_store.SqlPriceStore(db_session)
+        store.save("6758", make_frame("2025-10-01", "2025-10-10"))
+
+        updated = make_frame("2025-10-06", "2025-10-17")
+        updated["Close"] = 500.0
+        updated.iloc[0, updated.columns.get_loc("Volume")] = float("nan")
+        store.save("6758", updated)
+
+        rows = db_session.query(StockPrice).filter(StockPrice.symbol == "6758").order_by(StockPrice.date).all()
+        assert len(rows) == len(session_range("2025-10-01", "2025-10-17"))
+        assert rows[0].close_price == 100.0
+        assert rows[3].close_price == 500.0
+        assert rows[3].volume is None
+        assert rows[3].adjusted_close == 500.0
+        assert all(row.created_at is not None for row in rows)
+
+    def test_single_statement_per_save(self, db_session: Session):
+        """10年分の日足も1回のINSERTで保存する"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, executemany))
+
+        frame = make_frame("2015-10-01", "2025-10-17")
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            price_store.SqlPriceStore(db_session).save_many({"6758": frame, "7203": frame.iloc[:10]})
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+        statement, executemany = statements[0]
+        assert "ON CONFLICT (symbol, date) DO UPDATE" in statement
+        assert executemany
+        assert db_session.query(StockPrice).count() == len(frame) + 10
+
+    @pytest.mark.asyncio
+    async def test_async_save(self, db_session: Session, async_db_session: AsyncSession):
+        """AsyncSessionでも同じ日付は更新され、レコードは重複しない"""
+        store = price_store.AsyncSqlPriceStore(async_db_session)
+        assert await store.save("6758", make_frame("2025-10-01", "2025-10-10")) == 8
+
+        updated = make_frame("2025-10-06", "2025-10-17")
+        updated["Close"] = 500.0
+        await store.save("6758", updated)
+
+        rows = db_session.query(StockPrice).filter(StockPrice.symbol == "6758").order_by(StockPrice.date).all()
+        assert len(rows) == len(session_range("2025-10-01", "2025-10-17"))
+        assert rows[0].close_price == 100.0
+        assert rows[-1].close_price == 500.0
+
+    def test_postgresql_statement(self):
+        """PostgreSQLではON CONFLICT DO UPDATEのINSERTになる"""
+        statement = price_store.upsert_statement(postgresql.insert)
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (symbol, date) DO UPDATE SET open_price = excluded.open_price" in sql
+        assert statement.get_execution_options()["insertmanyvalues_page_size"] == price_store.UPSERT_PAGE_ROWS
+
+    def test_postgresql_pages(self, monkeypatch):
+        """非同期のエンジン向けには行を複数行のVALUESに埋め込み、ページごとに1ステートメントにする"""
+        monkeypatch.setattr(price_store, "UPSERT_PAGE_ROWS", 4)
+        rows = price_store.price_rows("6758", make_frame("2025-10-01", "2025-10-10"))
+
+        statements = list(price_store.upsert_pages(postgresql.insert, rows))
+
+        assert len(statements) == 2
+        compiled = statements[0].compile(dialect=postgresql.dialect())
+        assert "ON CONFLICT (symbol, date) DO UPDATE SET open_price = excluded.open_price" in str(compiled)
+        assert len(compiled.params) == 4 * price_store.UPSERT_ROW_PARAMS
+        assert len(statements[1].compile(dialect=postgresql.dialect()).params) == 4 * price_store.UPSERT_ROW_PARAMS
+
+    def test_postgresql_page_within_param_limit(self):
+        """1ページのバインドパラメータ数がasyncpgの上限に収まる"""
+        frame = make_frame("2000-01-01", "2025-10-17")
+        rows = price_store.price_rows("6758", frame.iloc[:price_store.UPSERT_PAGE_ROWS + 1])
+
+        statements = list(price_store.upsert_pages(postgresql.insert, rows))
+
+        params = statements[0].compile(dialect=postgresql.dialect()).params
+        assert len(params) == price_store.UPSERT_PAGE_ROWS * price_store.UPSERT_ROW_PARAMS
+        assert len(params) <= price_store.MAX_BIND_PARAMS
+        assert len(statements) == 2
@@ -0,0 +1,106 @@
+"""
+株価データのストリーミング応答（NDJSON）のテスト
+"""
+import json
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from config import settings
+from services import market_calendar, market_data
+from services.market_data import SyntheticProvider
+from services.price_store import SqlPriceStore
+from services.stock_service import StockService
+from test_price_store import make_frame
+
+# 2025-10-16（木）・2025-10-17（金）大引け後
+THURSDAY_CLOSE = datetime(2025, 10, 16, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+def read_lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """合成データ提供元（現在時刻は2025-10-17の大引け後）"""
+    now = {"value": AFTER_CLOSE}
+    monkeypatch.setattr(market_calendar, "market_now", lambda: now["value"])
+    previous = market_data.get_provider()
+    provider = SyntheticProvider(seed=1)
+    provider.now = now
+    market_data.set_provider(provider)
+    yield provider
+    market_data.set_provider(previous)
+
+
+class TestPriceStream:
+    """stream=trueのテストクラス"""
+
+    def test_matches_json_response(self, client: TestClient, provider):
+        """通常の応答のdataと同じ足を1行1件で返す"""
+        expected = client.get("/api/v1/stocks/6758/price?period=6mo&interval=1d").json()["data"]
+
+        response = client.get("/api/v1/stocks/6758/price?period=6mo&interval=1d&stream=true")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert read_lines(response) == expected
+
+    @pytest.mark.asyncio
+    async def test_streams_stored_bars_in_batches(self, db_session: Session, provider):
+        """保存済みの足はbatch_sizeずつ返し、外部APIを呼ばない"""
+        SqlPriceStore(db_session).save("6758", make_frame("2025-04-01", "2025-10-17"))
+        calls = provider.calls
+
+        service = StockService(db_session)
+        batches = [batch async for batch in service.stream_stock_price("6758", "3mo", "1d", batch_size=7)]
+
+        assert provider.calls == calls
+        assert all(len(batch) <= 7 for batch in batches)
+        stored = SqlPriceStore(db_session).load("6758", datetime(2025, 7, 17).date())
+        pd.testing.assert_frame_equal(pd.concat(batches), stored.tz_localize(market_calendar.MARKET_TZ))
+
+    def test_appends_missing_tail(self, client: TestClient, provider):
+        """保存済みの最終日より後の足だけを外部APIから取得して続けて返す"""
+        provider.now["value"] = THURSDAY_CLOSE
+        client.get("/api/v1/stocks/6758/price?period=1mo&interval=1d")
+        provider.now["value"] = AFTER_CLOSE
+        calls = provider.calls
+
+        dates = [line["date"] for line in read_lines(client.get("/api/v1/stocks/6758/price?period=1mo&interval=1d&stream=true"))]
+
+        assert provider.calls == calls + 1
+        assert dates[-2:] == ["2025-10-16T00:00:00+09:00", "2025-10-17T00:00:00+09:00"]
+        assert len(dates) == len(set(dates))
+
+    @pytest.mark.asyncio
+    async def test_fills_mid_range_gap(self, db_session: Session, provider):
+        """保存済みの期間の途中が欠けている場合は、欠けている営業日から外部APIで取得して続ける"""
+        stored = make_frame("2025-01-06", "2025-10-17")
+        gap = (stored.index >= "2025-05-01") & (stored.index < "2025-07-01")
+        SqlPriceStore(db_session).save("6758", stored[~gap])
+
+        service = StockService(db_session)
+        batches = [batch async for batch in service.stream_stock_price("6758", "6mo", "1d", batch_size=20)]
+
+        dates = pd.concat(batches).index.strftime("%Y-%m-%d").tolist()
+        expected = [day for day in stored.index.strftime("%Y-%m-%d") if day >= "2025-04-17"]
+        assert dates == expected
+
+    def test_intraday(self, client: TestClient, provider, monkeypatch):
+        """保存しない足種は取得結果を分割して返す"""
+        monkeypatch.setattr(settings.stream, "batch_size", 10)
+        lines = read_lines(client.get("/api/v1/stocks/6758/price?period=1d&interval=5m&stream=true"))
+
+        assert len(lines) > 10
+        assert lines[0]["date"].endswith("+09:00")
+
+    def test_rejects_resample(self, client: TestClient):
+        """集約・間引きとは同時に指定できない"""
+        response = client.get("/api/v1/stocks/6758/price?period=1y&interval=1d&stream=true&resample=1wk")
+        assert response.status_code == 400
@@ -0,0 +1,172 @@
+"""
+株価データのバイナリ形式（Arrow IPCストリーム・MessagePack）のテスト
+"""
+import json
+from datetime import datetime
+
+import msgpack
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+from services import market_calendar, market_data, price_wire
+from services.market_data import SyntheticProvider
+from services.price_wire import WireFormat
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+PRICE_URL = "/api/v1/stocks/6758/price?period=6mo&interval=1d"
+
+
+def read_arrow(content: bytes) -> pa.Table:
+    return pa.ipc.open_stream(content).read_all()
+
+
+def to_datetimes(dates) -> list:
+    """JSONの日時をタイムゾーン付きのTimestampにそろえる（日足はタイムゾーンなしの現地時刻）"""
+    index = pd.DatetimeIndex(dates)
+    return list(index.tz_localize(market_calendar.MARKET_TZ) if index.tz is None else index)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    previous = market_data.get_provider()
+    provider = SyntheticProvider(seed=1)
+    market_data.set_provider(provider)
+    yield provider
+    market_data.set_provider(previous)
+
+
+class TestNegotiate:
+    """Acceptヘッダーからの形式の選択のテストクラス"""
+
+    def test_json_by_default(self):
+        """指定なし・JSON・ワイルドカード・未対応の形式はJSON"""
+        assert price_wire.negotiate(None) is None
+        assert price_wire.negotiate("application/json") is None
+        assert price_wire.negotiate("*/*") is None
+        assert price_wire.negotiate("text/html") is None
+
+    def test_quality(self):
+        """q値が最も大きい形式を選び、同じ場合は先に書かれたものを選ぶ"""
+        accept = "application/json;q=0.5, application/x-msgpack;q=0.9, application/vnd.apache.arrow.stream;q=0.8"
+        assert price_wire.negotiate(accept) == WireFormat(price_wire.MSGPACK)
+        assert price_wire.negotiate("application/vnd.msgpack, application/vnd.apache.arrow.stream") == WireFormat(price_wire.MSGPACK)
+        assert price_wire.negotiate("application/x-msgpack;q=0, application/json") is None
+
+    def test_compression(self):
+        """Arrowはcompressionパラメーターで圧縮方式を指定でき、未対応の方式はエラー"""
+        wire_format = price_wire.negotiate('application/vnd.apache.arrow.stream; compression="zstd"')
+        assert wire_format == WireFormat(price_wire.ARROW_STREAM, "zstd")
+        assert wire_format.content_type == "application/vnd.apache.arrow.stream; compression=zstd"
+        with pytest.raises(price_wire.WireFormatError):
+            price_wire.negotiate("application/vnd.apache.arrow.stream; compression=snappy")
+        with pytest.raises(price_wire.WireFormatError):
+            price_wire.negotiate("application/x-msgpack; compression=zstd")
+
+    def test_record_batch_missing_values(self):
+        """欠損値はnullにし、タイムゾーンなしの日時は取引所の現地時刻とみなす"""
+        index = pd.DatetimeIndex(["2025-10-16", "2025-10-17"])
+        hist = pd.DataFrame(
+            {"Open": [1.0, np.nan], "High": [1.0, 2.0], "Low": [1.0, 2.0], "Close": [1.0, 2.0], "Volume": [10.0, np.nan]},
+            index=index,
+        )
+        batch = price_wire.frame_to_record_batch(hist)
+
+        assert batch.column("open").to_pylist() == [1.0, None]
+        assert batch.column("volume").to_pylist() == [10, None]
+        assert batch.column("date")[0].as_py() == datetime(2025, 10, 16, tzinfo=market_calendar.MARKET_TZ)
+        columns = price_wire.frame_to_msgpack_columns(hist)
+        assert np.frombuffer(columns["dates"], dtype=">i8").tolist() == index.tz_localize(market_calendar.MARKET_TZ).asi8.tolist()
+        assert columns["open"] == [1.0, None]
+        assert columns["volume"] == [10, None]
+
+
+class TestPriceWireFormats:
+    """株価取得API・一括取得APIのバイナリ形式のテストクラス"""
+
+    def test_arrow_matches_json(self, client: TestClient, provider):
+        """Arrowの列とメタデータはlayout=columnsのJSONと同じ値"""
+        expected = client.get(PRICE_URL + "&layout=columns").json()
+
+        response = client.get(PRICE_URL, headers={"Accept": price_wire.ARROW_STREAM})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == price_wire.ARROW_STREAM
+        assert "Accept" in response.headers["vary"].split(", ")
+        table = read_arrow(response.content)
+        assert table.column_names == ["date", "open", "high", "low", "close", "volume"]
+        assert table.column("date").to_pylist() == to_datetimes(expected["data"]["dates"])
+        for column in ("open", "high", "low", "close", "volume"):
+            assert table.column(column).to_pylist() == expected["data"][column]
+        summary = json.loads(table.schema.metadata[b"summary"])
+        assert summary == {field: expected[field] for field in price_wire.SUMMARY_FIELDS}
+
+    def test_arrow_compression(self, client: TestClient, provider):
+        """compressionを指定するとバッファを圧縮し、同じ表として読める"""
+        plain = client.get(PRICE_URL, headers={"Accept": price_wire.ARROW_STREAM})
+        compressed = client.get(PRICE_URL, headers={"Accept": f"{price_wire.ARROW_STREAM}; compression=zstd"})
+
+        assert compressed.headers["content-type"] == f"{price_wire.ARROW_STREAM}; compression=zstd"
+        assert read_arrow(compressed.content).equals(read_arrow(plain.content))
+        assert compressed.headers["etag"] != plain.headers["etag"]
+
+    def test_unsupported_compression(self, client: TestClient, provider):
+        response = client.get(PRICE_URL, headers={"Accept": f"{price_wire.ARROW_STREAM}; compression=snappy"})
+        assert response.status_code == 406
+
+    def test_msgpack_matches_json(self, client: TestClient, provider):
+        """MessagePackはlayout=columnsのJSONと同じ構造で、日時はエポックナノ秒のint64配列のbin"""
+        expected = client.get(PRICE_URL + "&layout=columns").json()
+
+        response = client.get(PRICE_URL, headers={"Accept": "application/x-msgpack"})
+
+        assert response.headers["content-type"] == price_wire.MSGPACK
+        payload = msgpack.unpackb(response.content)
+        dates = np.frombuffer(payload["data"].pop("dates"), dtype=price_wire.MSGPACK_DATE_DTYPE)
+        expected_dates = expected["data"].pop("dates")
+        assert list(pd.to_datetime(dates, utc=True).tz_convert(market_calendar.MARKET_TZ)) == to_datetimes(expected_dates)
+        assert payload == expected
+        assert len(response.content) < len(client.get(PRICE_URL).content) / 2
+
+    def test_etag_per_format(self, client: TestClient, provider):
+        """形式ごとに別のETagで、同じ形式なら304を返す"""
+        headers = {"Accept": "application/x-msgpack"}
+        etag = client.get(PRICE_URL, headers=headers).headers["etag"]
+
+        assert etag != client.get(PRICE_URL).headers["etag"]
+        response = client.get(PRICE_URL, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert "Accept" in response.headers["vary"].split(", ")
+        assert client.get(PRICE_URL, headers={"If-None-Match": etag}).status_code == 200
+
+    def test_batch_arrow(self, client: TestClient, provider):
+        """一括取得は1つのストリームにまとめ、symbol列で銘柄を区別する"""
+        body = {"symbols": ["6758", "7203", "0000"], "period": "1mo", "interval": "1d"}
+        expected = client.post("/api/v1/stocks/prices/batch", json=body).json()
+
+        response = client.post("/api/v1/stocks/prices/batch", json=body, headers={"Accept": price_wire.ARROW_STREAM})
+
+        assert response.status_code == 200
+        table = read_arrow(response.content)
+        metadata = {key.decode(): json.loads(value) for key, value in table.schema.metadata.items()}
+        assert metadata["missing"] == expected["missing"]
+        assert [summary["symbol"] for summary in metadata["summary"]] == [result["symbol"] for result in expected["results"]]
+        for result in expected["results"]:
+            rows = table.filter(pa.compute.equal(table.column("symbol"), result["symbol"]))
+            assert rows.column("close").to_pylist() == [row["close_price"] for row in result["data"]]
+
+    def test_batch_msgpack(self, client: TestClient, provider):
+        body = {"symbols": ["6758", "0000"], "period": "5d", "interval": "1d"}
+        expected = client.post("/api/v1/stocks/prices/batch", json=body).json()
+
+        response = client.post("/api/v1/stocks/prices/batch", json=body, headers={"Accept": "application/x-msgpack"})
+
+        payload = msgpack.unpackb(response.content)
+        assert payload["missing"] == expected["missing"]
+        assert payload["total"] == expected["total"]
+        assert payload["results"][0]["data"]["close"] == [row["close_price"] for row in expected["results"][0]["data"]]
@@ -0,0 +1,158 @@
+"""
+チャート用の株価データの集約のテスト
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from services import market_calendar, market_data
+from services.market_data import SyntheticProvider
+from services.resample import downsample, lttb_indices, resample_ohlcv, shape_history
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+def make_daily(start: str, end: str) -> pd.DataFrame:
+    """営業日ごとに終値が1ずつ上がる日足"""
+    index = pd.bdate_range(start, end, tz=market_calendar.MARKET_TZ)
+    close = np.arange(len(index), dtype="float64") + 100
+    return pd.DataFrame(
+        {"Open": close - 0.5, "High": close + 1, "Low": close - 1, "Close": close, "Volume": np.full(len(index), 10.0)},
+        index=index,
+    )
+
+
+class TestResample:
+    """週足・月足への集約のテストクラス"""
+
+    def test_weekly(self):
+        """月曜始まりの週ごとに始値・高値・安値・終値・出来高を集約する"""
+        daily = make_daily("2025-09-29", "2025-10-17")
+        daily.loc["2025-10-08", "High"] = 500.0
+        daily.loc["2025-10-09", "Low"] = 1.0
+
+        weekly = resample_ohlcv(daily, "1wk")
+
+        assert weekly.index.tolist() == [
+            pd.Timestamp(day, tz=market_calendar.MARKET_TZ) for day in ["2025-09-29", "2025-10-06", "2025-10-13"]
+        ]
+        second = weekly.iloc[1]
+        assert second["Open"] == daily.loc["2025-10-06", "Open"]
+        assert second["High"] == 500.0
+        assert second["Low"] == 1.0
+        assert second["Close"] == daily.loc["2025-10-10", "Close"]
+        assert second["Volume"] == 50.0
+
+    def test_matches_pandas_resample(self):
+        """月足・四半期足はpandasのresampleと同じ値になる"""
+        daily = make_daily("2024-01-01", "2025-10-17")
+        daily["Volume"] = np.random.default_rng(0).integers(1, 1000, len(daily)).astype("float64")
+        rules = {"1mo": "M", "3mo": "Q"}
+        for interval, rule in rules.items():
+            expected = daily.resample(rule).agg(
+                {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+            )
+            result = resample_ohlcv(daily, interval)
+            np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+
+    def test_ignores_missing_values(self):
+        """欠損値は高値・安値・出来高の集約で無視する"""
+        daily = make_daily("2025-10-06", "2025-10-10")
+        daily.loc["2025-10-07", ["High", "Volume"]] = np.nan
+
+        weekly = resample_ohlcv(daily, "1wk")
+        assert weekly["High"].iloc[0] == daily["High"].max()
+        assert weekly["Volume"].iloc[0] == 40.0
+
+    def test_invalid_interval(self):
+        """不明な足種はエラー"""
+        with pytest.raises(ValueError):
+            resample_ohlcv(make_daily("2025-10-06", "2025-10-10"), "1h")
+
+
+class TestDownsample:
+    """間引きのテストクラス"""
+
+    def test_ohlc_buckets(self):
+        """連続する足をまとめてmax_points以下に集約する"""
+        daily = make_daily("2025-01-01", "2025-10-17")
+
+        result = downsample(daily, 20)
+
+        assert len(result) <= 20
+        assert result["Volume"].sum() == daily["Volume"].sum()
+        assert result["Open"].iloc[0] == daily["Open"].iloc[0]
+        assert result["Close"].iloc[-1] == daily["Close"].iloc[-1]
+        assert result["High"].max() == daily["High"].max()
+
+    def test_lttb_keeps_extremes(self):
+        """先頭・末尾と、急な山・谷の点を残す"""
+        x = np.arange(1000, dtype="float64")
+        y = np.sin(x / 50)
+        y[500] = 10.0
+        y[700] = -10.0
+
+        indices = lttb_indices(x, y, 50)
+
+        assert len(indices) == 50
+        assert indices[0] == 0 and indices[-1] == 999
+        assert np.all(np.diff(indices) > 0)
+        assert {500, 700} <= set(indices.tolist())
+
+    def test_lttb_selects_existing_bars(self):
+        """lttbは実在する足をそのまま返す"""
+        daily = make_daily("2025-01-01", "2025-10-17")
+
+        result = downsample(daily, 30, "lttb")
+
+        assert len(result) == 30
+        pd.testing.assert_frame_equal(result, daily.loc[result.index])
+
+    def test_small_frames_unchanged(self):
+        """足数がmax_points以下であればそのまま返す"""
+        daily = make_daily("2025-10-06", "2025-10-17")
+        assert shape_history(daily, max_points=100) is daily
+        assert shape_history(daily) is daily
+
+
+class TestChartEndpoint:
+    """株価データ取得APIの集約・間引きのテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def synthetic(self, monkeypatch):
+        monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+        previous = market_data.get_provider()
+        market_data.set_provider(SyntheticProvider(seed=1))
+        yield
+        market_data.set_provider(previous)
+
+    def test_weekly_from_daily_bars(self, client: TestClient):
+        """resample=1wkでは日足を週足に集約して返す"""
+        daily = client.get("/api/v1/stocks/6758/price?period=3mo&interval=1d&layout=columns").json()["data"]
+        response = client.get("/api/v1/stocks/6758/price?period=3mo&interval=1d&layout=columns&resample=1wk")
+
+        assert response.status_code == 200
+        weekly = response.json()["data"]
+        assert len(weekly["dates"]) < len(daily["dates"])
+        assert weekly["close"][-1] == daily["close"][-1]
+        assert sum(weekly["volume"]) == sum(daily["volume"])
+        assert max(weekly["high"]) == max(daily["high"])
+
+    def test_max_points(self, client: TestClient):
+        """max_pointsを超える足はlttbで間引く"""
+        response = client.get("/api/v1/stocks/6758/price?period=5y&interval=1d&layout=columns&max_points=100&downsample=lttb")
+
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert len(data["dates"]) == 100
+        assert data["dates"][-1].startswith("2025-10-17")
+
+    @pytest.mark.parametrize("query", ["resample=1d", "max_points=1", "downsample=average"])
+    def test_invalid_parameters(self, client: TestClient, query):
+        """不明な足種・間引き方はバリデーションエラー"""
+        response = client.get(f"/api/v1/stocks/6758/price?{query}")
+        assert response.status_code == 422
@@ -0,0 +1,111 @@
+"""
+銘柄検索インデックスのテスト
+"""
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.stock import StockInfo, StockInfoResponse
+from services.search_index import SearchIndex, normalize, search_index
+from services.stock_service import StockService
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.rebuild([
+        StockInfoResponse(symbol="6758", company_name="ソニーグループ株式会社", company_name_en="Sony Group Corporation"),
+        StockInfoResponse(symbol="7203", company_name="トヨタ自動車株式会社", company_name_en="Toyota Motor Corporation"),
+        StockInfoResponse(symbol="6701", company_name="日本電気株式会社", company_name_en="NEC Corporation"),
+        StockInfoResponse(symbol="AAPL", company_name="Apple Inc."),
+    ])
+    return index
+
+
+class TestNormalize:
+    """検索用正規化のテストクラス"""
+
+    def test_kana_and_width_folding(self):
+        """カタカナ・ひらがな・半角カナは同じ文字列になる"""
+        assert normalize("ソニー") == normalize("そにー") == normalize("ｿﾆｰ")
+
+    def test_case_and_width_folding(self):
+        """全角英字・大文字小文字・空白を揃える"""
+        assert normalize("ＳＯＮＹ Group") == normalize("sonygroup")
+
+
+class TestSearchIndex:
+    """SearchIndexのテストクラス"""
+
+    @pytest.mark.parametrize("query", ["ソニー", "そにー", "ｿﾆｰ", "sony", "ＳＯＮＹ"])
+    def test_name_variants_hit_same_entry(self, index, query):
+        """表記ゆれがあっても同じ銘柄が見つかる"""
+        assert [result.symbol for result in index.search(query, 10)] == ["6758"]
+
+    def test_symbol_prefix(self, index):
+        """証券コードは前方一致で検索できる"""
+        assert [result.symbol for result in index.search("67", 10)] == ["6701", "6758"]
+        assert [result.symbol for result in index.search("aap", 10)] == ["AAPL"]
+
+    def test_name_ranking_and_limit(self, index):
+        """企業名は名前の短い順に並び、件数が制限される"""
+        results = index.search("株式会社", 2)
+        assert [result.symbol for result in results] == ["6701", "7203"]
+
+    def test_no_false_positive_from_ngrams(self, index):
+        """n-gramが一致しても部分文字列でなければ返さない"""
+        assert index.search("ソニ自動車", 10) == []
+
+    def test_upsert_updates_names(self, index):
+        """更新すると古い企業名では見つからなくなる"""
+        index.upsert(StockInfoResponse(symbol="6758", company_name="ソニーフィナンシャル"))
+        assert index.search("グループ", 10) == []
+        assert [result.symbol for result in index.search("フィナンシャル", 10)] == ["6758"]
+
+    def test_upsert_adds_symbol(self, index):
+        """追加した銘柄は証券コードでも検索できる"""
+        index.upsert(StockInfoResponse(symbol="6702", company_name="富士通株式会社"))
+        assert [result.symbol for result in index.search("670", 10)] == ["6701", "6702"]
+        assert index.get("6702").company_name == "富士通株式会社"
+
+
+class TestSearchIndexService:
+    """検索インデックスを使ったサービスのテストクラス"""
+
+    @pytest.mark.asyncio
+    async def test_search_stocks_builds_index(self, db_session: Session):
+        """最初の検索でデータベースからインデックスを構築する"""
+        db_session.add(StockInfo(symbol="6758", company_name="ソニーグループ株式会社"))
+        db_session.commit()
+
+        service = StockService(db_session)
+        results = await service.search_stocks("ｿﾆｰ", 10)
+
+        assert search_index.ready
+        assert [result.symbol for result in results] == ["6758"]
+
+    @pytest.mark.asyncio
+    async def test_save_stock_info_refreshes_index(self, db_session: Session, async_db_session: AsyncSession):
+        """保存した銘柄はインデックスにすぐ反映される"""
+        service = StockService(db_session, async_session=async_db_session)
+        await service.rebuild_search_index()
+
+        await service.save_stock_info(StockInfoResponse(symbol="7203", company_name="トヨタ自動車株式会社"))
+
+        results = await service.search_stocks("とよた", 10)
+        assert [result.symbol for result in results] == ["7203"]
+
+    @pytest.mark.asyncio
+    async def test_get_stock_info_exact_symbol(self, db_session: Session, monkeypatch):
+        """基本情報の取得は証券コードの前方一致ではなく完全一致"""
+        db_session.add(StockInfo(symbol="6758", company_name="ソニーグループ株式会社"))
+        db_session.commit()
+
+        async def no_external(query, limit):
+            return []
+
+        service = StockService(db_session)
+        monkeypatch.setattr(service, "_search_from_external_api", no_external)
+
+        assert (await service.get_stock_info("6758")).company_name == "ソニーグループ株式会社"
+        assert await service.get_stock_info("675") is None
@@ -3,6 +3,7 @@
 """
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from models.stock import StockInfo
@@ -73,13 +74,15 @@ class TestStockAPI:
 class TestStockService:
     """株価サービスのテストクラス"""
     
-    def test_search_from_database_empty_query(self, db_session: Session):
+    @pytest.mark.asyncio
+    async def test_search_from_database_empty_query(self, db_session: Session, async_db_session: AsyncSession):
         """空のクエリでのデータベース検索テスト"""
-        service = StockService(db_session)
-        results = service._search_from_database("", 10)
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("", 10)
         assert results == []
     
-    def test_search_from_database_numeric_query(self, db_session: Session):
+    @pytest.mark.asyncio
+    async def test_search_from_database_numeric_query(self, db_session: Session, async_db_session: AsyncSession):
         """数値クエリでのデータベース検索テスト"""
         # テストデータを作成
         test_stock = StockInfo(
@@ -93,14 +96,15 @@ class TestStockService:
         db_session.add(test_stock)
         db_session.commit()
         
-        service = StockService(db_session)
-        results = service._search_from_database("6758", 10)
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("6758", 10)
         
         assert len(results) == 1
         assert results[0].symbol == "6758"
         assert results[0].company_name == "ソニーグループ株式会社"
     
-    def test_search_from_database_text_query(self, db_session: Session):
+    @pytest.mark.asyncio
+    async def test_search_from_database_text_query(self, db_session: Session, async_db_session: AsyncSession):
         """テキストクエリでのデータベース検索テスト"""
         # テストデータを作成
         test_stock = StockInfo(
@@ -114,19 +118,19 @@ class TestStockService:
         db_session.add(test_stock)
         db_session.commit()
         
-        service = StockService(db_session)
-        results = service._search_from_database("トヨタ", 10)
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("トヨタ", 10)
         
         assert len(results) == 1
         assert results[0].symbol == "7203"
         assert "トヨタ" in results[0].company_name
     
     @pytest.mark.asyncio
-    async def test_save_stock_info_new(self, db_session: Session):
+    async def test_save_stock_info_new(self, db_session: Session, async_db_session: AsyncSession):
         """新規株式情報保存テスト"""
         from models.stock import StockInfoResponse
         
-        service = StockService(db_session)
+        service = StockService(db_session, async_session=async_db_session)
         stock_info = StockInfoResponse(
             symbol="9984",
             company_name="ソフトバンクグループ株式会社",
@@ -149,7 +153,7 @@ class TestStockService:
         assert saved.company_name == "ソフトバンクグループ株式会社"
     
     @pytest.mark.asyncio
-    async def test_save_stock_info_update(self, db_session: Session):
+    async def test_save_stock_info_update(self, db_session: Session, async_db_session: AsyncSession):
         """既存株式情報更新テスト"""
         from models.stock import StockInfoResponse
         
@@ -165,7 +169,7 @@ class TestStockService:
         db_session.add(existing_stock)
         db_session.commit()
         
-        service = StockService(db_session)
+        service = StockService(db_session, async_session=async_db_session)
         updated_info = StockInfoResponse(
             symbol="6758",
             company_name="ソニーグループ株式会社",
@@ -1,8 +1,44 @@
 """
 株価APIエンドポイントのテスト
 """
+import time
+from datetime import datetime
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.stock import StockInfo
+from services import market_calendar, market_data
+from services.market_data import SyntheticProvider
+from services.prewarm import POPULAR_SYMBOLS
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+class SlowInfoProvider(SyntheticProvider):
+    """指定した銘柄の企業メタデータの取得だけ遅い合成データ提供元"""
+
+    def __init__(self, slow_symbols, delay: float, **kwargs):
+        super().__init__(**kwargs)
+        self.slow_symbols = set(slow_symbols)
+        self.delay = delay
+
+    def info(self, symbol):
+        if symbol in self.slow_symbols:
+            time.sleep(self.delay)
+        return super().info(symbol)
+
+
+@pytest.fixture
+def use_provider(monkeypatch):
+    """外部APIの代わりに指定した提供元を使う"""
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    previous = market_data.get_provider()
+    yield market_data.set_provider
+    market_data.set_provider(previous)
 
 
 class TestStockEndpoints:
@@ -76,3 +112,44 @@ class TestStockEndpoints:
         assert isinstance(data["results"], list)
         assert isinstance(data["total"], int)
         assert len(data["results"]) <= 5
+
+
+class TestPopularFanOut:
+    """人気株式一覧の並行取得のテストクラス"""
+
+    def test_cold_lookups_run_concurrently(self, client: TestClient, db_session: Session, use_provider, monkeypatch):
+        """データベースにない銘柄は並行して取得し、次回以降のためにデータベースへ保存する"""
+        monkeypatch.setattr(settings.popular, "concurrency", len(POPULAR_SYMBOLS))
+        provider = SyntheticProvider(seed=1, latency=0.3)
+        use_provider(provider)
+
+        started = time.perf_counter()
+        response = client.get(f"/api/v1/stocks/popular?limit={len(POPULAR_SYMBOLS)}")
+        elapsed = time.perf_counter() - started
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [stock["symbol"] for stock in data["results"]] == POPULAR_SYMBOLS
+        assert data["missing"] == []
+        # 直列に取得すると 0.3秒 × 11銘柄 かかる
+        assert elapsed < 0.3 * len(POPULAR_SYMBOLS) / 2
+        assert db_session.query(StockInfo).count() == len(POPULAR_SYMBOLS)
+
+        calls = provider.calls
+        assert client.get(f"/api/v1/stocks/popular?limit={len(POPULAR_SYMBOLS)}").json()["total"] == len(POPULAR_SYMBOLS)
+        assert provider.calls == calls
+
+    def test_partial_results_on_timeout(self, client: TestClient, use_provider, monkeypatch):
+        """タイムアウトした銘柄を除いた結果を返す"""
+        monkeypatch.setattr(settings.popular, "timeout", 0.2)
+        use_provider(SlowInfoProvider(["9984"], delay=1.0, seed=1))
+
+        started = time.perf_counter()
+        response = client.get("/api/v1/stocks/popular?limit=5")
+        elapsed = time.perf_counter() - started
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["missing"] == ["9984"]
+        assert [stock["symbol"] for stock in data["results"]] == ["6758", "7203", "8306", "6861"]
+        assert elapsed < 1.0
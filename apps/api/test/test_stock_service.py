@@ -1,23 +1,29 @@
 """
 株価サービスのテスト
 """
+import asyncio
+
 import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models.stock import StockInfo
+from models.stock import StockInfo, StockInfoResponse
 from services.stock_service import StockService
+from test_config import TestingAsyncSessionLocal
 
 
 class TestStockService:
     """株価サービスのテストクラス"""
     
-    def test_search_from_database_empty_query(self, db_session: Session):
+    @pytest.mark.asyncio
+    async def test_search_from_database_empty_query(self, db_session: Session, async_db_session: AsyncSession):
         """空のクエリでのデータベース検索テスト"""
-        service = StockService(db_session)
-        results = service._search_from_database("", 10)
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("", 10)
         assert results == []
     
-    def test_search_from_database_numeric_query(self, db_session: Session):
+    @pytest.mark.asyncio
+    async def test_search_from_database_numeric_query(self, db_session: Session, async_db_session: AsyncSession):
         """数値クエリでのデータベース検索テスト"""
         # テストデータを作成
         test_stock = StockInfo(
@@ -31,14 +37,15 @@ class TestStockService:
         db_session.add(test_stock)
         db_session.commit()
         
-        service = StockService(db_session)
-        results = service._search_from_database("6758", 10)
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("6758", 10)
         
         assert len(results) == 1
         assert results[0].symbol == "6758"
         assert results[0].company_name == "ソニーグループ株式会社"
     
-    def test_search_from_database_text_query(self, db_session: Session):
+    @pytest.mark.asyncio
+    async def test_search_from_database_text_query(self, db_session: Session, async_db_session: AsyncSession):
         """テキストクエリでのデータベース検索テスト"""
         # テストデータを作成
         test_stock = StockInfo(
@@ -52,19 +59,19 @@ class TestStockService:
         db_session.add(test_stock)
         db_session.commit()
         
-        service = StockService(db_session)
-        results = service._search_from_database("トヨタ", 10)
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("トヨタ", 10)
         
         assert len(results) == 1
         assert results[0].symbol == "7203"
         assert "トヨタ" in results[0].company_name
     
     @pytest.mark.asyncio
-    async def test_save_stock_info_new(self, db_session: Session):
+    async def test_save_stock_info_new(self, db_session: Session, async_db_session: AsyncSession):
         """新規株式情報保存テスト"""
         from models.stock import StockInfoResponse
         
-        service = StockService(db_session)
+        service = StockService(db_session, async_session=async_db_session)
         stock_info = StockInfoResponse(
             symbol="9984",
             company_name="ソフトバンクグループ株式会社",
@@ -87,7 +94,7 @@ class TestStockService:
         assert saved.company_name == "ソフトバンクグループ株式会社"
     
     @pytest.mark.asyncio
-    async def test_save_stock_info_update(self, db_session: Session):
+    async def test_save_stock_info_update(self, db_session: Session, async_db_session: AsyncSession):
         """既存株式情報更新テスト"""
         from models.stock import StockInfoResponse
         
@@ -103,7 +110,7 @@ class TestStockService:
         db_session.add(existing_stock)
         db_session.commit()
         
-        service = StockService(db_session)
+        service = StockService(db_session, async_session=async_db_session)
         updated_info = StockInfoResponse(
             symbol="6758",
             company_name="ソニーグループ株式会社",
@@ -121,6 +128,20 @@ class TestStockService:
         assert updated.company_name == "ソニーグループ株式会社"
         assert updated.company_name_en == "Sony Group Corporation"
     
+    @pytest.mark.asyncio
+    async def test_save_stock_info_concurrent(self, db_session: Session):
+        """未保存の銘柄を同時に保存しても一意制約違反にならないことをテスト"""
+        stock_info = StockInfoResponse(symbol="9984", company_name="ソフトバンクグループ株式会社")
+        
+        async with TestingAsyncSessionLocal() as first, TestingAsyncSessionLocal() as second:
+            await asyncio.gather(
+                StockService(db_session, async_session=first).save_stock_info(stock_info),
+                StockService(db_session, async_session=second).save_stock_info(stock_info),
+            )
+        
+        saved = db_session.query(StockInfo).filter(StockInfo.symbol == "9984").all()
+        assert [stock.company_name for stock in saved] == ["ソフトバンクグループ株式会社"]
+    
     @pytest.mark.asyncio
     async def test_get_stock_price_invalid_symbol(self, db_session: Session):
         """無効な証券コードでの株価取得テスト"""
@@ -142,3 +163,44 @@ class TestStockService:
         except Exception:
             # Yahoo Finance APIが利用できない場合は例外が発生
             pass
+    
+    @pytest.mark.asyncio
+    async def test_search_from_database_english_name(self, db_session: Session, async_db_session: AsyncSession):
+        """英語の企業名でも検索できることをテスト"""
+        db_session.add(StockInfo(
+            symbol="7203",
+            company_name="トヨタ自動車株式会社",
+            company_name_en="Toyota Motor Corporation"
+        ))
+        db_session.commit()
+        
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("toyota", 10)
+        
+        assert [result.symbol for result in results] == ["7203"]
+    
+    @pytest.mark.asyncio
+    async def test_search_from_database_ranking(self, db_session: Session, async_db_session: AsyncSession):
+        """前方一致・短い名前の順に並ぶことをテスト"""
+        db_session.add_all([
+            StockInfo(symbol="8058", company_name="三菱商事株式会社"),
+            StockInfo(symbol="8306", company_name="株式会社三菱UFJフィナンシャル・グループ"),
+            StockInfo(symbol="7011", company_name="三菱重工業株式会社"),
+            StockInfo(symbol="9999", company_name="三菱"),
+        ])
+        db_session.commit()
+        
+        service = StockService(db_session, async_session=async_db_session)
+        results = await service._search_from_database("三菱", 10)
+        
+        assert [result.symbol for result in results] == ["9999", "8058", "7011", "8306"]
+    
+    @pytest.mark.asyncio
+    async def test_search_from_database_escapes_wildcards(self, db_session: Session, async_db_session: AsyncSession):
+        """LIKEのワイルドカード文字はそのまま検索されることをテスト"""
+        db_session.add(StockInfo(symbol="1234", company_name="テスト株式会社"))
+        db_session.commit()
+        
+        service = StockService(db_session, async_session=async_db_session)
+        assert await service._search_from_database("%", 10) == []
+        assert await service._search_from_database("_", 10) == []
@@ -0,0 +1,100 @@
+"""
+処理時間計測のテスト
+"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services import market_calendar, market_data
+from services.market_data import SyntheticProvider
+from services.timing import Histogram, RequestTimings, TimingMetrics, span, timing_metrics
+
+# 2025-10-17（金）大引け後
+AFTER_CLOSE = datetime(2025, 10, 17, 18, 0, tzinfo=market_calendar.MARKET_TZ)
+
+
+@pytest.fixture
+def synthetic(monkeypatch):
+    """外部APIの代わりに合成データ提供元を使う"""
+    monkeypatch.setattr(market_calendar, "market_now", lambda: AFTER_CLOSE)
+    previous = market_data.get_provider()
+    market_data.set_provider(SyntheticProvider(seed=1))
+    timing_metrics.clear()
+    yield
+    market_data.set_provider(previous)
+
+
+class TestSpan:
+    """spanのテストクラス"""
+
+    def test_noop_without_request(self):
+        """計測中のリクエストがなければ共有の何もしないコンテキストを返す"""
+        assert span("db.load") is span("provider.history")
+        with span("db.load"):
+            pass
+
+    def test_accumulates_stages(self):
+        """同じ処理段階は合計秒数と回数を加算する"""
+        timings = RequestTimings()
+        timings.add("db.load", 0.002)
+        timings.add("provider.history", 0.010)
+        timings.add("db.load", 0.003)
+
+        assert timings.stages["db.load"] == [pytest.approx(0.005), 2]
+        assert timings.server_timing(0.02) == "db.load;dur=5.00, provider.history;dur=10.00, total;dur=20.00"
+
+
+class TestHistogram:
+    """Histogramのテストクラス"""
+
+    def test_render_cumulative_buckets(self):
+        """Prometheus形式で累積バケットを出力する"""
+        histogram = Histogram("latency_seconds", "処理時間", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(("/a",), 0.05)
+        histogram.observe(("/a",), 0.5)
+        histogram.observe(("/a",), 3.0)
+
+        lines = histogram.render()
+        assert "# TYPE latency_seconds histogram" in lines
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{route="/a"} 3' in lines
+        assert histogram.count(("/a",)) == 3
+
+    def test_record_request(self):
+        """リクエストと処理段階をルートごとに記録する"""
+        metrics = TimingMetrics()
+        timings = RequestTimings()
+        timings.add("db.load", 0.01)
+        metrics.record("GET", "/items/{id}", 200, 0.02, timings)
+
+        assert metrics.requests.count(("GET", "/items/{id}", "200")) == 1
+        assert metrics.stages.count(("/items/{id}", "db.load")) == 1
+
+
+class TestTimingMiddleware:
+    """処理時間計測ミドルウェアのテストクラス"""
+
+    def test_server_timing_header(self, client: TestClient, synthetic):
+        """株価取得の処理段階をServer-Timingヘッダーで返す"""
+        response = client.get("/api/v1/stocks/7203/price?period=1mo")
+        assert response.status_code == 200
+
+        stages = [metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")]
+        for stage in ["db.load", "provider.history", "db.save", "build", "serialize", "total"]:
+            assert stage in stages
+
+    def test_metrics_endpoint(self, client: TestClient, synthetic):
+        """ルートのテンプレートと処理段階ごとのヒストグラムを返す"""
+        client.get("/api/v1/stocks/7203/price?period=1mo")
+        client.get("/no-such-path")
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'route="/api/v1/stocks/{symbol}/price",status="200"' in body
+        assert 'route="/api/v1/stocks/{symbol}/price",stage="provider.history"' in body
+        assert 'route="unmatched",status="404"' in body